@@ -4,28 +4,44 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
+from sqlalchemy.exc import OperationalError
 import os
 import shutil
 from datetime import datetime
 import logging
 from config import config
-from models.user import db, User, Subscription, Favorite, ProcessingLog
+from models.user import db, User, Subscription, Favorite, ProcessingLog, Geofence, HeaderMapping, upgrade_schema
 from auth.auth_handler import AuthHandler
 from auth.email_sender import mail, EmailSender
 
 # ============ UPDATED IMPORTS ============ #
-from utils.excel_processor import convert_xls_to_xlsx, validate_excel_file, batch_convert_xls_files
+from utils.excel_processor import validate_excel_file, batch_convert_xls_files
 from utils.data_extractor import (
-    extract_data_from_excel, 
-    create_summary_report,
-    get_extraction_statistics
+    location_cache_stats,
+    sheet_layout_fingerprint,
+    HEADER_SCAN_ROWS,
+    iter_records,
+    ExtractionStatistics,
+    SplitReportWriter,
+    open_report_writer,
+    REPORT_FORMATS
 )
+from utils.record_exporters import RECORD_WRITERS, available_formats
+from utils.zone_classifier import ZoneClassifier
+from utils.geofence_index import parse_polygon, get_cached_index, invalidate_cached_index
+from utils.batch_pipeline import iter_pipelined_extraction
+from utils.record_merge import RECORD_ORDERS, RecordDeduplicator, SpilledRecordMerge, merge_batches
+from utils.result_cache import CACHE_CHUNK_ROWS, ResultCache, file_digest, make_cache_key
+from utils.record_batch import RecordBatchBuilder
+from utils.header_layout import get_layout_cache
+from utils.workbook_info import WorkbookInfoCache
 from utils.visits_distributor import (
     distribute_visits,
     validate_visits_file,
     get_distribution_summary
 )
 import zipfile
+from openpyxl.utils import column_index_from_string
 
 # Setup logging
 logging.basicConfig(
@@ -75,14 +91,23 @@ print(f"Database file: {DB_FILE}")
 
 config[env].init_app(app)
 
+# ذاكرة نتائج الاستخراج (إعادة رفع نفس الملف لا تعيد التحويل والاستخراج)
+result_cache = ResultCache(app.config['RESULT_CACHE_DIR'], app.config['RESULT_CACHE_MAX_BYTES'])
+
+# معلومات المصنفات لـ /api/file-info (حسب بصمة المحتوى)
+workbook_info_cache = WorkbookInfoCache()
+
 # Initialize extensions
 db.init_app(app)
+
+# الجداول والأعمدة الجديدة تُنشأ مرة واحدة عبر "flask --app app init-db" قبل تشغيل gunicorn
 mail.init_app(app)
 CORS(app, resources={
     r"/api/*": {
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["Content-Disposition", "X-Failed-Files", "X-Duplicates-Dropped"]
     }
 })
 
@@ -101,6 +126,109 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
+def get_job_zones(user_id):
+    """
+    مصنّف النطاق للعملية: مكتبة نطاقات المستخدم إن وُجدت، وإلا Config.ZONE_POINTS
+    """
+    version = Geofence.library_version(user_id)
+    if not version[0]:
+        return ZoneClassifier(app.config.get('ZONE_POINTS'))
+    
+    return get_cached_index(
+        str(user_id),
+        version,
+        lambda: [(g.name, g.points) for g in Geofence.query.filter_by(user_id=user_id).order_by(Geofence.id).all()]
+    )
+
+
+def get_report_split(options):
+    """
+    خيارات تقسيم التقرير من الطلب: split_by ('size' أو 'car') و split_rows
+    
+    Returns:
+        tuple: (split_by أو None، عدد السجلات لكل مصنف)
+    
+    Raises:
+        ValueError: عند قيم غير صالحة
+    """
+    split_by = options.get('split_by') or None
+    if split_by is None:
+        return None, None
+    if split_by not in SplitReportWriter.SPLIT_MODES:
+        raise ValueError('طريقة تقسيم التقرير غير صالحة')
+    
+    try:
+        split_rows = int(options.get('split_rows') or app.config.get('REPORT_SPLIT_ROWS'))
+    except (TypeError, ValueError):
+        raise ValueError('عدد السجلات لكل ملف غير صالح')
+    if split_rows < 1:
+        raise ValueError('عدد السجلات لكل ملف غير صالح')
+    
+    return split_by, split_rows
+
+
+def get_output_format(options, split_by=None):
+    """
+    صيغة الإخراج من الطلب: xlsx (التقرير المنسق) أو csv / parquet / jsonl / geojson
+    
+    Raises:
+        ValueError: عند صيغة غير صالحة أو غير متاحة
+    """
+    output_format = (options.get('output_format') or 'xlsx').lower()
+    if output_format not in REPORT_FORMATS:
+        raise ValueError('صيغة الإخراج غير صالحة')
+    if output_format != 'xlsx' and output_format not in available_formats():
+        raise ValueError('صيغة الإخراج غير متاحة على الخادم')
+    if output_format != 'xlsx' and split_by:
+        raise ValueError('تقسيم التقرير متاح لملفات Excel فقط')
+    return output_format
+
+
+def get_output_mode(options, split_by=None, output_format='xlsx'):
+    """
+    نمط التقرير: 'summary' (تقرير موحد) أو 'per_car' (مصنف لكل سيارة في ZIP)
+    
+    Raises:
+        ValueError: عند نمط غير صالح أو غير متوافق مع الخيارات الأخرى
+    """
+    output_mode = options.get('output_mode') or 'summary'
+    if output_mode not in ('summary', 'per_car'):
+        raise ValueError('نمط التقرير غير صالح')
+    if output_mode == 'per_car' and (split_by or output_format != 'xlsx'):
+        raise ValueError('تقرير كل سيارة متاح لملفات Excel بدون تقسيم')
+    return output_mode
+
+
+def get_record_order(options):
+    """
+    ترتيب السجلات في التقرير: 'source' (ملف ثم ورقة) أو 'time' أو 'car,time'
+    
+    Raises:
+        ValueError: عند ترتيب غير صالح
+    """
+    order = (options.get('order') or 'source').replace(' ', '').lower()
+    if order not in RECORD_ORDERS:
+        raise ValueError('ترتيب السجلات غير صالح')
+    return order
+
+
+def report_filename(mode, stamp, split_by=None, output_format='xlsx', per_car=False):
+    """اسم التقرير: xlsx واحد، أو zip عند التقسيم / لكل سيارة، أو امتداد الصيغة الآلية"""
+    if per_car:
+        return f"Car_Reports_{mode}_{stamp}.zip"
+    if output_format != 'xlsx':
+        extension = RECORD_WRITERS[output_format].extension
+    else:
+        extension = 'zip' if split_by else 'xlsx'
+    return f"Summary_Report_{mode}_{stamp}.{extension}"
+
+
+def report_mimetype(split_by=None, output_format='xlsx', per_car=False):
+    if output_format != 'xlsx':
+        return RECORD_WRITERS[output_format].mimetype
+    return 'application/zip' if split_by or per_car else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
 # ======================== STATIC FILES ======================== #
 @app.route('/')
 def index():
@@ -492,6 +620,14 @@ def process_files_batch():
         if job_type not in ['cars', 'visits']:
             return jsonify({'error': 'نوع العملية غير صحيح'}), 400
         
+        try:
+            split_by, split_rows = get_report_split(request.form)
+            output_format = get_output_format(request.form, split_by)
+            per_car = get_output_mode(request.form, split_by, output_format) == 'per_car'
+            order = get_record_order(request.form)
+        except ValueError as option_error:
+            return jsonify({'error': str(option_error)}), 400
+        
         # ✅ إنشاء مجلد مؤقت فريد
         temp_dir_name = f"{user_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
         user_upload_folder = os.path.join(app.config['UPLOAD_FOLDER'], temp_dir_name)
@@ -514,92 +650,102 @@ def process_files_batch():
             shutil.rmtree(user_upload_folder, ignore_errors=True)
             return jsonify({'error': 'لم يتم قبول أي ملف صالح'}), 400
 
-        # ✅ تحويل XLS إلى XLSX
-        try:
-            conversion_results = batch_convert_xls_files(user_upload_folder, user_upload_folder)
-            logger.info(f"Conversion results: {conversion_results}")
-        except Exception as conv_error:
-            logger.error(f"Conversion error: {conv_error}")
-            shutil.rmtree(user_upload_folder, ignore_errors=True)
-            return jsonify({'error': f'فشل في تحويل الملفات: {str(conv_error)}'}), 500
-        
-        # ✅ جمع ملفات XLSX النهائية
-        final_xlsx_files = []
-        for item in conversion_results.get('converted', []):
-            converted_path = os.path.join(user_upload_folder, item['converted'])
-            if os.path.exists(converted_path):
-                final_xlsx_files.append(converted_path)
-        
-        # إضافة XLSX التي لم تحتاج تحويل
-        for filename in os.listdir(user_upload_folder):
-            if filename.lower().endswith('.xlsx'):
-                file_path = os.path.join(user_upload_folder, filename)
-                if file_path not in final_xlsx_files:
-                    final_xlsx_files.append(file_path)
-
-        if not final_xlsx_files:
-            shutil.rmtree(user_upload_folder, ignore_errors=True)
-            return jsonify({'error': 'فشل في معالجة الملفات إلى تنسيق XLSX'}), 500
-        
-        logger.info(f"Final XLSX files count: {len(final_xlsx_files)}")
-        
         # ✅ معالجة حسب نوع العملية
         if job_type == 'cars':
-            # استخلاص البيانات
-            all_extracted_data = []
+            # استخلاص البيانات بالتوازي (كل ملف في عملية عاملة مستقلة، XLS يُقرأ مباشرة بدون تحويل)
+            # والكتابة إلى التقرير فور وصول كل ملف بترتيب الرفع دون تجميع السجلات
+            zones = get_job_zones(user_id)
+            failed_files = []
+            statistics = ExtractionStatistics()
+            # الترتيب الزمني: دفعة كل ملف تُرتَّب وتُكتب على القرص، ثم تُدمج (k-way) أثناء الكتابة
+            ordered_runs = SpilledRecordMerge(order, user_upload_folder) if order != 'source' else None
+            # الملفات بفترات متداخلة: نفس التوقف يُكتب مرة واحدة (dedupe=0 لتعطيله)
+            deduplicator = RecordDeduplicator() if request.form.get('dedupe', '1') != '0' else None
             
-            for file_path in final_xlsx_files:
-                try:
-                    if os.path.exists(file_path):
-                        data = extract_data_from_excel(file_path, mode, app.config.get('ZONE_POINTS'))
-                        if data:
-                            all_extracted_data.extend(data)
-                        logger.info(f"Extracted {len(data)} records from {os.path.basename(file_path)}")
-                except Exception as extract_error:
-                    logger.error(f"Extraction error for {file_path}: {extract_error}")
-                    continue
-            
-            if not all_extracted_data:
-                shutil.rmtree(user_upload_folder, ignore_errors=True)
-                return jsonify({'error': 'لم يتم استخلاص أي بيانات من الملفات'}), 400
-            
-            # إنشاء تقرير موحد
-            stats = get_extraction_statistics(all_extracted_data)
-            
-            report_name = f"Summary_Report_{mode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            report_name = report_filename(mode, datetime.now().strftime('%Y%m%d_%H%M%S'), split_by, output_format, per_car)
             report_path = os.path.join(user_upload_folder, report_name)
+            writer = open_report_writer(
+                report_path, mode, split_by, split_rows, output_format,
+                per_car=per_car, max_workers=app.config.get('MAX_PROCESS_WORKERS')
+            )
             
             try:
-                create_summary_report(all_extracted_data, report_path, mode)
+                for result in iter_pipelined_extraction(
+                    uploaded_files_paths, mode, zones,
+                    max_workers=app.config.get('MAX_PROCESS_WORKERS'),
+                    ordered=True,
+                    header_layouts=HeaderMapping.layouts_for_user(user_id),
+                    result_cache=result_cache,
+                    engine=app.config.get('EXTRACTION_ENGINE')
+                ):
+                    if result['error']:
+                        failed_files.append({'file': result['file'], 'error': result['error']})
+                        continue
+                    
+                    batch = result['records']
+                    logger.info(f"{'Cached' if result['cached'] else 'Extracted'} {len(batch)} records from {result['file']}")
+                    if deduplicator is not None:
+                        batch = deduplicator.filter(batch)
+                    statistics.add_batch(batch)
+                    if ordered_runs is not None:
+                        ordered_runs.add(batch)
+                    else:
+                        writer.extend(batch)
+                
+                if ordered_runs is not None:
+                    writer.extend(ordered_runs.merged())
+                    ordered_runs.close()
+                
+                if deduplicator is not None and deduplicator.dropped:
+                    statistics.duplicates_dropped = deduplicator.dropped
+                    logger.info(f"Dropped {deduplicator.dropped} duplicate stops")
+                
+                if failed_files:
+                    logger.warning(f"Files failed during processing: {failed_files}")
+                
+                if not writer.count:
+                    writer.discard()
+                    shutil.rmtree(user_upload_folder, ignore_errors=True)
+                    return jsonify({'error': 'لم يتم استخلاص أي بيانات من الملفات'}), 400
+                
+                # إنشاء تقرير موحد
+                writer.close()
                 logger.info(f"Report created: {report_name}")
             except Exception as report_error:
+                writer.discard()
+                if ordered_runs is not None:
+                    ordered_runs.close()
                 logger.error(f"Report creation error: {report_error}")
                 shutil.rmtree(user_upload_folder, ignore_errors=True)
                 return jsonify({'error': f'فشل في إنشاء التقرير: {str(report_error)}'}), 500
             
+            stats = statistics.to_dict()
+            
             # تسجيل العملية
             log = ProcessingLog(
                 user_id=user_id,
                 job_type=job_type,
                 mode=mode,
-                filename=f"Batch ({len(final_xlsx_files)} files)",
+                filename=f"Batch ({len(uploaded_files_paths)} files)",
                 status='completed',
-                records_processed=stats['total_records'],
-                inside_zone=stats['inside_zone'],
-                outside_zone=stats['outside_zone'],
-                undefined_zone=stats['undefined_zone']
+                error_message='; '.join(f"{f['file']}: {f['error']}" for f in failed_files) or None
             )
+            log.apply_statistics(stats)
             db.session.add(log)
             db.session.commit()
             
             # تنظيف وإرسال
             try:
-                return send_file(
+                response = send_file(
                     report_path,
                     as_attachment=True,
                     download_name=report_name,
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                    mimetype=report_mimetype(split_by, output_format, per_car)
                 )
+                # الملفات الفاشلة (أسماء آمنة عبر secure_filename)
+                response.headers['X-Failed-Files'] = ','.join(f['file'] for f in failed_files)
+                response.headers['X-Duplicates-Dropped'] = str(stats['duplicates_dropped'])
+                return response
             finally:
                 # تنظيف بعد الإرسال
                 def cleanup():
@@ -614,6 +760,35 @@ def process_files_batch():
                 threading.Thread(target=cleanup, daemon=True).start()
         
         elif job_type == 'visits':
+            # ✅ تحويل XLS إلى XLSX
+            try:
+                conversion_results = batch_convert_xls_files(user_upload_folder, user_upload_folder)
+                logger.info(f"Conversion results: {conversion_results}")
+            except Exception as conv_error:
+                logger.error(f"Conversion error: {conv_error}")
+                shutil.rmtree(user_upload_folder, ignore_errors=True)
+                return jsonify({'error': f'فشل في تحويل الملفات: {str(conv_error)}'}), 500
+            
+            # ✅ جمع ملفات XLSX النهائية
+            final_xlsx_files = []
+            for item in conversion_results.get('converted', []):
+                converted_path = os.path.join(user_upload_folder, item['converted'])
+                if os.path.exists(converted_path):
+                    final_xlsx_files.append(converted_path)
+            
+            # إضافة XLSX التي لم تحتاج تحويل
+            for filename in os.listdir(user_upload_folder):
+                if filename.lower().endswith('.xlsx'):
+                    file_path = os.path.join(user_upload_folder, filename)
+                    if file_path not in final_xlsx_files:
+                        final_xlsx_files.append(file_path)
+
+            if not final_xlsx_files:
+                shutil.rmtree(user_upload_folder, ignore_errors=True)
+                return jsonify({'error': 'فشل في معالجة الملفات إلى تنسيق XLSX'}), 500
+            
+            logger.info(f"Final XLSX files count: {len(final_xlsx_files)}")
+            
             # التوزيع للزيارات
             if len(final_xlsx_files) != 1:
                 shutil.rmtree(user_upload_folder, ignore_errors=True)
@@ -713,6 +888,13 @@ def process_cars():
         if mode not in ['engine_idle', 'parking_details']:
             return jsonify({'error': 'وضع غير صالح'}), 400
         
+        try:
+            split_by, split_rows = get_report_split(data)
+            output_format = get_output_format(data, split_by)
+            order = get_record_order(data)
+        except ValueError as option_error:
+            return jsonify({'error': str(option_error)}), 400
+        
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         
         if not os.path.exists(filepath):
@@ -735,27 +917,79 @@ def process_cars():
             job_folder = os.path.join(app.config['OUTPUT_FOLDER'], f"cars_{user_id}_{job_id}")
             os.makedirs(job_folder, exist_ok=True)
             
-            # Convert XLS to XLSX if needed
-            if filename.endswith('.xls'):
-                logger.info(f"Converting XLS to XLSX: {filename}")
-                try:
-                    filepath = convert_xls_to_xlsx(filepath, job_folder)
-                    logger.info(f"Conversion successful: {filepath}")
-                except Exception as conv_error:
-                    raise Exception(f"فشل تحويل ملف XLS: {str(conv_error)}")
+            zones = get_job_zones(user_id)
+            header_layouts = HeaderMapping.layouts_for_user(user_id)
             
-            # Extract data
-            logger.info(f"Extracting data from {filename} (mode: {mode})...")
-            try:
-                extracted_data = extract_data_from_excel(
-                    filepath,
-                    mode=mode,
-                    zone_points=app.config['ZONE_POINTS']
-                )
-            except Exception as extract_error:
-                raise Exception(f"فشل استخراج البيانات: {str(extract_error)}")
+            # نفس المحتوى بنفس الوضع والنطاقات: النتيجة من الذاكرة دون قراءة أو استخراج
+            cache_key = None
+            cached_records = None
+            if result_cache.enabled:
+                cache_key = make_cache_key(file_digest(filepath), mode, zones, header_layouts)
+                cached_records = result_cache.get(cache_key)
+            
+            # Extract data (XLS / iTrack HTML are read directly) and stream it into the summary report
+            report_name = report_filename(mode, job_id, split_by, output_format)
+            report_path = os.path.join(job_folder, report_name)
+            statistics = ExtractionStatistics()
+            writer = open_report_writer(report_path, mode, split_by, split_rows, output_format)
+            
+            if cached_records is not None:
+                logger.info(f"Result cache hit for {filename} (mode: {mode})")
+                statistics.add_batch(cached_records)
+                writer.extend(merge_batches([cached_records], order))
+            else:
+                logger.info(f"Extracting data from {filename} (mode: {mode}) into {report_name}...")
+                # السجلات تُجمع في أجزاء من CACHE_CHUNK_ROWS سجل فقط: كل جزء يُلحق بالذاكرة،
+                # ومع الترتيب الزمني يُرتَّب ويُكتب على القرص ثم تُدمج الأجزاء (k-way) بعد الاستخراج
+                ordered_runs = SpilledRecordMerge(order, job_folder) if order != 'source' else None
+                cache_entry = result_cache.open_entry(cache_key) if cache_key else None
+                builder = RecordBatchBuilder() if cache_entry is not None or ordered_runs is not None else None
+                
+                def store_chunk(chunk):
+                    if cache_entry is not None:
+                        cache_entry.append(chunk)
+                    if ordered_runs is not None:
+                        ordered_runs.add(chunk)
+                
+                try:
+                    for record in iter_records(
+                        filepath,
+                        mode=mode,
+                        zones=zones,
+                        parallel_sheets=True,
+                        max_workers=app.config.get('MAX_PROCESS_WORKERS'),
+                        header_layouts=header_layouts,
+                        engine=app.config.get('EXTRACTION_ENGINE'),
+                        statistics=statistics
+                    ):
+                        if ordered_runs is None:
+                            writer.append(record)
+                        if builder is not None:
+                            builder.append_record(record)
+                            if len(builder) >= CACHE_CHUNK_ROWS:
+                                store_chunk(builder.build())
+                                builder = RecordBatchBuilder()
+                    if builder is not None and len(builder):
+                        store_chunk(builder.build())
+                except Exception as extract_error:
+                    writer.discard()
+                    if cache_entry is not None:
+                        cache_entry.discard()
+                    if ordered_runs is not None:
+                        ordered_runs.close()
+                    raise Exception(f"فشل استخراج البيانات: {str(extract_error)}")
+                
+                if cache_entry is not None:
+                    if statistics.total_records:
+                        cache_entry.commit()
+                    else:
+                        cache_entry.discard()
+                if ordered_runs is not None:
+                    writer.extend(ordered_runs.merged())
+                    ordered_runs.close()
             
-            if not extracted_data:
+            if not writer.count:
+                writer.discard()
                 log.status = 'failed'
                 log.error_message = 'No data extracted'
                 log.completed_at = datetime.utcnow()
@@ -763,24 +997,17 @@ def process_cars():
                 return jsonify({'error': 'لم يتم العثور على بيانات في الملف'}), 400
             
             # Create summary report
-            report_name = f"Summary_Report_{mode}_{job_id}.xlsx"
-            report_path = os.path.join(job_folder, report_name)
-            
-            logger.info(f"Creating summary report: {report_name}")
             try:
-                create_summary_report(extracted_data, report_path, mode=mode)
+                writer.close()
             except Exception as report_error:
+                writer.discard()
                 raise Exception(f"فشل إنشاء التقرير: {str(report_error)}")
             
-            # Calculate statistics using the new function
-            stats = get_extraction_statistics(extracted_data)
+            stats = statistics.to_dict()
             
             # Update log
             log.status = 'completed'
-            log.records_processed = stats['total_records']
-            log.inside_zone = stats['inside_zone']
-            log.outside_zone = stats['outside_zone']
-            log.undefined_zone = stats['undefined_zone']
+            log.apply_statistics(stats)
             log.completed_at = datetime.utcnow()
             db.session.commit()
             
@@ -788,13 +1015,18 @@ def process_cars():
                 'success': True,
                 'job_id': job_id,
                 'report_filename': report_name,
+                'output_format': output_format,
+                'order': order,
                 'total_records': stats['total_records'],
                 'statistics': {
                     'inside_zone': stats['inside_zone'],
                     'outside_zone': stats['outside_zone'],
                     'undefined': stats['undefined_zone'],
                     'unique_cars': stats['unique_cars'],
-                    'sheets_processed': stats['sheets_processed']
+                    'sheets_processed': stats['sheets_processed'],
+                    'total_idle_seconds': stats['total_idle_seconds'],
+                    'max_idle_seconds': stats['max_idle_seconds'],
+                    'cars': stats['cars']
                 }
             }
             
@@ -1007,21 +1239,14 @@ def get_file_info(filename):
             'modified_at': datetime.fromtimestamp(file_stats.st_mtime).isoformat()
         }
         
-        # Try to get Excel-specific info
+        # Excel-specific info: sheet names, dimensions and header rows without loading cells
         if file_ext in ['.xlsx', '.xls']:
             try:
-                if file_ext == '.xlsx':
-                    import openpyxl
-                    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
-                    info['sheets'] = [ws.title for ws in wb.worksheets]
-                    info['sheets_count'] = len(wb.worksheets)
-                    wb.close()
-                else:
-                    import pandas as pd
-                    xls = pd.ExcelFile(filepath, engine='xlrd')
-                    info['sheets'] = xls.sheet_names
-                    info['sheets_count'] = len(xls.sheet_names)
-                    xls.close()
+                workbook_info = workbook_info_cache.get(filepath, HeaderMapping.layouts_for_user(user_id))
+                info['format'] = workbook_info['format']
+                info['sheets'] = [sheet['name'] for sheet in workbook_info['sheets']]
+                info['sheets_count'] = len(workbook_info['sheets'])
+                info['sheet_details'] = workbook_info['sheets']
             except Exception as excel_error:
                 logger.warning(f"Could not read Excel file info: {excel_error}")
                 info['sheets'] = []
@@ -1155,6 +1380,261 @@ def delete_favorite(favorite_id):
         return jsonify({'error': 'فشل حذف المفضلة'}), 500
 
 
+# ======================== GEOFENCES ======================== #
+@app.route('/api/geofences', methods=['GET'])
+@jwt_required()
+def get_geofences():
+    """Get user's named geofence library"""
+    try:
+        user_id = get_jwt_identity()
+        geofences = Geofence.query.filter_by(user_id=user_id).order_by(Geofence.name).all()
+        
+        return jsonify({
+            'success': True,
+            'geofences': [geofence.to_dict() for geofence in geofences],
+            'total': len(geofences)
+        })
+        
+    except Exception as e:
+        logger.error(f"Get geofences error: {e}")
+        return jsonify({'error': 'فشل جلب النطاقات'}), 500
+
+
+@app.route('/api/geofences', methods=['POST'])
+@jwt_required()
+def add_geofences():
+    """Add one geofence ({name, points}) or many ({geofences: [...]})"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        
+        items = data.get('geofences', [data])
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'قائمة النطاقات مطلوبة'}), 400
+        
+        created = []
+        for item in items:
+            if not isinstance(item, dict):
+                return jsonify({'error': 'بيانات النطاق غير صالحة'}), 400
+            
+            name = item.get('name')
+            if not isinstance(name, str) or not name.strip():
+                return jsonify({'error': 'اسم النطاق مطلوب'}), 400
+            name = name.strip()
+            
+            try:
+                polygon = parse_polygon(item.get('points'))
+            except ValueError as polygon_error:
+                return jsonify({'error': f'نقاط النطاق "{name}" غير صالحة: {polygon_error}'}), 400
+            
+            geofence = Geofence(user_id=user_id, name=name)
+            geofence.points = polygon.tolist()
+            db.session.add(geofence)
+            created.append(geofence)
+        
+        db.session.commit()
+        invalidate_cached_index(str(user_id))
+        
+        logger.info(f"{len(created)} geofence(s) added by user {user_id}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'تمت إضافة النطاقات',
+            'geofences': [geofence.to_dict() for geofence in created]
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Add geofences error: {e}")
+        return jsonify({'error': 'فشل إضافة النطاقات'}), 500
+
+
+@app.route('/api/geofences/<int:geofence_id>', methods=['PUT'])
+@jwt_required()
+def update_geofence(geofence_id):
+    """Rename a geofence or replace its polygon"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        geofence = Geofence.query.filter_by(id=geofence_id, user_id=user_id).first()
+        
+        if not geofence:
+            return jsonify({'error': 'النطاق غير موجود'}), 404
+        
+        if data.get('name'):
+            if not isinstance(data['name'], str) or not data['name'].strip():
+                return jsonify({'error': 'اسم النطاق غير صالح'}), 400
+            geofence.name = data['name'].strip()
+        
+        if 'points' in data:
+            try:
+                geofence.points = parse_polygon(data['points']).tolist()
+            except ValueError as polygon_error:
+                return jsonify({'error': f'نقاط النطاق غير صالحة: {polygon_error}'}), 400
+        
+        db.session.commit()
+        invalidate_cached_index(str(user_id))
+        
+        return jsonify({
+            'success': True,
+            'message': 'تم تحديث النطاق',
+            'geofence': geofence.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Update geofence error: {e}")
+        return jsonify({'error': 'فشل تحديث النطاق'}), 500
+
+
+@app.route('/api/geofences/<int:geofence_id>', methods=['DELETE'])
+@jwt_required()
+def delete_geofence(geofence_id):
+    """Delete geofence"""
+    try:
+        user_id = get_jwt_identity()
+        geofence = Geofence.query.filter_by(id=geofence_id, user_id=user_id).first()
+        
+        if not geofence:
+            return jsonify({'error': 'النطاق غير موجود'}), 404
+        
+        db.session.delete(geofence)
+        db.session.commit()
+        invalidate_cached_index(str(user_id))
+        
+        logger.info(f"Geofence deleted by user {user_id}: {geofence_id}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'تم حذف النطاق'
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Delete geofence error: {e}")
+        return jsonify({'error': 'فشل حذف النطاق'}), 500
+
+
+# ======================== HEADER MAPPINGS ======================== #
+@app.route('/api/header-mappings', methods=['GET'])
+@jwt_required()
+def get_header_mappings():
+    """Get user's manual header layouts"""
+    try:
+        user_id = get_jwt_identity()
+        mappings = HeaderMapping.query.filter_by(user_id=user_id).order_by(HeaderMapping.name).all()
+        
+        return jsonify({
+            'success': True,
+            'mappings': [mapping.to_dict() for mapping in mappings],
+            'total': len(mappings)
+        })
+        
+    except Exception as e:
+        logger.error(f"Get header mappings error: {e}")
+        return jsonify({'error': 'فشل جلب تخطيطات الأعمدة'}), 500
+
+
+@app.route('/api/header-mappings', methods=['POST'])
+@jwt_required()
+def add_header_mapping():
+    """
+    Save a manual column mapping for a report template
+    
+    Body: {filename, header_row, columns: {start, end, duration, address, coordinate}, name?, sheet?}
+    Columns may be letters ("B") or 1-based numbers.
+    """
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        
+        filename = secure_filename(data.get('filename') or '')
+        if not filename:
+            return jsonify({'error': 'اسم الملف مطلوب'}), 400
+        
+        name = data.get('name') or ''
+        if not isinstance(name, str):
+            return jsonify({'error': 'اسم التخطيط غير صالح'}), 400
+        
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'الملف غير موجود'}), 404
+        
+        try:
+            header_row = int(data.get('header_row'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'رقم صف الهيدر مطلوب'}), 400
+        if not 1 <= header_row <= HEADER_SCAN_ROWS:
+            return jsonify({'error': f'رقم صف الهيدر يجب أن يكون بين 1 و {HEADER_SCAN_ROWS}'}), 400
+        
+        columns = {}
+        for field in ('start', 'end', 'duration', 'address', 'coordinate'):
+            value = (data.get('columns') or {}).get(field)
+            if value in (None, ''):
+                columns[field] = None
+                continue
+            try:
+                columns[field] = int(value) if str(value).isdigit() else column_index_from_string(str(value).strip().upper())
+            except ValueError:
+                return jsonify({'error': f'عمود غير صالح للحقل {field}: {value}'}), 400
+        
+        if not any([columns['start'], columns['end'], columns['duration']]):
+            return jsonify({'error': 'يجب تحديد عمود وقت البداية أو النهاية أو المدة'}), 400
+        
+        # البصمة تُحسب بنفس القارئ الذي يستخدمه المستخرج (XLS يُقرأ مباشرة)
+        try:
+            fingerprint = sheet_layout_fingerprint(filepath, header_row, data.get('sheet'))
+        except ValueError as sheet_error:
+            return jsonify({'error': f'تعذر قراءة صف الهيدر: {sheet_error}'}), 400
+        
+        mapping = HeaderMapping.query.filter_by(user_id=user_id, fingerprint=fingerprint).first()
+        if not mapping:
+            mapping = HeaderMapping(user_id=user_id, fingerprint=fingerprint)
+            db.session.add(mapping)
+        mapping.name = name.strip() or filename
+        mapping.header_row = header_row
+        mapping.columns = columns
+        db.session.commit()
+        
+        logger.info(f"Header mapping saved by user {user_id}: row {header_row}, columns {columns}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'تم حفظ تخطيط الأعمدة',
+            'mapping': mapping.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Add header mapping error: {e}")
+        return jsonify({'error': 'فشل حفظ تخطيط الأعمدة'}), 500
+
+
+@app.route('/api/header-mappings/<int:mapping_id>', methods=['DELETE'])
+@jwt_required()
+def delete_header_mapping(mapping_id):
+    """Delete manual header layout"""
+    try:
+        user_id = get_jwt_identity()
+        mapping = HeaderMapping.query.filter_by(id=mapping_id, user_id=user_id).first()
+        
+        if not mapping:
+            return jsonify({'error': 'التخطيط غير موجود'}), 404
+        
+        db.session.delete(mapping)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'تم حذف التخطيط'
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Delete header mapping error: {e}")
+        return jsonify({'error': 'فشل حذف التخطيط'}), 500
+
+
 # ======================== PROCESSING LOGS ======================== #
 @app.route('/api/logs', methods=['GET'])
 @jwt_required()
@@ -1182,6 +1662,48 @@ def get_processing_logs():
         return jsonify({'error': 'فشل جلب السجلات'}), 500
 
 
+# ======================== RESULT CACHE ======================== #
+@app.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """Extraction result, header layout and location parsing cache counters"""
+    try:
+        return jsonify({
+            'success': True,
+            'result_cache': result_cache.stats(),
+            'header_layouts': get_layout_cache().stats(),
+            'workbook_info': workbook_info_cache.stats(),
+            'locations': location_cache_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"Cache stats error: {e}")
+        return jsonify({'error': 'فشل جلب إحصائيات الذاكرة المؤقتة'}), 500
+
+
+@app.route('/api/cache/clear', methods=['POST'])
+@jwt_required()
+def clear_cache():
+    """Drop all cached extraction results (admin only)"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user.is_admin:
+            return jsonify({'error': 'غير مصرح'}), 403
+        
+        result_cache.clear()
+        workbook_info_cache.clear()
+        logger.info(f"Result cache cleared by user {user.id}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'تم مسح الذاكرة المؤقتة'
+        })
+        
+    except Exception as e:
+        logger.error(f"Cache clear error: {e}")
+        return jsonify({'error': 'فشل مسح الذاكرة المؤقتة'}), 500
+
+
 # ======================== CLEANUP ======================== #
 @app.route('/api/cleanup', methods=['POST'])
 @jwt_required()
@@ -1278,10 +1800,29 @@ def ratelimit_handler(e):
 
 
 # ======================== DATABASE INITIALIZATION ======================== #
+def init_database():
+    """Create missing tables and columns (run once, not in every gunicorn worker)"""
+    try:
+        db.create_all()
+    except OperationalError as e:
+        # تهيئة متزامنة من عملية أخرى أنشأت بعض الجداول: إعادة المحاولة تكمل الباقي
+        if 'already exists' not in str(e).lower():
+            raise
+        db.create_all()
+    upgrade_schema()
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing database tables and columns before the workers start"""
+    init_database()
+    logger.info(f"Database initialized: {DB_FILE}")
+
+
 if __name__ == '__main__':
     with app.app_context():
         # Create all database tables
-        db.create_all()
+        init_database()
         logger.info("Database tables created successfully")
         logger.info(f"Database location: {DB_FILE}")
         
@@ -35,6 +35,19 @@ class Config:
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100 MB
     ALLOWED_EXTENSIONS = {'xls', 'xlsx'}
     
+    # Parallel processing (0 = size the pool from the container CPU quota)
+    MAX_PROCESS_WORKERS = int(os.environ.get('MAX_PROCESS_WORKERS', 0))
+    
+    # Location parsing engine ('row' parses cell by cell, 'vectorized' parses whole columns with pandas)
+    EXTRACTION_ENGINE = os.environ.get('EXTRACTION_ENGINE', 'row')
+    
+    # Records per workbook when a summary report is split by size into a ZIP
+    REPORT_SPLIT_ROWS = int(os.environ.get('REPORT_SPLIT_ROWS', 500000))
+    
+    # Extraction result cache (keyed by file SHA-256, mode and zone set; 0 disables)
+    RESULT_CACHE_DIR = os.path.join(DATA_DIR, 'result_cache')
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_MB', 512)) * 1024 * 1024
+    
     # Application Settings
     CLEANUP_AFTER_HOURS = 24
     ZONE_POINTS = [
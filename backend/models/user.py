@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta
+import json
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import OperationalError
 
 db = SQLAlchemy()
 
@@ -28,6 +30,8 @@ class User(UserMixin, db.Model):
     subscription = db.relationship('Subscription', backref='user', lazy=True, uselist=False)
     favorites = db.relationship('Favorite', backref='user', lazy=True)
     processing_logs = db.relationship('ProcessingLog', backref='user', lazy=True)
+    geofences = db.relationship('Geofence', backref='user', lazy=True)
+    header_mappings = db.relationship('HeaderMapping', backref='user', lazy=True)
     
     def __init__(self, email, username, password, full_name=None):
         self.email = email
@@ -185,6 +189,11 @@ class ProcessingLog(db.Model):
     inside_zone = db.Column(db.Integer, default=0)
     outside_zone = db.Column(db.Integer, default=0)
     undefined_zone = db.Column(db.Integer, default=0)
+    unique_cars = db.Column(db.Integer, default=0)
+    total_idle_seconds = db.Column(db.Integer, default=0)
+    max_idle_seconds = db.Column(db.Integer, default=0)
+    car_stats_json = db.Column(db.Text)  # {"car_code": {"stops", "total_idle_seconds", "max_idle_seconds", "zones"}}
+    duplicates_dropped = db.Column(db.Integer, default=0)
     
     # Timing
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -193,6 +202,23 @@ class ProcessingLog(db.Model):
     # Error handling
     error_message = db.Column(db.Text)
     
+    @property
+    def car_statistics(self):
+        """Per-car counters collected during extraction"""
+        return json.loads(self.car_stats_json) if self.car_stats_json else {}
+    
+    def apply_statistics(self, stats):
+        """Copy an ExtractionStatistics.to_dict() result onto the log"""
+        self.records_processed = stats['total_records']
+        self.inside_zone = stats['inside_zone']
+        self.outside_zone = stats['outside_zone']
+        self.undefined_zone = stats['undefined_zone']
+        self.unique_cars = stats.get('unique_cars', 0)
+        self.total_idle_seconds = stats.get('total_idle_seconds', 0)
+        self.max_idle_seconds = stats.get('max_idle_seconds', 0)
+        self.duplicates_dropped = stats.get('duplicates_dropped', 0)
+        self.car_stats_json = json.dumps(stats.get('cars') or {}, ensure_ascii=False)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -204,7 +230,12 @@ class ProcessingLog(db.Model):
             'statistics': {
                 'inside_zone': self.inside_zone,
                 'outside_zone': self.outside_zone,
-                'undefined_zone': self.undefined_zone
+                'undefined_zone': self.undefined_zone,
+                'unique_cars': self.unique_cars or 0,
+                'total_idle_seconds': self.total_idle_seconds or 0,
+                'max_idle_seconds': self.max_idle_seconds or 0,
+                'duplicates_dropped': self.duplicates_dropped or 0,
+                'cars': self.car_statistics
             },
             'started_at': self.started_at.isoformat(),
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
@@ -212,3 +243,111 @@ class ProcessingLog(db.Model):
     
     def __repr__(self):
         return f'<ProcessingLog {self.id} - {self.status}>'
+
+
+class Geofence(db.Model):
+    __tablename__ = 'geofences'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    name = db.Column(db.String(200), nullable=False)
+    points_json = db.Column(db.Text, nullable=False)  # [[lat, lon], ...]
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def points(self):
+        """Polygon vertices as [[lat, lon], ...]"""
+        return json.loads(self.points_json)
+    
+    @points.setter
+    def points(self, value):
+        self.points_json = json.dumps([[float(lat), float(lon)] for lat, lon in value])
+    
+    @staticmethod
+    def library_version(user_id):
+        """Cheap version stamp of a user's geofence library (changes on any add/edit/delete)"""
+        count, last_update, max_id = db.session.query(
+            db.func.count(Geofence.id),
+            db.func.max(Geofence.updated_at),
+            db.func.max(Geofence.id)
+        ).filter(Geofence.user_id == user_id).one()
+        return (count, last_update.isoformat() if last_update else None, max_id)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'points': self.points,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<Geofence {self.name}>'
+
+
+class HeaderMapping(db.Model):
+    __tablename__ = 'header_mappings'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    name = db.Column(db.String(200), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # بصمة الصفوف حتى صف الهيدر
+    header_row = db.Column(db.Integer, nullable=False)
+    columns_json = db.Column(db.Text, nullable=False)  # {"start": 2, "end": 3, ...}
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def columns(self):
+        """1-based column positions keyed by field"""
+        return json.loads(self.columns_json)
+    
+    @columns.setter
+    def columns(self, value):
+        self.columns_json = json.dumps(value)
+    
+    @staticmethod
+    def layouts_for_user(user_id):
+        """User's manual layouts as {fingerprint: (header_row, columns)} for the extractor"""
+        mappings = HeaderMapping.query.filter_by(user_id=user_id).order_by(HeaderMapping.id).all()
+        return {m.fingerprint: (m.header_row, m.columns) for m in mappings}
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'header_row': self.header_row,
+            'columns': self.columns,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<HeaderMapping {self.name}>'
+
+
+def upgrade_schema():
+    """
+    Add columns introduced after a table was first created
+    
+    db.create_all() only creates missing tables, so existing databases get new
+    nullable columns through ALTER TABLE ... ADD COLUMN. A column added by a
+    concurrent process in the meantime counts as success.
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            except OperationalError as e:
+                if 'duplicate column' not in str(e).lower():
+                    raise
@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, time, timedelta
+
+# الاختبارات تستورد الوحدات كما يستوردها app.py (من مجلد backend)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# ذاكرة تخطيطات الهيدر في مجلد مؤقت بدلًا من backend/data
+os.environ.setdefault(
+    'HEADER_LAYOUT_CACHE', os.path.join(tempfile.mkdtemp(prefix='xtractor_tests_'), 'header_layouts.json')
+)
+
+import openpyxl
+import pytest
+
+
+TRACKING_HEADER = ['#', 'Start', 'End', 'Duration', 'Address', 'Coordinates']
+
+# ورقتان بتنسيق تقارير التتبع: صف السيارة ثم الهيدر في الصف 4 ثم التوقفات
+SAMPLE_SHEETS = {
+    '101': [
+        [1, datetime(2024, 1, 1, 8, 0), datetime(2024, 1, 1, 8, 30), time(0, 30), 'Main St', '24.7136, 46.6753'],
+        [2, '2024-01-01 09:00:00', '2024-01-01 10:00:00', '1:00:00', 'Road 5', '24.8, 46.7'],
+        [3, datetime(2024, 1, 1, 11, 0), datetime(2024, 1, 2, 17, 5), timedelta(hours=30, minutes=5), None, None],
+    ],
+    '102': [
+        [1, datetime(2024, 1, 1, 7, 0), datetime(2024, 1, 1, 7, 10), time(0, 10), 'King Rd', '24.6, 46.5'],
+        [2, datetime(2024, 1, 1, 9, 30), datetime(2024, 1, 1, 9, 45), time(0, 15), 'King Rd', '24.6, 46.5'],
+    ],
+}
+
+
+def write_tracking_workbook(path, sheets):
+    """
+    كتابة مصنف تتبع صغير
+
+    Args:
+        path: مسار الملف
+        sheets: {اسم الورقة (كود السيارة): [صفوف التوقفات]}
+
+    Returns:
+        str: مسار الملف
+    """
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for title, rows in sheets.items():
+        ws = wb.create_sheet(title)
+        ws.append([f'Vehicle: {title}'])
+        ws.append([])
+        ws.append([])
+        ws.append(TRACKING_HEADER)
+        for row in rows:
+            ws.append(row)
+            duration = ws.cell(row=ws.max_row, column=4)
+            # المدد من 24 ساعة فأكثر تُحفظ كما يحفظها Excel بتنسيق [h]:mm:ss
+            if isinstance(duration.value, timedelta):
+                duration.number_format = '[h]:mm:ss'
+    wb.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def make_workbook(tmp_path):
+    def make(sheets, name='tracking.xlsx'):
+        return write_tracking_workbook(tmp_path / name, sheets)
+    return make
+
+
+@pytest.fixture
+def sample_workbook(make_workbook):
+    return make_workbook(SAMPLE_SHEETS)
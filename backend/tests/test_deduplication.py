@@ -0,0 +1,102 @@
+from datetime import datetime
+
+from utils.record_batch import RecordBatch
+from utils.record_merge import RecordDeduplicator, record_keys
+
+
+def stop(start_time, end_time, car_code='101', coordinates='24.7,46.6', sheet='weekly', duration='0:30:00'):
+    return {
+        'car_code': car_code,
+        'start_time': start_time,
+        'end_time': end_time,
+        'duration': duration,
+        'coordinates': coordinates,
+        'zone': 'خارج النطاق',
+        'address': '',
+        'source_sheet': sheet
+    }
+
+
+MORNING = (datetime(2024, 1, 1, 8, 0), datetime(2024, 1, 1, 8, 30))
+NOON = (datetime(2024, 1, 1, 12, 0), datetime(2024, 1, 1, 12, 45))
+
+
+def test_drops_duplicates_across_uploads():
+    dedup = RecordDeduplicator()
+    weekly = RecordBatch.from_records([stop(*MORNING), stop(*NOON)])
+    daily = RecordBatch.from_records([
+        stop(*NOON, sheet='daily'),
+        stop(datetime(2024, 1, 2, 9), datetime(2024, 1, 2, 9, 5))
+    ])
+
+    assert dedup.filter(weekly) is weekly
+    kept = dedup.filter(daily).to_dicts()
+
+    assert [record['start_time'] for record in kept] == [datetime(2024, 1, 2, 9)]
+    assert dedup.dropped == 1
+
+
+def test_first_occurrence_kept_within_batch():
+    dedup = RecordDeduplicator()
+    batch = RecordBatch.from_records([stop(*MORNING, sheet='first'), stop(*NOON), stop(*MORNING, sheet='second')])
+
+    kept = dedup.filter(batch).to_dicts()
+
+    assert [record['source_sheet'] for record in kept] == ['first', 'weekly']
+    assert dedup.dropped == 1
+
+
+def test_key_fields():
+    # سيارة أو إحداثيات أو وقت نهاية مختلف = توقف مختلف
+    dedup = RecordDeduplicator()
+    batch = RecordBatch.from_records([
+        stop(*MORNING),
+        stop(*MORNING, car_code='102'),
+        stop(*MORNING, coordinates='24.8,46.7'),
+        stop(MORNING[0], NOON[1]),
+        # المدة والورقة ليستا من المفتاح
+        stop(*MORNING, duration='0:31:00', sheet='daily'),
+    ])
+
+    assert len(dedup.filter(batch)) == 4
+    assert dedup.dropped == 1
+
+
+def test_text_time_matches_datetime():
+    dedup = RecordDeduplicator()
+    dedup.filter(RecordBatch.from_records([stop(*MORNING)]))
+    text = RecordBatch.from_records([stop('2024-01-01 08:00:00', '01/01/2024 08:30')])
+
+    assert len(dedup.filter(text)) == 0
+    assert record_keys(text)[0] == record_keys(RecordBatch.from_records([stop(*MORNING)]))[0]
+
+
+def test_rows_without_times_are_kept():
+    # صفوف المدة فقط تتشارك نفس المفتاح لكنها توقفات مختلفة
+    dedup = RecordDeduplicator()
+    batch = RecordBatch.from_records([
+        stop(None, None, duration='0:10:00'),
+        stop(None, None, duration='0:20:00'),
+        stop('', '', duration='0:30:00'),
+        stop(MORNING[0], None),
+        stop(MORNING[0], None),
+    ])
+
+    assert dedup.filter(batch) is batch
+    assert dedup.filter(batch) is batch
+    assert dedup.dropped == 0
+
+
+def test_unparseable_text_times_are_keys():
+    dedup = RecordDeduplicator()
+    batch = RecordBatch.from_records([stop('yesterday', 'today'), stop('yesterday', 'today')])
+
+    assert len(dedup.filter(batch)) == 1
+    assert dedup.dropped == 1
+
+
+def test_empty_batch():
+    dedup = RecordDeduplicator()
+    empty = RecordBatch.empty()
+    assert dedup.filter(empty) is empty
+    assert dedup.dropped == 0
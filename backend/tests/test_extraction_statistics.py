@@ -0,0 +1,76 @@
+from datetime import datetime, time, timedelta
+
+import pytest
+
+from utils.data_extractor import (
+    ExtractionStatistics, duration_seconds, excel_elapsed, extract_data_from_excel, get_extraction_statistics,
+    parse_duration
+)
+from utils.record_batch import RecordBatch
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1:30:15', 5415),
+    ('45:30', 163800),
+    ('1 day, 2:00:00', 93600),
+    (time(0, 30), 1800),
+    (timedelta(hours=30, minutes=5), 108300),
+    (0.5, 43200),
+    # [h]:mm:ss من 24 ساعة فأكثر يقرؤها openpyxl كـ datetime في بداية تقويم 1900
+    (datetime(1900, 1, 1, 6, 5), 108300),
+    (datetime(1900, 1, 1), 86400),
+])
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == expected
+    assert duration_seconds(value) == expected
+
+
+@pytest.mark.parametrize('value', [None, '', '  ', 'n/a', True, float('nan'), datetime(2024, 1, 1, 8, 0)])
+def test_unknown_duration(value):
+    assert parse_duration(value) is None
+    assert duration_seconds(value) == 0
+
+
+def test_excel_elapsed():
+    assert excel_elapsed(datetime(1900, 1, 1, 6, 5)) == timedelta(hours=30, minutes=5)
+    assert excel_elapsed(datetime(2024, 1, 1)) is None
+    assert excel_elapsed('30:05:00') is None
+
+
+def test_statistics_counters(sample_workbook):
+    stats = get_extraction_statistics(extract_data_from_excel(sample_workbook))
+
+    assert stats['total_records'] == 5
+    assert stats['unique_cars'] == 2
+    assert stats['sheets_processed'] == 2
+    assert stats['outside_zone'] == 4
+    assert stats['undefined_zone'] == 1
+    assert stats['total_idle_seconds'] == 1800 + 3600 + 108300 + 600 + 900
+    assert stats['max_idle_seconds'] == 108300
+
+    car = stats['cars']['101']
+    assert car['stops'] == 3
+    assert car['total_idle_seconds'] == 1800 + 3600 + 108300
+    assert car['max_idle_seconds'] == 108300
+    assert sum(car['zones'].values()) == 3
+    assert stats['cars']['102']['stops'] == 2
+
+
+@pytest.mark.parametrize('as_batch', [False, True])
+def test_statistics_during_extraction(sample_workbook, as_batch):
+    statistics = ExtractionStatistics()
+    data = extract_data_from_excel(sample_workbook, as_batch=as_batch, statistics=statistics)
+
+    assert statistics.to_dict() == get_extraction_statistics(data)
+
+
+def test_add_batch_matches_add(sample_workbook):
+    records = extract_data_from_excel(sample_workbook)
+
+    by_record = ExtractionStatistics()
+    for record in records:
+        by_record.add(record)
+    by_batch = ExtractionStatistics()
+    by_batch.add_batch(RecordBatch.from_records(records))
+
+    assert by_batch.to_dict() == by_record.to_dict()
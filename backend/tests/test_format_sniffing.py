@@ -0,0 +1,109 @@
+import zipfile
+
+import pytest
+
+from utils import sheet_readers
+from utils.excel_processor import validate_excel_file
+from utils.sheet_readers import sniff_file_format
+
+
+def ole2_header(byte_order=b'\xfe\xff'):
+    header = bytearray(512)
+    header[:8] = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+    header[28:30] = byte_order
+    return bytes(header)
+
+
+def write_zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w', compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+def test_xlsx(sample_workbook):
+    assert sniff_file_format(sample_workbook) == 'xlsx'
+
+
+def test_xls_header(tmp_path):
+    path = tmp_path / 'report.xls'
+    path.write_bytes(ole2_header() + b'\x00' * 512)
+    assert sniff_file_format(str(path)) == 'xls'
+
+
+@pytest.mark.parametrize('content', [
+    b'\xef\xbb\xbf<!DOCTYPE html><html><body><table></table></body></html>',
+    b'  <HTML>\r\n<TABLE border=1><TR><TD>x</TD></TR></TABLE>',
+    b'<meta charset="utf-8"><table><tr><td>x</td></tr></table>',
+])
+def test_html_disguised_as_xls(tmp_path, content):
+    path = tmp_path / 'report.xls'
+    path.write_bytes(content)
+    assert sniff_file_format(str(path)) == 'html'
+
+
+@pytest.mark.parametrize('content, message', [
+    (b'', "File is empty"),
+    (b'Car,Start,End\n101,08:00,08:30\n', "Unsupported file format"),
+    (b'%PDF-1.7\n', "Unsupported file format"),
+    (ole2_header(byte_order=b'\x00\x00'), "invalid compound document header"),
+    (ole2_header()[:100], "invalid compound document header"),
+    (b'PK\x03\x04' + b'\x00' * 100, "Corrupt XLSX file"),
+])
+def test_rejected_content(tmp_path, content, message):
+    path = tmp_path / 'upload.xls'
+    path.write_bytes(content)
+    with pytest.raises(ValueError, match=message):
+        sniff_file_format(str(path))
+
+
+def test_zip_without_content_types(tmp_path):
+    path = write_zip(tmp_path / 'archive.xlsx', {'readme.txt': 'not a workbook'})
+    with pytest.raises(ValueError, match=r"\[Content_Types\].xml is missing"):
+        sniff_file_format(path)
+
+
+def test_compression_ratio_guard(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheet_readers, '_RATIO_MIN_SIZE', 1024)
+    path = write_zip(tmp_path / 'bomb.xlsx', {
+        '[Content_Types].xml': '<Types/>',
+        'xl/worksheets/sheet1.xml': b'\x00' * (1024 * 1024)
+    })
+    with pytest.raises(ValueError, match="Suspicious compression ratio in xl/worksheets/sheet1.xml"):
+        sniff_file_format(path)
+
+
+def test_uncompressed_size_guard(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheet_readers, 'MAX_UNCOMPRESSED_SIZE', 1024 * 1024)
+    members = {'[Content_Types].xml': '<Types/>'}
+    members.update({f'xl/worksheets/sheet{idx}.xml': b'\x00' * (400 * 1024) for idx in range(1, 4)})
+    path = write_zip(tmp_path / 'large.xlsx', members, zipfile.ZIP_STORED)
+    with pytest.raises(ValueError, match="limit 1 MB"):
+        sniff_file_format(path)
+
+
+def test_sniffing_does_not_decompress(tmp_path, monkeypatch):
+    path = write_zip(tmp_path / 'lazy.xlsx', {'[Content_Types].xml': '<Types/>', 'xl/workbook.xml': 'x' * 4096})
+
+    def fail(*args, **kwargs):
+        raise AssertionError("archive member was opened")
+
+    monkeypatch.setattr(zipfile.ZipFile, 'open', fail)
+    assert sniff_file_format(path) == 'xlsx'
+
+
+def test_validate_excel_file(sample_workbook, tmp_path):
+    assert validate_excel_file(sample_workbook) == (True, 'xlsx', None)
+
+    html = tmp_path / 'itrack.xls'
+    html.write_bytes(b'<html><table><tr><td>x</td></tr></table></html>')
+    assert validate_excel_file(str(html)) == (True, 'html', None)
+
+    garbage = tmp_path / 'garbage.xlsx'
+    garbage.write_bytes(b'not a workbook')
+    is_valid, file_type, error = validate_excel_file(str(garbage))
+    assert not is_valid
+    assert file_type == 'xlsx'
+    assert error.startswith("Invalid XLSX file: Unsupported file format")
+
+    assert validate_excel_file(str(tmp_path / 'notes.txt'))[0] is False
@@ -0,0 +1,155 @@
+from datetime import datetime, time
+
+import pytest
+
+from utils.data_extractor import extract_data_from_excel
+from utils.sheet_readers import HtmlSheetReader, XlsSheetReader, open_legacy_reader, open_sheet_reader
+
+
+ITRACK_REPORT = """<html>
+<head><meta http-equiv="Content-Type" content="text/html; charset=windows-1256"></head>
+<body>
+<table>
+<tr><td colspan="6">Vehicle: 101</td></tr>
+<tr><td></td></tr>
+<tr><td></td></tr>
+<tr><th>#</th><th>Start</th><th>End</th><th>Duration</th><th>Address</th><th>Coordinates</th></tr>
+<tr><td>1</td><td>2024-01-01 08:00:00</td><td>2024-01-01 08:30:00</td><td>0:30:00</td>
+    <td>شارع   الملك
+    فهد</td><td>24.7136, 46.6753</td></tr>
+<tr><td>2</td><td>2024-01-01 09:00:00</td><td>2024-01-01 10:00:00</td><td>1:00:00</td><td>Road 5</td><td>24.8, 46.7</td></tr>
+</table>
+<table>
+<tr><td>Vehicle: 102</td></tr>
+<tr><td></td></tr>
+<tr><td></td></tr>
+<tr><th>#</th><th>Start</th><th>End</th><th>Duration</th><th>Address</th><th>Coordinates</th></tr>
+<tr><td>1</td><td>2024-01-01 07:00:00</td><td>2024-01-01 07:10:00</td><td>0:10:00</td><td>King Rd</td><td>24.6, 46.5</td></tr>
+</table>
+</body>
+</html>
+"""
+
+
+@pytest.fixture
+def html_report(tmp_path):
+    path = tmp_path / 'itrack.xls'
+    path.write_bytes(ITRACK_REPORT.encode('windows-1256'))
+    return str(path)
+
+
+def write_html(tmp_path, body, name='report.xls'):
+    path = tmp_path / name
+    path.write_text(f'<html><body>{body}</body></html>', encoding='utf-8')
+    return str(path)
+
+
+def test_html_tables_are_sheets(html_report):
+    with open_sheet_reader(html_report) as reader:
+        assert isinstance(reader, HtmlSheetReader)
+        assert reader.sheet_names == ['iTrack Report', 'iTrack Report (2)']
+        rows = list(reader.iter_rows(0))
+
+    assert rows[0] == ('Vehicle: 101',)
+    assert rows[1] == ()
+    assert rows[3] == ('#', 'Start', 'End', 'Duration', 'Address', 'Coordinates')
+    # المسافات مختصرة ونص الملف بترميزه المعلن
+    assert rows[4][4] == 'شارع الملك فهد'
+
+
+def test_html_extraction(html_report):
+    records = extract_data_from_excel(html_report)
+
+    assert [record['car_code'] for record in records] == ['101', '101', '102']
+    assert records[0]['address'] == 'شارع الملك فهد'
+    assert records[0]['coordinates'] == '24.7136,46.6753'
+    assert records[2]['source_sheet'] == 'iTrack Report (2)'
+    assert extract_data_from_excel(html_report, as_batch=True).to_dicts() == records
+
+
+def test_html_spans(tmp_path):
+    path = write_html(tmp_path, """<table>
+        <tr><td rowspan="2">A</td><td colspan="2">B</td><td>C</td></tr>
+        <tr><td>D</td><td>E</td><td rowspan="2">F</td></tr>
+        <tr><td>G</td><td>H</td><td>I</td></tr>
+        <tr><td>J</td></tr>
+    </table>""")
+
+    with HtmlSheetReader(path) as reader:
+        assert list(reader.iter_rows(0)) == [
+            ('A', 'B', None, 'C'),
+            (None, 'D', 'E', 'F'),
+            ('G', 'H', 'I'),
+            ('J',),
+        ]
+
+
+def test_html_nested_tables(tmp_path):
+    path = write_html(tmp_path, """<table>
+        <tr><td>outer</td><td><table><tr><td>inner</td><td>cell</td></tr></table></td></tr>
+        <tr><td>last</td></tr>
+    </table>
+    <table><tr><td>second</td></tr></table>""")
+
+    with HtmlSheetReader(path) as reader:
+        assert len(reader.sheet_names) == 2
+        assert list(reader.iter_rows(0)) == [('outer', 'innercell'), ('last',)]
+        assert list(reader.iter_rows(1)) == [('second',)]
+        # إعادة قراءة ورقة سابقة تبدأ المستند من جديد
+        assert list(reader.iter_rows(0))[1] == ('last',)
+
+
+def test_html_sheets_counted_lazily(tmp_path):
+    path = write_html(tmp_path, '<table><tr><td>only</td></tr></table>')
+
+    with HtmlSheetReader(path) as reader:
+        assert reader._table_count is None
+        assert list(reader.iter_rows(0)) == [('only',)]
+        with pytest.raises(IndexError):
+            list(reader.iter_rows(1))
+        assert reader._table_count == 1
+
+
+def test_html_without_tables(tmp_path):
+    path = write_html(tmp_path, '<div>No data</div>')
+
+    reader = open_legacy_reader(path)
+    with pytest.raises(ValueError, match="No <table> elements"):
+        reader.sheet_names
+    reader.close()
+
+
+def test_open_legacy_reader_rejects_xlsx(sample_workbook):
+    with pytest.raises(ValueError, match="Unsupported file format"):
+        open_legacy_reader(sample_workbook)
+
+
+def test_xls_direct_extraction(tmp_path, sample_workbook):
+    xlwt = pytest.importorskip('xlwt')
+
+    book = xlwt.Workbook()
+    sheet = book.add_sheet('101')
+    rows = [
+        ['Vehicle: 101'], [], [],
+        ['#', 'Start', 'End', 'Duration', 'Address', 'Coordinates'],
+        [1, datetime(2024, 1, 1, 8, 0), datetime(2024, 1, 1, 8, 30), time(0, 30), 'Main St', '24.7136, 46.6753'],
+    ]
+    date_style = xlwt.easyxf(num_format_str='YYYY-MM-DD HH:MM:SS')
+    time_style = xlwt.easyxf(num_format_str='h:mm:ss')
+    for row_index, row in enumerate(rows):
+        for col_index, value in enumerate(row):
+            if isinstance(value, datetime):
+                sheet.write(row_index, col_index, value, date_style)
+            elif isinstance(value, time):
+                sheet.write(row_index, col_index, value, time_style)
+            else:
+                sheet.write(row_index, col_index, value)
+    path = str(tmp_path / 'tracking.xls')
+    book.save(path)
+
+    with open_sheet_reader(path) as reader:
+        assert isinstance(reader, XlsSheetReader)
+        assert list(reader.iter_rows(0))[4] == tuple(rows[4])
+
+    records = extract_data_from_excel(path)
+    assert records == extract_data_from_excel(sample_workbook)[:1]
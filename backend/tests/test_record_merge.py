@@ -0,0 +1,105 @@
+from datetime import datetime
+
+import pytest
+
+from utils import record_merge
+from utils.record_batch import RecordBatch
+from utils.record_merge import SpilledRecordMerge, merge_batches, merge_record_streams, sort_time
+
+
+def stop(car_code, start_time, sheet, address=''):
+    return {
+        'car_code': car_code,
+        'start_time': start_time,
+        'end_time': None,
+        'duration': '0:10:00',
+        'coordinates': '',
+        'zone': 'غير محدد',
+        'address': address,
+        'source_sheet': sheet
+    }
+
+
+@pytest.fixture
+def file_batches():
+    # ملفان، كل ورقة مرتبة زمنيًا لسيارة واحدة، وبعض الأوقات نصية
+    first = RecordBatch.from_records([
+        stop('102', datetime(2024, 1, 1, 7, 0), 'a/102'),
+        stop('102', datetime(2024, 1, 1, 9, 30), 'a/102'),
+        stop('101', datetime(2024, 1, 1, 8, 0), 'a/101'),
+        stop('101', '01/01/2024 12:00', 'a/101'),
+        stop('101', 'unknown', 'a/101'),
+    ])
+    second = RecordBatch.from_records([
+        stop('101', datetime(2024, 1, 1, 6, 0), 'b/101'),
+        stop('101', '2024-01-01 09:30:00', 'b/101', address='second file'),
+        stop('103', datetime(2024, 1, 1, 10, 0), 'b/103'),
+    ])
+    return [first, second]
+
+
+def start_times(records):
+    return [sort_time(record['start_time']) for record in records]
+
+
+def test_sort_time():
+    assert sort_time(datetime(2024, 1, 1)) == datetime(2024, 1, 1)
+    assert sort_time('01/01/2024 12:00') == datetime(2024, 1, 1, 12, 0)
+    assert sort_time('unknown') is None
+    assert sort_time(None) is None
+
+
+def test_merge_by_time(file_batches):
+    records = list(merge_batches(file_batches, 'time'))
+    times = start_times(records)
+
+    assert len(records) == 8
+    assert times[:-1] == sorted(times[:-1])
+    # الأوقات غير المفهومة في النهاية
+    assert records[-1]['start_time'] == 'unknown'
+    # السجلات المتساوية في الوقت تبقى بترتيب الملفات
+    ties = [record['address'] for record, value in zip(records, times) if value == datetime(2024, 1, 1, 9, 30)]
+    assert ties == ['', 'second file']
+
+
+def test_merge_by_car_then_time(file_batches):
+    records = list(merge_batches(file_batches, 'car,time'))
+
+    assert [record['car_code'] for record in records] == ['101'] * 5 + ['102'] * 2 + ['103']
+    car_times = start_times(records[:4])
+    assert car_times == sorted(car_times)
+
+
+def test_source_order_concatenates(file_batches):
+    merged = merge_batches(file_batches, 'source')
+    assert merged.to_dicts() == file_batches[0].to_dicts() + file_batches[1].to_dicts()
+
+
+def test_merge_record_streams_is_lazy():
+    def stream(times):
+        for value in times:
+            yield stop('101', value, 's')
+        raise AssertionError("stream read past the merged prefix")
+
+    merged = merge_record_streams([stream([datetime(2024, 1, 1, 1)]), stream([datetime(2024, 1, 1, 2)])], 'time')
+    assert next(merged)['start_time'] == datetime(2024, 1, 1, 1)
+
+
+def test_unknown_order():
+    with pytest.raises(ValueError, match="Unknown record order"):
+        SpilledRecordMerge('source')
+    with pytest.raises(ValueError, match="Unknown record order"):
+        record_merge.record_sort_key('zone')
+
+
+@pytest.mark.parametrize('order', ['time', 'car,time'])
+def test_spilled_merge_matches_in_memory(file_batches, tmp_path, monkeypatch, order):
+    # أجزاء صغيرة لتمر السلاسل بعدة أجزاء على القرص
+    monkeypatch.setattr(record_merge, 'MERGE_CHUNK_SIZE', 2)
+    expected = list(merge_batches(file_batches, order))
+
+    with SpilledRecordMerge(order, str(tmp_path)) as runs:
+        for batch in file_batches:
+            runs.add(batch)
+        runs.add(RecordBatch.empty())
+        assert list(runs.merged()) == expected
@@ -0,0 +1,63 @@
+from datetime import datetime, time, timedelta
+
+import pytest
+
+from utils.data_extractor import extract_data_from_excel
+from utils.sheet_readers import LxmlSheetReader, OpenpyxlSheetReader, open_sheet_reader
+
+
+def read_all(file_path, backend):
+    with open_sheet_reader(file_path, backend) as reader:
+        return {name: [tuple(row) for row in reader.iter_rows(idx)] for idx, name in enumerate(reader.sheet_names)}
+
+
+def test_open_sheet_reader_backends(sample_workbook):
+    with open_sheet_reader(sample_workbook, 'lxml') as reader:
+        assert isinstance(reader, LxmlSheetReader)
+    with open_sheet_reader(sample_workbook, 'openpyxl') as reader:
+        assert isinstance(reader, OpenpyxlSheetReader)
+
+
+def test_unknown_backend(sample_workbook):
+    with pytest.raises(ValueError, match="Unknown sheet reader"):
+        open_sheet_reader(sample_workbook, 'pandas')
+
+
+def test_backends_read_identical_rows(sample_workbook):
+    lxml_rows = read_all(sample_workbook, 'lxml')
+    assert list(lxml_rows) == ['101', '102']
+    assert lxml_rows == read_all(sample_workbook, 'openpyxl')
+
+
+def test_lxml_cell_types(sample_workbook):
+    rows = read_all(sample_workbook, 'lxml')['101']
+    assert rows[0] == ('Vehicle: 101',)
+    assert rows[4][:4] == (1, datetime(2024, 1, 1, 8, 0), datetime(2024, 1, 1, 8, 30), time(0, 30))
+    assert rows[5][1] == '2024-01-01 09:00:00'
+
+
+@pytest.mark.parametrize('as_batch', [False, True])
+def test_backends_extract_identical_records(sample_workbook, as_batch):
+    records = {
+        backend: extract_data_from_excel(sample_workbook, reader=backend, as_batch=as_batch)
+        for backend in ('lxml', 'openpyxl')
+    }
+    if as_batch:
+        records = {backend: batch.to_dicts() for backend, batch in records.items()}
+
+    assert records['lxml'] == records['openpyxl']
+    assert len(records['lxml']) == 5
+    assert records['lxml'][2]['duration'] == timedelta(hours=30, minutes=5)
+
+
+def test_head_rows_match_iter_rows(sample_workbook):
+    with LxmlSheetReader(sample_workbook) as reader:
+        head = reader.head_rows(0, 5)
+        # النصوص المشتركة لا تُحمَّل كاملة لقراءة الهيدر
+        assert reader._shared_strings is None
+        assert head == list(reader.iter_rows(0))[:5]
+
+
+def test_sheet_dimension(sample_workbook):
+    with LxmlSheetReader(sample_workbook) as reader:
+        assert reader.sheet_dimension(0) == 'A1:F7'
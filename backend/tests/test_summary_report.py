@@ -0,0 +1,84 @@
+import zipfile
+from datetime import datetime, time, timedelta
+
+import openpyxl
+import pytest
+
+from utils.data_extractor import (
+    REPORT_HEADER_ROWS, SummaryReportWriter, create_summary_report, extract_data_from_excel, safe_read_value
+)
+
+
+@pytest.fixture
+def report(sample_workbook, tmp_path):
+    records = extract_data_from_excel(sample_workbook)
+    output_path = create_summary_report(records, str(tmp_path / 'report.xlsx'))
+    wb = openpyxl.load_workbook(output_path)
+    yield output_path, wb.active
+    wb.close()
+
+
+def data_row(ws, index):
+    return ws[REPORT_HEADER_ROWS + 1 + index]
+
+
+def test_safe_read_value_keeps_time_types():
+    for value in (time(0, 30), timedelta(hours=30), datetime(2024, 1, 1, 8, 0)):
+        assert safe_read_value(value) is value
+    assert safe_read_value('  Main St ') == 'Main St'
+
+
+def test_named_styles_registered_once(report):
+    _, ws = report
+    style_names = [style.name for style in ws.parent._named_styles]
+    assert len(style_names) == len(set(style_names))
+    for name in ('report_header', 'report_datetime', 'report_duration_time', 'report_duration_elapsed'):
+        assert name in style_names
+
+
+def test_duration_number_formats(report):
+    _, ws = report
+    # time(0, 30) ثم نص '1:00:00' ثم timedelta بأكثر من 24 ساعة
+    short, text, elapsed = (data_row(ws, idx)[4] for idx in range(3))
+
+    assert short.style == 'report_duration_time'
+    assert short.number_format == 'h:mm:ss'
+    assert text.style == 'report_duration'
+    assert text.value == '1:00:00'
+    assert elapsed.style == 'report_duration_elapsed'
+    assert elapsed.number_format == '[h]:mm:ss'
+
+
+def test_datetime_cells(report):
+    _, ws = report
+    start = data_row(ws, 0)[2]
+    assert start.value == datetime(2024, 1, 1, 8, 0)
+    assert start.style == 'report_datetime'
+    assert data_row(ws, 1)[2].style == 'report_cell'
+
+
+def test_map_links_are_formulas(report):
+    output_path, ws = report
+    link = data_row(ws, 0)[5]
+    assert link.value == '=HYPERLINK("https://www.google.com/maps?q=24.7136,46.6753","24.7136,46.6753")'
+    assert link.style == 'report_link'
+    assert not ws._hyperlinks
+
+    # بدون علاقة رابط منفصلة لكل خلية
+    with zipfile.ZipFile(output_path) as archive:
+        assert not any('worksheets/_rels' in name for name in archive.namelist())
+
+
+def test_zone_conditional_formatting(report):
+    _, ws = report
+    ranges = [str(rule_range.sqref) for rule_range in ws.conditional_formatting]
+    assert ranges == [f'G{REPORT_HEADER_ROWS + 1}:G{REPORT_HEADER_ROWS + 5}']
+    assert data_row(ws, 0)[6].fill.fill_type is None
+
+
+def test_empty_report_leaves_no_file(tmp_path):
+    output_path = tmp_path / 'empty.xlsx'
+    writer = SummaryReportWriter(str(output_path))
+    with pytest.raises(ValueError, match="No data"):
+        writer.close()
+    assert not output_path.exists()
@@ -0,0 +1,129 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+import logging
+from utils.data_extractor import extract_data_from_excel
+from utils.process_pool import get_worker_count, get_mp_context
+from utils.zone_classifier import compile_zones
+from utils.result_cache import file_digest, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== تنفيذ متوازي للملفات ======================== #
+
+def extract_file(file_path, mode="engine_idle", zones=None,
+                 parallel_sheets=False, max_workers=None, header_layouts=None, reader=None, engine=None):
+    """
+    استخراج بيانات ملف واحد - تُنفَّذ داخل عملية عاملة
+    
+    ملفات XLS و HTML (iTrack) تُقرأ مباشرة بدون تحويل إلى XLSX.
+    
+    Returns:
+        RecordBatch: السجلات المستخرجة (مصفوفات مضغوطة سريعة النقل بين العمليات)
+    """
+    return extract_data_from_excel(
+        file_path, mode, zones, parallel_sheets=parallel_sheets, max_workers=max_workers, as_batch=True,
+        header_layouts=header_layouts, reader=reader, engine=engine
+    )
+
+
+def _iter_extracted(pending, mode, zones, max_workers, header_layouts, reader, engine):
+    """استخراج الملفات غير المحفوظة مسبقًا وإعادة النتائج فور انتهاء كل ملف"""
+    workers = get_worker_count(max_workers, len(pending))
+    logger.info(f"Pipelined extraction: {len(pending)} files, {workers} workers")
+    
+    # ملف واحد أو نواة واحدة: لا فائدة من مجمع الملفات، ويُوزَّع الملف الواحد على مستوى الأوراق
+    if workers == 1:
+        for index, file_path in pending:
+            filename = os.path.basename(file_path)
+            try:
+                records = extract_file(
+                    file_path, mode, zones,
+                    parallel_sheets=len(pending) == 1, max_workers=max_workers,
+                    header_layouts=header_layouts, reader=reader, engine=engine
+                )
+                yield {'index': index, 'file': filename, 'records': records, 'error': None, 'cached': False}
+            except Exception as e:
+                logger.error(f"Pipeline failed for {filename}: {e}")
+                yield {'index': index, 'file': filename, 'records': None, 'error': str(e), 'cached': False}
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_mp_context()) as executor:
+        futures = {
+            executor.submit(
+                extract_file, file_path, mode, zones,
+                header_layouts=header_layouts, reader=reader, engine=engine
+            ): (index, file_path)
+            for index, file_path in pending
+        }
+        
+        for future in as_completed(futures):
+            index, file_path = futures[future]
+            filename = os.path.basename(file_path)
+            try:
+                yield {'index': index, 'file': filename, 'records': future.result(), 'error': None, 'cached': False}
+            except Exception as e:
+                logger.error(f"Pipeline failed for {filename}: {e}")
+                yield {'index': index, 'file': filename, 'records': None, 'error': str(e), 'cached': False}
+
+
+def iter_pipelined_extraction(file_paths, mode="engine_idle", zones=None,
+                              max_workers=None, ordered=False, header_layouts=None, result_cache=None,
+                              reader=None, engine=None):
+    """
+    استخراج عدة ملفات بالتوازي في مجمع عمليات محدود
+    
+    كل ملف يُقرأ ويُستخرج داخل نفس العملية العاملة (XLS مباشرة بدون تحويل)، والنتائج
+    تُعاد فور انتهاء كل ملف. مع ordered=True تُعاد بترتيب الرفع، ويُحتفظ
+    فقط بالنتائج التي انتهت قبل دورها.
+    
+    Args:
+        file_paths: مسارات الملفات المرفوعة
+        mode: وضع الاستخراج
+        zones: مصنّف النطاق المُجمَّع للعملية
+        max_workers: الحد الأقصى للعمليات (افتراضيًا حصة المعالج)
+        ordered: إعادة النتائج بترتيب الرفع
+        header_layouts: تخطيطات هيدر يدوية للمستخدم
+        result_cache: ResultCache - الملفات المعالجة سابقًا (نفس المحتوى والوضع
+            والنطاقات) تُقرأ من الذاكرة دون قراءة أو استخراج
+        reader: قارئ الأوراق ('lxml' أو 'openpyxl')
+        engine: محرك تحليل أعمدة الموقع ('row' أو 'vectorized')
+    
+    Yields:
+        dict: {'index', 'file', 'records', 'error', 'cached'}
+    """
+    zones = compile_zones(zones)
+    cached_results = []
+    cache_keys = {}
+    pending = []
+    
+    for index, file_path in enumerate(file_paths):
+        if result_cache is not None and result_cache.enabled:
+            key = make_cache_key(file_digest(file_path), mode, zones, header_layouts)
+            records = result_cache.get(key)
+            if records is not None:
+                filename = os.path.basename(file_path)
+                logger.info(f"Result cache hit for {filename}")
+                cached_results.append({'index': index, 'file': filename, 'records': records, 'error': None, 'cached': True})
+                continue
+            cache_keys[index] = key
+        pending.append((index, file_path))
+    
+    extracted = _iter_extracted(pending, mode, zones, max_workers, header_layouts, reader, engine) if pending else ()
+    
+    finished = {}
+    next_index = 0
+    
+    for result in chain(cached_results, extracted):
+        if result['index'] in cache_keys and result['error'] is None:
+            result_cache.put(cache_keys[result['index']], result['records'])
+        
+        if not ordered:
+            yield result
+            continue
+        
+        finished[result['index']] = result
+        while next_index in finished:
+            yield finished.pop(next_index)
+            next_index += 1
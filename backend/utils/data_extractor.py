@@ -1,11 +1,28 @@
 import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import to_excel
 import pandas as pd
+import numpy as np
 import re
 import os
-from datetime import datetime
+import shutil
+import pickle
+import zipfile
+from datetime import datetime, timedelta, time as datetime_time
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import repeat, islice, chain
+from utils.process_pool import get_worker_count, get_mp_context
+from utils.zone_classifier import compile_zones, ZONE_OUTSIDE, ZONE_UNDEFINED
+from utils.record_batch import RecordBatch, RecordBatchBuilder
+from utils.header_layout import layout_fingerprints, get_layout_cache
+from utils.sheet_readers import open_sheet_reader, sniff_file_format
+from utils.record_exporters import RECORD_WRITERS
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +55,33 @@ def extract_car_plate(car_code):
         return str(car_code) if car_code else ""
 
 
+# الأنماط مُجمَّعة مرة واحدة. نمط "lat,lon" بدون اتجاه أُزيل من قائمة
+# الإحداثيات لأن النمط مع الاتجاه الاختياري يطابق كل ما يطابقه.
+_COORDINATE_PATTERN = re.compile(r'(\d+\.\d+)[NS]?\s*,\s*(\d+\.\d+)[EW]?')
+_SPACED_COORDINATE_PATTERN = re.compile(r'(\d+\.\d+)\s+(\d+\.\d+)')
+
+_DECIMAL_PATTERN = re.compile(r'\d\.\d')
+_ADDRESS_COORDINATE_PATTERNS = [
+    re.compile(r'\b\d+\.\d+[NS]?\s*,\s*\d+\.\d+[EW]?\b'),
+    re.compile(r'\b\d+\.\d+\s*,\s*\d+\.\d+\b'),
+    re.compile(r'\b\d+\.\d+,\d+\.\d+\b'),
+    re.compile(r'\b\d+\.\d+\s+\d+\.\d+\b')
+]
+_REPEATED_COMMAS_PATTERN = re.compile(r',\s*,+')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_DIRECTION_PATTERNS = [
+    (re.compile(r'\s+[NSEW]\s+'), ' '),
+    (re.compile(r'^[NSEW]\s+'), ''),
+    (re.compile(r'\s+[NSEW]$'), '')
+]
+
+# عدد نصوص المواقع المختلفة المحفوظة في ذاكرة التحليل (لكل عملية)
+LOCATION_CACHE_SIZE = 65536
+
+# محرك تحليل أعمدة الموقع: 'row' (خلية بخلية) أو 'vectorized' (عمود كامل عبر pandas)
+DEFAULT_ENGINE = os.environ.get('EXTRACTION_ENGINE', 'row')
+
+
 def extract_coordinates(text):
     """استخراج الإحداثيات الرقمية فقط (lat,lon)"""
     if not text:
@@ -45,18 +89,11 @@ def extract_coordinates(text):
     try:
         text_str = str(text).strip()
         
-        # محاولة أنماط مختلفة للإحداثيات
-        patterns = [
-            r'(\d+\.\d+)[NS]?\s*,\s*(\d+\.\d+)[EW]?',  # مع الاتجاه
-            r'(\d+\.\d+)\s*,\s*(\d+\.\d+)',  # بدون اتجاه
-            r'(\d+\.\d+)\s+(\d+\.\d+)'  # بفراغ
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text_str)
-            if match:
-                lat, lon = match.groups()
-                return f"{lat},{lon}"
+        # محاولة أنماط مختلفة للإحداثيات (مع/بدون الاتجاه ثم بفراغ)
+        match = _COORDINATE_PATTERN.search(text_str) or _SPACED_COORDINATE_PATTERN.search(text_str)
+        if match:
+            lat, lon = match.groups()
+            return f"{lat},{lon}"
                 
     except Exception as e:
         logger.warning(f"Error extracting coordinates from {text}: {e}")
@@ -75,26 +112,19 @@ def extract_address_text(text):
         if not text_str:
             return ""
         
-        # إزالة جميع أنماط الإحداثيات
-        coordinate_patterns = [
-            r'\b\d+\.\d+[NS]?\s*,\s*\d+\.\d+[EW]?\b',
-            r'\b\d+\.\d+\s*,\s*\d+\.\d+\b',
-            r'\b\d+\.\d+,\d+\.\d+\b',
-            r'\b\d+\.\d+\s+\d+\.\d+\b'
-        ]
-        
-        for pattern in coordinate_patterns:
-            text_str = re.sub(pattern, '', text_str)
+        # إزالة جميع أنماط الإحداثيات (جميعها تتطلب رقمًا عشريًا)
+        if _DECIMAL_PATTERN.search(text_str):
+            for pattern in _ADDRESS_COORDINATE_PATTERNS:
+                text_str = pattern.sub('', text_str)
         
         # تنظيف الفواصل والمسافات الزائدة
-        text_str = re.sub(r',\s*,+', ',', text_str)
-        text_str = re.sub(r'\s+', ' ', text_str)
+        text_str = _REPEATED_COMMAS_PATTERN.sub(',', text_str)
+        text_str = _WHITESPACE_PATTERN.sub(' ', text_str)
         text_str = text_str.strip(', ')
         
         # إزالة حروف الاتجاه المنفصلة
-        text_str = re.sub(r'\s+[NSEW]\s+', ' ', text_str)
-        text_str = re.sub(r'^[NSEW]\s+', '', text_str)
-        text_str = re.sub(r'\s+[NSEW]$', '', text_str)
+        for pattern, replacement in _DIRECTION_PATTERNS:
+            text_str = pattern.sub(replacement, text_str)
         
         text_str = text_str.strip()
         
@@ -109,208 +139,651 @@ def extract_address_text(text):
         return ""
 
 
+@lru_cache(maxsize=LOCATION_CACHE_SIZE, typed=True)
+def _parse_location_cached(value):
+    return extract_coordinates(value), extract_address_text(value)
+
+
+def parse_location(value):
+    """
+    تحليل نص موقع مرة واحدة لكل قيمة مختلفة (ذاكرة LRU محدودة)
+    
+    المركبة المتوقفة تكرر نفس نص الموقع مئات المرات، لذلك تُحفظ نتيجة
+    التحليل لكل نص خام.
+    
+    Returns:
+        tuple: (الإحداثيات "lat,lon"، النص الوصفي)
+    """
+    try:
+        return _parse_location_cached(value)
+    except TypeError:
+        # قيم غير قابلة للتجزئة
+        return extract_coordinates(value), extract_address_text(value)
+
+
+def location_cache_stats():
+    """إحصائيات ذاكرة تحليل المواقع في العملية الحالية"""
+    info = _parse_location_cached.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': round(info.hits / lookups, 3) if lookups else 0.0,
+        'entries': info.currsize,
+        'max_entries': info.maxsize
+    }
+
+
+def safe_read_value(value):
+    """
+    قراءة آمنة لقيمة خلية (كما تُرجعها iter_rows(values_only=True))
+    
+    الأوقات والمدد (datetime / time / timedelta) والأرقام تبقى بأنواعها الأصلية
+    ليكتبها التقرير بتنسيق وقت، وباقي القيم نص.
+    """
+    try:
+        if value is None:
+            return None
+        if isinstance(value, (datetime, datetime_time, timedelta)):
+            return value
+        if isinstance(value, (int, float)):
+            return value
+        return str(value).strip()
+    except Exception as e:
+        logger.warning(f"Error reading cell value: {e}")
+        return None
+
+
 def safe_read_cell(cell):
     """قراءة آمنة لخلية Excel"""
     try:
-        if cell.value is None:
-            return None
-        if isinstance(cell.value, datetime):
-            return cell.value
-        if isinstance(cell.value, (int, float)):
-            return cell.value
-        return str(cell.value).strip()
+        return safe_read_value(cell.value)
     except Exception as e:
         logger.warning(f"Error reading cell: {e}")
         return None
 
 
 def check_zone(coordinates, zone_points=None):
-    """التحقق من أن الإحداثيات داخل النطاق المحدد"""
+    """
+    التحقق من أن الإحداثيات داخل النطاق المحدد (لسجل واحد)
+    
+    للاستخراج الكامل يُفضَّل استخدام ZoneClassifier.classify على مصفوفات كاملة.
+    """
     if not coordinates:
-        return "غير محدد"
+        return ZONE_UNDEFINED
     
     try:
-        coord_str = str(coordinates).strip()
-        
-        if ',' not in coord_str:
-            return "غير محدد"
-        
-        lat, lon = map(float, coord_str.split(','))
-        
-        # النقاط الافتراضية للمنطقة
-        if zone_points is None:
-            zone_points = [
-                (30.22923, 31.73212),
-                (30.22984, 31.73347),
-                (30.22908, 31.73418),
-                (30.22851, 31.73325)
-            ]
-        
-        # فحص بسيط باستخدام bounding box
-        lat_min = min(p[0] for p in zone_points)
-        lat_max = max(p[0] for p in zone_points)
-        lon_min = min(p[1] for p in zone_points)
-        lon_max = max(p[1] for p in zone_points)
-        
-        if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
-            return "داخل النطاق"
-        else:
-            return "خارج النطاق"
-            
+        return compile_zones(zone_points).classify_coordinates([coordinates])[0]
     except Exception as e:
         logger.warning(f"Error checking zone for coordinates {coordinates}: {e}")
-        return "غير محدد"
+        return ZONE_UNDEFINED
+
+
+# ======================== محرك الاستخراج المتدفق ======================== #
+
+# عدد الصفوف التي يُبحث فيها عن صف الهيدر
+HEADER_SCAN_ROWS = 20
+
+# أقصى عدد سجلات يُصنَّف نطاقها دفعة واحدة (الورقة العادية تُصنَّف مرة واحدة)
+ZONE_BATCH_SIZE = 50000
+
+# الكلمات المفتاحية للبحث عن الأعمدة
+HEADER_KEYWORDS = {
+    'start': ['start time', 'بداية', 'start', 'وقت البدء'],
+    'end': ['end time', 'نهاية', 'end', 'وقت النهاية'],
+    'duration': ['duration', 'مدة', 'stop duration'],
+    'address': ['address', 'موقع', 'عنوان'],
+    'coordinate': ['coordinate', 'إحداثيات', 'احداثيات']
+}
+
+
+def detect_header_columns(values):
+    """
+    التحقق من أن الصف هو صف الهيدر وتحديد مواقع الأعمدة
+    
+    Args:
+        values: قيم الصف بعد safe_read_value
+    
+    Returns:
+        dict: مواقع الأعمدة (تبدأ من 1) أو None إذا لم يكن صف هيدر
+    """
+    row_str = ' '.join(str(v).lower() if v else '' for v in values)
+    
+    # التحقق من وجود كلمات مفتاحية
+    has_start = any(kw in row_str for kw in HEADER_KEYWORDS['start'])
+    has_end = any(kw in row_str for kw in HEADER_KEYWORDS['end'])
+    has_duration = any(kw in row_str for kw in HEADER_KEYWORDS['duration'])
+    
+    if not (has_start or (has_end and has_duration)):
+        return None
+    
+    columns = {
+        'start': None,
+        'end': None,
+        'duration': None,
+        'address': None,
+        'coordinate': None
+    }
+    
+    # تحديد مواقع الأعمدة
+    for col_idx, cell_val in enumerate(values, 1):
+        if not cell_val:
+            continue
+        
+        cell_str = str(cell_val).lower().strip()
+        
+        if not columns['start'] and any(kw in cell_str for kw in HEADER_KEYWORDS['start']):
+            columns['start'] = col_idx
+        elif not columns['end'] and any(kw in cell_str for kw in HEADER_KEYWORDS['end']):
+            columns['end'] = col_idx
+        elif not columns['duration'] and any(kw in cell_str for kw in HEADER_KEYWORDS['duration']):
+            columns['duration'] = col_idx
+        elif not columns['address'] and any(kw in cell_str for kw in HEADER_KEYWORDS['address']):
+            columns['address'] = col_idx
+        elif not columns['coordinate'] and any(kw in cell_str for kw in HEADER_KEYWORDS['coordinate']):
+            columns['coordinate'] = col_idx
+    
+    return columns
+
+
+def find_header_layout(rows_values, header_layouts=None):
+    """
+    تحديد صف الهيدر ومواقع الأعمدة من أول صفوف الورقة
+    
+    الترتيب: تخطيطات المستخدم اليدوية، ثم الصف الأول، ثم ذاكرة التخطيطات
+    المكتشفة سابقًا (بصمة الصفوف)، ثم البحث بالكلمات المفتاحية صفًا بصف.
+    
+    Args:
+        rows_values: قيم أول HEADER_SCAN_ROWS صف بعد safe_read_value
+        header_layouts: تخطيطات يدوية {بصمة: (header_row, columns)}
+    
+    Returns:
+        tuple: (header_row, columns) أو None إذا لم يوجد هيدر
+    """
+    fingerprints = layout_fingerprints(rows_values)
+    
+    if header_layouts:
+        for fingerprint in fingerprints:
+            if fingerprint in header_layouts:
+                header_row, columns = header_layouts[fingerprint]
+                return header_row, dict(columns)
+    
+    if not rows_values:
+        return None
+    
+    # الخلية A1 غير ممثلة في البصمة، لذلك يُفحص الصف الأول دائمًا
+    columns = detect_header_columns(rows_values[0])
+    if columns:
+        return 1, columns
+    
+    cache = get_layout_cache()
+    cached = cache.lookup(fingerprints)
+    if cached:
+        return cached
+    
+    for row_idx, values in enumerate(rows_values[1:], 2):
+        columns = detect_header_columns(values)
+        if columns:
+            cache.remember(fingerprints[row_idx - 1], row_idx, columns)
+            return row_idx, columns
+    
+    return None
+
+
+def sheet_layout_fingerprint(file_path, header_row, sheet_name=None):
+    """
+    بصمة صفوف ورقة حتى صف الهيدر (لحفظ تخطيط يدوي لقالب لا يُكتشف تلقائيًا)
+    
+    Args:
+        file_path: مسار ملف Excel (XLSX أو XLS)
+        header_row: رقم صف الهيدر (يبدأ من 1)
+        sheet_name: اسم الورقة (افتراضيًا الأولى)
+    
+    Returns:
+        str: البصمة
+    
+    Raises:
+        ValueError: إذا كانت الورقة غير موجودة أو أقصر من header_row
+    """
+    with open_sheet_reader(file_path) as sheet_reader:
+        if sheet_name and sheet_name not in sheet_reader.sheet_names:
+            raise ValueError(f"Sheet not found: {sheet_name}")
+        sheet_index = sheet_reader.sheet_names.index(sheet_name) if sheet_name else 0
+        rows = [[safe_read_value(v) for v in row]
+                for row in islice(sheet_reader.iter_rows(sheet_index), header_row)]
+    
+    if len(rows) < header_row:
+        raise ValueError(f"Sheet has fewer than {header_row} rows")
+    
+    return layout_fingerprints(rows)[header_row - 1]
+
+
+def _column_value(row, col_idx):
+    """قراءة قيمة عمود من صف (الصفوف في وضع القراءة فقط قد تكون أقصر)"""
+    if not col_idx or col_idx > len(row):
+        return None
+    return safe_read_value(row[col_idx - 1])
+
+
+def iter_sheet_raw_rows(rows, sheet_title, mode="engine_idle", header_layouts=None):
+    """
+    صفوف بيانات ورقة واحدة بقيم الموقع الخام (قبل تحليل الإحداثيات والعنوان)
+    
+    تتم قراءة أول HEADER_SCAN_ROWS صف فقط لتحديد الهيدر، ثم تُنتَج
+    الصفوف أثناء المرور على بقية الصفوف دون الاحتفاظ بها.
+    
+    Args:
+        rows: مكرر على قيم الصفوف (tuples) بدءًا من الصف الأول
+        sheet_title: اسم الورقة
+        mode: وضع الاستخراج
+        header_layouts: تخطيطات هيدر يدوية للمستخدم (انظر find_header_layout)
+    
+    Yields:
+        tuple: (car_code, start_time, end_time, duration, coordinate_cell, address_cell)
+    """
+    rows = iter(rows)
+    head_rows = list(islice(rows, HEADER_SCAN_ROWS))
+    head_values = [[safe_read_value(v) for v in row] for row in head_rows]
+    
+    # استخراج كود السيارة من A1
+    car_code = None
+    if head_values and head_values[0] and head_values[0][0]:
+        if mode == "engine_idle":
+            car_code = extract_car_number(head_values[0][0])
+        else:
+            car_code = extract_car_plate(head_values[0][0])
+    
+    layout = find_header_layout(head_values, header_layouts)
+    if layout is None:
+        logger.warning(f"No header row found in sheet: {sheet_title}")
+        return
+    
+    header_row, columns = layout
+    if not any([columns.get('start'), columns.get('end'), columns.get('duration')]):
+        logger.warning(f"No time columns found in sheet: {sheet_title}")
+        return
+    
+    for row_idx, row in enumerate(chain(head_rows[header_row:], rows), header_row + 1):
+        try:
+            # تخطي الصفوف الفارغة
+            if not any(safe_read_value(v) for v in row):
+                continue
+            
+            # قراءة البيانات
+            start_time = _column_value(row, columns.get('start'))
+            end_time = _column_value(row, columns.get('end'))
+            duration = _column_value(row, columns.get('duration'))
+            # مدة [h]:mm:ss من 24 ساعة فأكثر تُقرأ كـ datetime
+            elapsed = excel_elapsed(duration)
+            if elapsed is not None:
+                duration = elapsed
+            address = _column_value(row, columns.get('address'))
+            coordinate = _column_value(row, columns.get('coordinate'))
+            
+            # إضافة السجل إذا كان يحتوي على بيانات
+            if not (start_time or end_time or duration):
+                continue
+        
+        except Exception as row_error:
+            logger.warning(f"Error processing row {row_idx}: {row_error}")
+            continue
+        
+        yield (car_code or "", start_time, end_time, duration, coordinate, address)
+
+
+def iter_sheet_rows(rows, sheet_title, mode="engine_idle", header_layouts=None):
+    """
+    استخراج صفوف بيانات ورقة واحدة في مرور واحد على الصفوف (المحرك الصفي)
+    
+    نص الموقع يُحلَّل لكل صف عبر parse_location (مع ذاكرة النصوص المتكررة).
+    لا يتم تحديد النطاق هنا.
+    
+    Args:
+        rows: مكرر على قيم الصفوف (tuples) بدءًا من الصف الأول
+        sheet_title: اسم الورقة
+        mode: وضع الاستخراج
+        header_layouts: تخطيطات هيدر يدوية للمستخدم (انظر find_header_layout)
+    
+    Yields:
+        tuple: (car_code, start_time, end_time, duration, coordinates, address)
+    """
+    records_count = 0
+    cache_before = _parse_location_cached.cache_info()
+    
+    for car_code, start_time, end_time, duration, coordinate, address in iter_sheet_raw_rows(
+            rows, sheet_title, mode, header_layouts):
+        # استخراج الإحداثيات والعنوان
+        coordinate_coords, coordinate_text = parse_location(coordinate)
+        address_coords, address_only_text = parse_location(address)
+        
+        records_count += 1
+        yield (car_code, start_time, end_time, duration,
+               coordinate_coords or address_coords, address_only_text or coordinate_text)
+    
+    if records_count > 0:
+        cache_after = _parse_location_cached.cache_info()
+        hits = cache_after.hits - cache_before.hits
+        lookups = hits + cache_after.misses - cache_before.misses
+        logger.info(f"Extracted {records_count} records from sheet: {sheet_title} "
+                    f"(location cache: {hits}/{lookups} hits, {hits / lookups if lookups else 0:.0%})")
+
+
+def transform_location_columns(coordinate_cells, address_cells):
+    """
+    تحليل أعمدة الموقع كاملة دفعة واحدة (المحرك المتجه)
+    
+    نفس نتيجة parse_location لكل صف، لكن باستخدام str.extract / str.replace
+    على العمود كله بدلًا من استدعاء الدوال خلية بخلية. النصوص المتكررة
+    تُحلَّل مرة واحدة (pd.factorize) ثم تُوزَّع النتائج على الصفوف.
+    
+    Args:
+        coordinate_cells: قيم خلايا عمود الإحداثيات الخام
+        address_cells: قيم خلايا عمود العنوان الخام
+    
+    Returns:
+        tuple: (مصفوفة الإحداثيات "lat,lon"، مصفوفة النص الوصفي)
+    """
+    coordinate_coords, coordinate_only = _transform_location_column(coordinate_cells)
+    address_coords, address_only = _transform_location_column(address_cells)
+    
+    coordinates = np.where(coordinate_coords != "", coordinate_coords, address_coords)
+    addresses = np.where(address_only != "", address_only, coordinate_only)
+    
+    return coordinates, addresses
+
 
+def _transform_location_column(cells):
+    """(الإحداثيات، النص الوصفي) لكل خلية في عمود واحد"""
+    codes, uniques = pd.factorize(_location_text_series(cells))
+    
+    # الخلايا الفارغة (NaN) تأخذ الرمز -1 وتُعاد كنص فارغ
+    text = pd.Series(uniques, dtype=object)
+    coords = np.append(_vector_extract_coordinates(text), "")
+    address = np.append(_vector_extract_address_text(text), "")
+    
+    return coords[codes], address[codes]
+
+
+def _location_text_series(cells):
+    """النص المُنظَّف لكل خلية، و NaN للخلايا الفارغة (تُعاد كنص فارغ)"""
+    values = pd.Series(list(cells), dtype=object)
+    present = np.fromiter((bool(v) for v in values), dtype=bool, count=len(values))
+    text = pd.Series(np.nan, index=values.index, dtype=object)
+    if present.any():
+        text[present] = values[present].astype(str).str.strip()
+    return text
+
+
+def _vector_extract_coordinates(text):
+    """extract_coordinates لعمود كامل"""
+    result = np.full(len(text), "", dtype=object)
+    remaining = text.notna().to_numpy()
+    
+    for pattern in (_COORDINATE_PATTERN, _SPACED_COORDINATE_PATTERN):
+        if not remaining.any():
+            break
+        matches = text[remaining].str.extract(pattern)
+        found = matches[0].notna().to_numpy()
+        rows = np.flatnonzero(remaining)[found]
+        result[rows] = (matches[0][found] + "," + matches[1][found]).to_numpy()
+        remaining[rows] = False
+    
+    return result
 
-def extract_data_from_excel(file_path, mode="engine_idle", zone_points=None):
+
+def _vector_extract_address_text(text):
+    """extract_address_text لعمود كامل"""
+    result = np.full(len(text), "", dtype=object)
+    present = (text.notna() & (text != "")).to_numpy()
+    if not present.any():
+        return result
+    
+    values = text[present]
+    for pattern in _ADDRESS_COORDINATE_PATTERNS:
+        values = values.str.replace(pattern, '', regex=True)
+    
+    values = values.str.replace(_REPEATED_COMMAS_PATTERN, ',', regex=True)
+    values = values.str.replace(_WHITESPACE_PATTERN, ' ', regex=True)
+    values = values.str.strip(', ')
+    
+    for pattern, replacement in _DIRECTION_PATTERNS:
+        values = values.str.replace(pattern, replacement, regex=True)
+    
+    values = values.str.strip()
+    
+    # النص ذو المعنى فقط
+    values = values.where(values.str.len() > 3, "")
+    result[present] = values.to_numpy()
+    return result
+
+
+def iter_sheet_rows_vectorized(rows, sheet_title, mode="engine_idle", header_layouts=None):
+    """
+    استخراج صفوف بيانات ورقة واحدة بتحليل أعمدة الموقع دفعة واحدة (المحرك المتجه)
+    
+    الصفوف الخام تُجمَع في دفعات من ZONE_BATCH_SIZE صف، ثم يُحلَّل عمودا
+    الإحداثيات والعنوان لكل دفعة عبر transform_location_columns. الناتج
+    مطابق لـ iter_sheet_rows.
+    
+    Yields:
+        tuple: (car_code, start_time, end_time, duration, coordinates, address)
+    """
+    raw_rows = iter_sheet_raw_rows(rows, sheet_title, mode, header_layouts)
+    records_count = 0
+    
+    while True:
+        chunk = list(islice(raw_rows, ZONE_BATCH_SIZE))
+        if not chunk:
+            break
+        
+        car_codes, start_times, end_times, durations, coordinate_cells, address_cells = zip(*chunk)
+        coordinates, addresses = transform_location_columns(coordinate_cells, address_cells)
+        
+        records_count += len(chunk)
+        yield from zip(car_codes, start_times, end_times, durations, coordinates.tolist(), addresses.tolist())
+    
+    if records_count > 0:
+        logger.info(f"Extracted {records_count} records from sheet: {sheet_title} (vectorized)")
+
+
+SHEET_ENGINES = {
+    'row': iter_sheet_rows,
+    'vectorized': iter_sheet_rows_vectorized
+}
+
+
+def get_sheet_engine(engine=None):
+    """
+    دالة استخراج صفوف الورقة للمحرك المطلوب
+    
+    Args:
+        engine: 'row' أو 'vectorized' (افتراضيًا DEFAULT_ENGINE)
+    
+    Returns:
+        callable: iter_sheet_rows أو iter_sheet_rows_vectorized
+    """
+    engine = engine or DEFAULT_ENGINE
+    if engine not in SHEET_ENGINES:
+        raise ValueError(f"Unknown extraction engine: {engine}")
+    return SHEET_ENGINES[engine]
+
+
+def iter_sheet_records(rows, sheet_title, mode="engine_idle", zone_points=None, header_layouts=None, engine=None):
+    """
+    استخراج سجلات ورقة واحدة كقواميس مع تحديد النطاق دفعة واحدة
+    
+    Args:
+        rows: مكرر على قيم الصفوف (tuples) بدءًا من الصف الأول
+        sheet_title: اسم الورقة
+        mode: وضع الاستخراج
+        zone_points: نقاط حدود المنطقة أو ZoneClassifier مُجمَّع
+        header_layouts: تخطيطات هيدر يدوية للمستخدم
+        engine: محرك تحليل الموقع ('row' أو 'vectorized')
+    
+    Yields:
+        dict: سجل مستخرج
+    """
+    zones = compile_zones(zone_points)
+    sheet_rows = get_sheet_engine(engine)
+    pending = []
+    
+    for car_code, start_time, end_time, duration, coordinates, address in sheet_rows(rows, sheet_title, mode, header_layouts):
+        pending.append({
+            'car_code': car_code,
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration': duration,
+            'coordinates': coordinates,
+            'zone': ZONE_UNDEFINED,
+            'address': address,
+            'source_sheet': sheet_title
+        })
+        
+        if len(pending) >= ZONE_BATCH_SIZE:
+            yield from zones.classify_records(pending)
+            pending = []
+    
+    # التحقق من النطاق
+    if pending:
+        yield from zones.classify_records(pending)
+
+
+def _extract_rows(rows, sheet_title, mode, zones, as_batch=False, header_layouts=None, engine=None,
+                  statistics=None):
+    """
+    استخراج صفوف ورقة واحدة إلى قائمة قواميس أو RecordBatch
+    
+    في وضع RecordBatch لا يُنشأ أي قاموس لكل سجل، ويُصنَّف النطاق
+    باستدعاء واحد على مصفوفات الإحداثيات الرقمية للورقة.
+    statistics (إن وُجدت) تُحدَّث بكل سجل عند إنتاجه، أو بالدفعة من رموز أعمدتها.
+    """
+    if not as_batch:
+        records = []
+        try:
+            for record in iter_sheet_records(rows, sheet_title, mode, zones, header_layouts, engine):
+                if statistics is not None:
+                    statistics.add(record)
+                records.append(record)
+        except Exception as sheet_error:
+            logger.error(f"Error processing sheet '{sheet_title}': {sheet_error}")
+        return records
+    
+    builder = RecordBatchBuilder()
+    try:
+        for values in get_sheet_engine(engine)(rows, sheet_title, mode, header_layouts):
+            builder.append(*values, sheet_title)
+    except Exception as sheet_error:
+        logger.error(f"Error processing sheet '{sheet_title}': {sheet_error}")
+    
+    # التحقق من النطاق
+    builder.classify_zones(zones)
+    batch = builder.build()
+    if statistics is not None:
+        statistics.add_batch(batch)
+    return batch
+
+
+def _parallel_reader(sheet_reader, parallel_sheets):
+    """
+    هل تُوزَّع أوراق هذا القارئ على عمليات عاملة
+
+    تقارير HTML تُقرأ بالتسلسل دائمًا: الجداول في مستند واحد، وكل عملية عاملة
+    كانت ستعيد تحليل المستند من بدايته للوصول إلى جدولها.
+    """
+    return parallel_sheets and sheet_reader.name != 'html'
+
+
+def _extract_sheet(file_path, sheet_index, mode, zones, as_batch=False, header_layouts=None, reader=None,
+                   engine=None):
+    """
+    استخراج ورقة واحدة داخل عملية عاملة
+    
+    القارئ يقرأ ملف الورقة المطلوبة فقط دون تحليل بقية الأوراق.
+    """
+    with open_sheet_reader(file_path, reader) as sheet_reader:
+        title = sheet_reader.sheet_names[sheet_index]
+        logger.info(f"Processing sheet: {title}")
+        return _extract_rows(sheet_reader.iter_rows(sheet_index), title, mode, zones, as_batch, header_layouts, engine)
+
+
+def extract_data_from_excel(file_path, mode="engine_idle", zone_points=None, streaming=True,
+                            parallel_sheets=False, max_workers=None, as_batch=False, header_layouts=None,
+                            reader=None, engine=None, statistics=None):
     """
     استخراج البيانات من ملف Excel واحد
     
     Args:
         file_path: مسار الملف
         mode: وضع الاستخراج ('engine_idle' أو 'parking_details')
-        zone_points: نقاط حدود المنطقة
+        zone_points: نقاط حدود المنطقة أو ZoneClassifier مُجمَّع مسبقًا للعملية
+        streaming: قراءة الصفوف تدفقيًا بقارئ الأوراق بحيث يبقى استهلاك
+            الذاكرة ثابتًا مهما كان عدد الصفوف (False = تحميل المصنف كاملًا)
+        parallel_sheets: توزيع الأوراق (سيارة لكل ورقة) على عمليات عاملة
+            ودمج النتائج بترتيب الأوراق
+        max_workers: الحد الأقصى للعمليات عند parallel_sheets
+        as_batch: إرجاع RecordBatch عمودي بدلًا من قائمة القواميس
+        header_layouts: تخطيطات هيدر يدوية للمستخدم {بصمة: (header_row, columns)}
+        reader: قارئ الأوراق ('lxml' أو 'openpyxl'، افتراضيًا SHEET_READER)
+        engine: محرك تحليل أعمدة الموقع ('row' أو 'vectorized'، افتراضيًا EXTRACTION_ENGINE)
+        statistics: ExtractionStatistics تُحدَّث بكل ورقة فور استخراجها
     
     Returns:
-        list: قائمة السجلات المستخرجة
+        list | RecordBatch: السجلات المستخرجة
     """
-    extracted_data = []
+    parts = []
     
     try:
         logger.info(f"Starting extraction from: {os.path.basename(file_path)}")
         
-        # فتح الملف
-        wb = openpyxl.load_workbook(file_path, data_only=True, read_only=False)
+        zones = compile_zones(zone_points)
         
-        for ws in wb.worksheets:
+        if not (streaming or parallel_sheets) and sniff_file_format(file_path) == 'xlsx':
+            # تحميل المصنف كاملًا في الذاكرة (المسار القديم)
+            wb = openpyxl.load_workbook(file_path, data_only=True)
             try:
-                sheet_title = ws.title
-                logger.info(f"Processing sheet: {sheet_title}")
-                
-                # استخراج كود السيارة من A1
-                car_code_cell = ws['A1']
-                car_code = safe_read_cell(car_code_cell)
-                
-                if car_code:
-                    if mode == "engine_idle":
-                        car_code = extract_car_number(car_code)
-                    else:
-                        car_code = extract_car_plate(car_code)
-                
-                # البحث عن صف الهيدر
-                header_row = None
-                columns = {
-                    'start': None,
-                    'end': None,
-                    'duration': None,
-                    'address': None,
-                    'coordinate': None
-                }
-                
-                # الكلمات المفتاحية للبحث
-                keywords = {
-                    'start': ['start time', 'بداية', 'start', 'وقت البدء'],
-                    'end': ['end time', 'نهاية', 'end', 'وقت النهاية'],
-                    'duration': ['duration', 'مدة', 'stop duration'],
-                    'address': ['address', 'موقع', 'عنوان'],
-                    'coordinate': ['coordinate', 'إحداثيات', 'احداثيات']
-                }
-                
-                # البحث في أول 20 صف
-                for row_idx in range(1, min(21, ws.max_row + 1)):
-                    row_values = [str(safe_read_cell(cell)).lower() if safe_read_cell(cell) else '' 
-                                  for cell in ws[row_idx]]
-                    row_str = ' '.join(row_values)
-                    
-                    # التحقق من وجود كلمات مفتاحية
-                    has_start = any(kw in row_str for kw in keywords['start'])
-                    has_end = any(kw in row_str for kw in keywords['end'])
-                    has_duration = any(kw in row_str for kw in keywords['duration'])
-                    
-                    if has_start or (has_end and has_duration):
-                        header_row = row_idx
-                        
-                        # تحديد مواقع الأعمدة
-                        for col_idx, cell in enumerate(ws[row_idx], 1):
-                            cell_val = safe_read_cell(cell)
-                            if not cell_val:
-                                continue
-                            
-                            cell_str = str(cell_val).lower().strip()
-                            
-                            if not columns['start'] and any(kw in cell_str for kw in keywords['start']):
-                                columns['start'] = col_idx
-                            elif not columns['end'] and any(kw in cell_str for kw in keywords['end']):
-                                columns['end'] = col_idx
-                            elif not columns['duration'] and any(kw in cell_str for kw in keywords['duration']):
-                                columns['duration'] = col_idx
-                            elif not columns['address'] and any(kw in cell_str for kw in keywords['address']):
-                                columns['address'] = col_idx
-                            elif not columns['coordinate'] and any(kw in cell_str for kw in keywords['coordinate']):
-                                columns['coordinate'] = col_idx
-                        
-                        break
-                
-                if not header_row:
-                    logger.warning(f"No header row found in sheet: {sheet_title}")
-                    continue
-                
-                if not any([columns['start'], columns['end'], columns['duration']]):
-                    logger.warning(f"No time columns found in sheet: {sheet_title}")
-                    continue
-                
-                # استخراج البيانات
-                records_count = 0
-                for row_idx in range(header_row + 1, ws.max_row + 1):
-                    try:
-                        row = list(ws[row_idx])
-                        
-                        # تخطي الصفوف الفارغة
-                        if not any(safe_read_cell(cell) for cell in row):
-                            continue
-                        
-                        # قراءة البيانات
-                        start_time = safe_read_cell(row[columns['start'] - 1]) if columns['start'] else None
-                        end_time = safe_read_cell(row[columns['end'] - 1]) if columns['end'] else None
-                        duration = safe_read_cell(row[columns['duration'] - 1]) if columns['duration'] else None
-                        address = safe_read_cell(row[columns['address'] - 1]) if columns['address'] else None
-                        coordinate = safe_read_cell(row[columns['coordinate'] - 1]) if columns['coordinate'] else None
-                        
-                        # استخراج الإحداثيات والعنوان
-                        numeric_coordinates = extract_coordinates(coordinate) or extract_coordinates(address)
-                        address_text = extract_address_text(address) or extract_address_text(coordinate)
-                        
-                        # التحقق من النطاق
-                        zone_status = check_zone(numeric_coordinates, zone_points)
-                        
-                        # إضافة السجل إذا كان يحتوي على بيانات
-                        if start_time or end_time or duration:
-                            record = {
-                                'car_code': car_code or "",
-                                'start_time': start_time,
-                                'end_time': end_time,
-                                'duration': duration,
-                                'coordinates': numeric_coordinates,
-                                'zone': zone_status,
-                                'address': address_text,
-                                'source_sheet': sheet_title
-                            }
-                            
-                            extracted_data.append(record)
-                            records_count += 1
-                    
-                    except Exception as row_error:
-                        logger.warning(f"Error processing row {row_idx}: {row_error}")
-                        continue
+                for ws in wb.worksheets:
+                    logger.info(f"Processing sheet: {ws.title}")
+                    parts.append(_extract_rows(
+                        ws.iter_rows(values_only=True), ws.title, mode, zones, as_batch, header_layouts, engine,
+                        statistics
+                    ))
+            finally:
+                wb.close()
+        else:
+            sheet_reader = open_sheet_reader(file_path, reader)
+            try:
+                sheet_names = sheet_reader.sheet_names
+                workers = get_worker_count(max_workers, len(sheet_names)) if _parallel_reader(sheet_reader, parallel_sheets) else 1
                 
-                if records_count > 0:
-                    logger.info(f"Extracted {records_count} records from sheet: {sheet_title}")
-            
-            except Exception as sheet_error:
-                logger.error(f"Error processing sheet '{ws.title}': {sheet_error}")
-                continue
+                if workers > 1:
+                    # كل عملية تفتح ورقتها فقط، والنتائج تُدمج بترتيب الأوراق.
+                    # العمليات تُرجع RecordBatch دائمًا لتُحدَّث الإحصائيات من رموز الأعمدة
+                    sheet_reader.close()
+                    logger.info(f"Parallel sheet extraction: {len(sheet_names)} sheets, {workers} workers")
+                    with ProcessPoolExecutor(max_workers=workers, mp_context=get_mp_context()) as executor:
+                        for batch in executor.map(
+                            _extract_sheet, repeat(file_path), range(len(sheet_names)),
+                            repeat(mode), repeat(zones), repeat(True), repeat(header_layouts),
+                            repeat(sheet_reader.name), repeat(engine)
+                        ):
+                            if statistics is not None:
+                                statistics.add_batch(batch)
+                            parts.append(batch if as_batch else batch.to_dicts())
+                else:
+                    for sheet_index, title in enumerate(sheet_names):
+                        logger.info(f"Processing sheet: {title}")
+                        parts.append(_extract_rows(
+                            sheet_reader.iter_rows(sheet_index), title, mode, zones, as_batch, header_layouts, engine,
+                            statistics
+                        ))
+            finally:
+                sheet_reader.close()
+        
+        if as_batch:
+            extracted_data = RecordBatch.concat(parts)
+        else:
+            extracted_data = [record for part in parts for record in part]
         
-        wb.close()
         logger.info(f"Total records extracted: {len(extracted_data)}")
         
     except Exception as e:
@@ -320,46 +793,290 @@ def extract_data_from_excel(file_path, mode="engine_idle", zone_points=None):
     return extracted_data
 
 
+def iter_records(file_path, mode="engine_idle", zones=None, parallel_sheets=False, max_workers=None,
+                 header_layouts=None, reader=None, engine=None, statistics=None):
+    """
+    مكرر على سجلات ملف Excel واحد بدون بناء قائمة كاملة
+    
+    السجلات تُنتَج أثناء القراءة، لذلك يمكن كتابتها إلى التقرير فورًا
+    (SummaryReportWriter) بينما لا تزال بقية الأوراق/الملفات قيد القراءة.
+    
+    Args:
+        file_path: مسار الملف
+        mode: وضع الاستخراج
+        zones: نقاط حدود المنطقة أو ZoneClassifier مُجمَّع
+        parallel_sheets: قراءة الأوراق في عمليات عاملة وإنتاجها بترتيب الأوراق
+        max_workers: الحد الأقصى للعمليات عند parallel_sheets
+        header_layouts: تخطيطات هيدر يدوية للمستخدم
+        reader: قارئ الأوراق ('lxml' أو 'openpyxl')
+        engine: محرك تحليل أعمدة الموقع ('row' أو 'vectorized')
+        statistics: ExtractionStatistics تُحدَّث بكل سجل قبل إنتاجه
+            (دون مرور ثانٍ على السجلات بعد الاستخراج)
+    
+    Yields:
+        dict: سجل مستخرج
+    """
+    logger.info(f"Starting extraction from: {os.path.basename(file_path)}")
+    zones = compile_zones(zones)
+    
+    sheet_reader = open_sheet_reader(file_path, reader)
+    
+    try:
+        sheet_names = sheet_reader.sheet_names
+        workers = get_worker_count(max_workers, len(sheet_names)) if _parallel_reader(sheet_reader, parallel_sheets) else 1
+        
+        if workers > 1:
+            sheet_reader.close()
+            logger.info(f"Parallel sheet extraction: {len(sheet_names)} sheets, {workers} workers")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_mp_context()) as executor:
+                for batch in executor.map(
+                    _extract_sheet, repeat(file_path), range(len(sheet_names)),
+                    repeat(mode), repeat(zones), repeat(True), repeat(header_layouts),
+                    repeat(sheet_reader.name), repeat(engine)
+                ):
+                    if statistics is not None:
+                        statistics.add_batch(batch)
+                    yield from batch.iter_dicts()
+            return
+        
+        for sheet_index, title in enumerate(sheet_names):
+            logger.info(f"Processing sheet: {title}")
+            try:
+                for record in iter_sheet_records(
+                    sheet_reader.iter_rows(sheet_index), title, mode, zones, header_layouts, engine
+                ):
+                    if statistics is not None:
+                        statistics.add(record)
+                    yield record
+            except Exception as sheet_error:
+                logger.error(f"Error processing sheet '{title}': {sheet_error}")
+                continue
+    finally:
+        sheet_reader.close()
+
+
+_DURATION_PATTERN = re.compile(
+    r'^(?:(\d+)\s*(?:days?|d|يوم|أيام)[\s,]*)?(\d+):(\d{1,2})(?::(\d{1,2}(?:\.\d+)?))?$',
+    re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=4096)
+def _parse_duration_text(text):
+    match = _DURATION_PATTERN.match(text.strip())
+    if not match:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + round(float(seconds or 0))
+
+
+# خلايا المدة بتنسيق [h]:mm:ss من 24 ساعة فأكثر يقرؤها openpyxl كـ datetime
+# في بداية تقويم 1900 (مثلًا 30:05:00 ← 1900-01-01 06:05)
+_ELAPSED_LIMIT = datetime(1901, 1, 1)
+
+
+def excel_elapsed(value):
+    """
+    مدة Excel مقروءة كـ datetime إلى timedelta (الإزاحة من بداية تقويم Excel)
+    
+    Returns:
+        timedelta | None: None إذا لم تكن القيمة مدة بهذا الشكل
+    """
+    if isinstance(value, datetime) and value.tzinfo is None and value < _ELAPSED_LIMIT:
+        return timedelta(seconds=round(to_excel(value) * 86400))
+    return None
+
+
+def parse_duration(value):
+    """
+    مدة التوقف بالثواني، مع التمييز بين المدة الصفرية والمدة غير المعروفة
+    
+    يدعم نصوص "HH:MM:SS" و "HH:MM" و "1 day, HH:MM:SS" وقيم timedelta و time،
+    ومدد [h]:mm:ss المقروءة كـ datetime (انظر excel_elapsed)،
+    والأرقام ككسر من اليوم (تمثيل Excel للمدة).
+    
+    Returns:
+        int | None: عدد الثواني، أو None للقيم الفارغة أو غير المفهومة
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        return _parse_duration_text(value) if value.strip() else None
+    if isinstance(value, timedelta):
+        return round(value.total_seconds())
+    if isinstance(value, datetime):
+        elapsed = excel_elapsed(value)
+        return round(elapsed.total_seconds()) if elapsed is not None else None
+    if isinstance(value, datetime_time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    if isinstance(value, (int, float)):
+        return max(round(value * 86400), 0) if value == value else None
+    return None
+
+
+def duration_seconds(value):
+    """
+    مدة التوقف بالثواني للإحصائيات (انظر parse_duration)
+    
+    Returns:
+        int: عدد الثواني (0 للقيم الفارغة أو غير المفهومة)
+    """
+    return parse_duration(value) or 0
+
+
+class ExtractionStatistics:
+    """
+    تجميع إحصائيات الاستخراج تدريجيًا (سجلًا بسجل أو دفعة بدفعة)
+    
+    يسمح بحساب الإحصائيات أثناء تدفق السجلات إلى التقرير دون الاحتفاظ بها،
+    بما فيها عدد التوقفات ومدة التوقف الكلية والقصوى وتوزيع النطاقات لكل سيارة.
+    """
+    
+    def __init__(self):
+        self.total_records = 0
+        self.inside_zone = 0
+        self.outside_zone = 0
+        self.undefined_zone = 0
+        self.total_idle_seconds = 0
+        self.max_idle_seconds = 0
+        # السجلات المكررة المحذوفة قبل الإضافة (RecordDeduplicator)
+        self.duplicates_dropped = 0
+        self._cars = {}
+        self._sheets = set()
+    
+    def _add_zone(self, zone, count=1):
+        # النطاق إما "داخل النطاق" أو اسم نطاق مسمى من مكتبة المستخدم
+        if zone == ZONE_OUTSIDE:
+            self.outside_zone += count
+        elif zone == ZONE_UNDEFINED or not zone:
+            self.undefined_zone += count
+        else:
+            self.inside_zone += count
+    
+    def _car(self, car_code):
+        car = self._cars.get(car_code)
+        if car is None:
+            car = self._cars[car_code] = {
+                'stops': 0,
+                'total_idle_seconds': 0,
+                'max_idle_seconds': 0,
+                'zones': {}
+            }
+        return car
+    
+    def add(self, record):
+        """إضافة سجل واحد"""
+        zone = record.get('zone') or ZONE_UNDEFINED
+        seconds = duration_seconds(record.get('duration'))
+        
+        self.total_records += 1
+        self._add_zone(zone)
+        self.total_idle_seconds += seconds
+        self.max_idle_seconds = max(self.max_idle_seconds, seconds)
+        
+        if record.get('car_code'):
+            car = self._car(record['car_code'])
+            car['stops'] += 1
+            car['total_idle_seconds'] += seconds
+            car['max_idle_seconds'] = max(car['max_idle_seconds'], seconds)
+            car['zones'][zone] = car['zones'].get(zone, 0) + 1
+        
+        if record.get('source_sheet'):
+            self._sheets.add(record['source_sheet'])
+    
+    def add_batch(self, batch):
+        """إضافة RecordBatch مباشرة من رموز الأعمدة"""
+        if not len(batch):
+            return
+        
+        self.total_records += len(batch)
+        
+        for zone, count in batch.zone_counts().items():
+            self._add_zone(zone, count)
+        
+        # المدة تُحلَّل مرة واحدة لكل قيمة مختلفة ثم تُوزَّع بالرموز
+        seconds_by_code = np.array([duration_seconds(v) for v in batch.categories['duration']], dtype=np.int64)
+        seconds = seconds_by_code[batch.codes['duration']]
+        self.total_idle_seconds += int(seconds.sum())
+        self.max_idle_seconds = max(self.max_idle_seconds, int(seconds.max()))
+        
+        car_codes = batch.codes['car_code']
+        car_labels = batch.categories['car_code']
+        stops = np.bincount(car_codes, minlength=len(car_labels))
+        totals = np.bincount(car_codes, weights=seconds, minlength=len(car_labels))
+        maxima = np.zeros(len(car_labels), dtype=np.int64)
+        np.maximum.at(maxima, car_codes, seconds)
+        
+        for code in np.flatnonzero(stops).tolist():
+            if not car_labels[code]:
+                continue
+            car = self._car(car_labels[code])
+            car['stops'] += int(stops[code])
+            car['total_idle_seconds'] += int(totals[code])
+            car['max_idle_seconds'] = max(car['max_idle_seconds'], int(maxima[code]))
+        
+        # توزيع النطاقات لكل سيارة من أزواج (رمز السيارة، رمز النطاق)
+        zone_labels = batch.categories['zone']
+        pairs = car_codes.astype(np.int64) * len(zone_labels) + batch.codes['zone']
+        unique_pairs, pair_counts = np.unique(pairs, return_counts=True)
+        for pair, count in zip(unique_pairs.tolist(), pair_counts.tolist()):
+            car_code, zone_code = divmod(pair, len(zone_labels))
+            if not car_labels[car_code]:
+                continue
+            zones = self._cars[car_labels[car_code]]['zones']
+            zone = zone_labels[zone_code] or ZONE_UNDEFINED
+            zones[zone] = zones.get(zone, 0) + count
+        
+        categories = batch.categories['source_sheet']
+        self._sheets.update(categories[code] for code in np.unique(batch.codes['source_sheet']).tolist() if categories[code])
+    
+    def add_records(self, records):
+        """إضافة قائمة سجلات أو RecordBatch"""
+        if isinstance(records, RecordBatch):
+            self.add_batch(records)
+        else:
+            for record in records:
+                self.add(record)
+    
+    def car_statistics(self):
+        """إحصائيات كل سيارة {كود السيارة: {stops, total_idle_seconds, max_idle_seconds, zones}}"""
+        return {
+            car_code: dict(car, zones=dict(car['zones']))
+            for car_code, car in sorted(self._cars.items(), key=lambda item: str(item[0]))
+        }
+    
+    def to_dict(self):
+        return {
+            'total_records': self.total_records,
+            'inside_zone': self.inside_zone,
+            'outside_zone': self.outside_zone,
+            'undefined_zone': self.undefined_zone,
+            'unique_cars': len(self._cars),
+            'sheets_processed': len(self._sheets),
+            'total_idle_seconds': self.total_idle_seconds,
+            'max_idle_seconds': self.max_idle_seconds,
+            'duplicates_dropped': self.duplicates_dropped,
+            'cars': self.car_statistics()
+        }
+
+
 def get_extraction_statistics(data):
     """
     حساب إحصائيات البيانات المستخرجة
     
+    للسجلات المستخرجة حديثًا يُفضَّل تمرير ExtractionStatistics إلى
+    extract_data_from_excel / iter_records بدلًا من مرور ثانٍ على السجلات.
+    
     Args:
-        data: قائمة السجلات
+        data: قائمة السجلات أو RecordBatch
     
     Returns:
         dict: الإحصائيات
     """
     try:
-        stats = {
-            'total_records': len(data),
-            'inside_zone': 0,
-            'outside_zone': 0,
-            'undefined_zone': 0,
-            'unique_cars': set(),
-            'sheets_processed': set()
-        }
-        
-        for record in data:
-            zone = record.get('zone', 'غير محدد')
-            
-            if zone == 'داخل النطاق':
-                stats['inside_zone'] += 1
-            elif zone == 'خارج النطاق':
-                stats['outside_zone'] += 1
-            else:
-                stats['undefined_zone'] += 1
-            
-            if record.get('car_code'):
-                stats['unique_cars'].add(record['car_code'])
-            
-            if record.get('source_sheet'):
-                stats['sheets_processed'].add(record['source_sheet'])
-        
-        stats['unique_cars'] = len(stats['unique_cars'])
-        stats['sheets_processed'] = len(stats['sheets_processed'])
-        
-        return stats
+        stats = ExtractionStatistics()
+        stats.add_records(data)
+        return stats.to_dict()
         
     except Exception as e:
         logger.error(f"Error calculating statistics: {e}")
@@ -369,197 +1086,651 @@ def get_extraction_statistics(data):
             'outside_zone': 0,
             'undefined_zone': 0,
             'unique_cars': 0,
-            'sheets_processed': 0
+            'sheets_processed': 0,
+            'total_idle_seconds': 0,
+            'max_idle_seconds': 0,
+            'cars': {}
         }
 
 
-def create_summary_report(data, output_path, mode="engine_idle"):
+_THIN_SIDE = Side(style='thin', color='000000')
+_CELL_BORDER = Border(left=_THIN_SIDE, right=_THIN_SIDE, top=_THIN_SIDE, bottom=_THIN_SIDE)
+
+
+def _report_style(name, font=None, horizontal='center', wrap_text=False, number_format='General',
+                  fill=None, border=_CELL_BORDER):
+    """NamedStyle لخلايا التقرير"""
+    return NamedStyle(
+        name=name,
+        font=font or DEFAULT_FONT,
+        fill=fill or PatternFill(),
+        border=border or Border(),
+        alignment=Alignment(horizontal=horizontal, vertical='center', wrap_text=wrap_text),
+        number_format=number_format
+    )
+
+
+def duration_style(value):
+    """اسم تنسيق خلية المدة حسب نوع القيمة (time أو timedelta أو نص)"""
+    if isinstance(value, datetime_time):
+        return 'report_duration_time'
+    if isinstance(value, timedelta):
+        return 'report_duration_elapsed'
+    return 'report_duration'
+
+
+def report_named_styles():
     """
-    إنشاء تقرير موحّد بتنسيق احترافي
+    تنسيقات التقرير الموحد كـ NamedStyle جديدة لكل مصنف
+    
+    تُسجَّل في المصنف مرة واحدة وتُشار إليها الخلايا بالاسم
+    بدلًا من إنشاء Font / Alignment / Border لكل خلية.
+    """
+    return [
+        _report_style('report_title', Font(name='Arial', size=14, bold=True, color="1F4E78"),
+                      fill=PatternFill(start_color="B4C7E7", end_color="B4C7E7", fill_type="solid"), border=None),
+        _report_style('report_header', Font(name='Arial', size=12, bold=True, color="FFFFFF"),
+                      fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")),
+        _report_style('report_cell'),
+        _report_style('report_datetime', number_format='DD/MM/YYYY HH:MM:SS'),
+        _report_style('report_car', Font(name='Arial', size=11, bold=True)),
+        _report_style('report_duration', Font(name='Arial', size=11, bold=True, color="C00000")),
+        # المدد الزمنية تحتاج تنسيق وقت وإلا تظهر ككسر من اليوم
+        _report_style('report_duration_time', Font(name='Arial', size=11, bold=True, color="C00000"),
+                      number_format='h:mm:ss'),
+        _report_style('report_duration_elapsed', Font(name='Arial', size=11, bold=True, color="C00000"),
+                      number_format='[h]:mm:ss'),
+        _report_style('report_link', Font(name='Arial', size=10, color="0563C1", underline="single", bold=True)),
+        _report_style('report_zone', Font(name='Arial', size=11, bold=True)),
+        _report_style('report_address', Font(name='Arial', size=10, bold=True, color="0066CC"),
+                      horizontal='right', wrap_text=True),
+        _report_style('report_address_missing', Font(name='Arial', size=10, color="999999", italic=True),
+                      horizontal='right', wrap_text=True),
+        _report_style('report_source', Font(name='Arial', size=9, color="666666")),
+    ]
+
+
+# عمود النطاق يُلوَّن بالتنسيق الشرطي بدلًا من تعبئة كل خلية
+ZONE_COLUMN = 'G'
+ZONE_COLORS = {
+    'outside': ("FFC7CE", "9C0006"),
+    'undefined': ("FFEB9C", "9C6500"),
+    'inside': ("C6EFCE", "006100")
+}
+
+GOOGLE_MAPS_URL = 'https://www.google.com/maps?q={}'
+
+
+def maps_link_formula(coordinates):
+    """صيغة HYPERLINK() لرابط Google Maps (بدون علاقة رابط منفصلة لكل خلية)"""
+    text = str(coordinates).replace('"', '""')
+    return f'=HYPERLINK("{GOOGLE_MAPS_URL.format(text)}","{text}")'
+
+
+def add_zone_conditional_formatting(ws, first_row, last_row):
+    """
+    تلوين عمود النطاق بقواعد شرطية (خارج النطاق / غير محدد / داخل أو نطاق مسمى)
     
     Args:
-        data: قائمة السجلات
-        output_path: مسار الحفظ
-        mode: وضع التقرير
+        ws: ورقة التقرير
+        first_row: أول صف بيانات
+        last_row: آخر صف بيانات
+    """
+    if last_row < first_row:
+        return
     
-    Returns:
-        str: مسار الملف المحفوظ
+    cell_range = f"{ZONE_COLUMN}{first_row}:{ZONE_COLUMN}{last_row}"
+    cell = f"${ZONE_COLUMN}{first_row}"
+    conditions = {
+        'outside': f'{cell}="{ZONE_OUTSIDE}"',
+        'undefined': f'OR({cell}="{ZONE_UNDEFINED}",LEN({cell})=0)',
+        'inside': f'AND({cell}<>"{ZONE_OUTSIDE}",{cell}<>"{ZONE_UNDEFINED}",LEN({cell})>0)'
+    }
+    
+    for key, formula in conditions.items():
+        fill_color, font_color = ZONE_COLORS[key]
+        ws.conditional_formatting.add(cell_range, FormulaRule(
+            formula=[formula],
+            fill=PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid"),
+            font=Font(bold=True, color=font_color),
+            stopIfTrue=True
+        ))
+
+
+# أعمدة التقرير الموحد وعرضها
+REPORT_COLUMN_WIDTHS = {'A': 8, 'B': 18, 'C': 22, 'D': 22, 'E': 18, 'F': 25, 'G': 18, 'H': 50, 'I': 30}
+
+REPORT_SHEET_TITLE = "التقرير الموحد"
+
+# الحد الأقصى لصفوف ورقة Excel (صفا العنوان والهيدر ضمنها)
+EXCEL_MAX_ROWS = 1048576
+REPORT_HEADER_ROWS = 2
+
+# عدد السجلات الافتراضي لكل مصنف عند تقسيم التقرير حسب الحجم
+DEFAULT_SPLIT_ROWS = 500000
+
+
+class SummaryReportWriter:
     """
-    if not data:
-        raise ValueError("No data to create report")
+    كاتب التقرير الموحّد بشكل تدريجي
     
-    try:
-        logger.info(f"Creating summary report with {len(data)} records")
+    يستقبل السجلات واحدًا تلو الآخر (من iter_records مثلًا) ويكتبها فورًا،
+    لذلك لا تحتاج قائمة السجلات الكاملة إلى البقاء في الذاكرة.
+    
+    افتراضيًا يُستخدم مصنف write_only: كل صف يُكتب إلى ملف الورقة المؤقت
+    فور إضافته (WriteOnlyCell)، فيبقى استهلاك الذاكرة ثابتًا مهما كان
+    عدد الصفوف. العرض وتجميد الصفوف يُضبطان قبل أول صف كما يتطلب هذا الوضع.
+    
+    التنسيقات مسجلة كـ NamedStyle مرة واحدة، وألوان النطاق تنسيق شرطي على
+    العمود، وروابط الخرائط صيغ HYPERLINK() بدلًا من رابط مستقل لكل خلية.
+    
+    عند امتلاء الورقة (حد Excel 1,048,576 صفًا) تُكمَل السجلات في أوراق
+    تالية "التقرير الموحد (2)"، ... بنفس العنوان والهيدر، والترقيم مستمر.
+    
+    الاستخدام:
+        with SummaryReportWriter(output_path, mode) as writer:
+            writer.extend(iter_records(file_path, mode, zones))
+    """
+    
+    def __init__(self, output_path, mode="engine_idle", write_only=True, max_rows_per_sheet=EXCEL_MAX_ROWS):
+        self.output_path = output_path
+        self.mode = mode
+        self.write_only = write_only
+        self.rows_per_sheet = max_rows_per_sheet - REPORT_HEADER_ROWS
+        self.count = 0
+        self.sheet_count = 0
         
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "التقرير الموحد"
+        self.wb = openpyxl.Workbook(write_only=write_only)
+        self.ws = None
+        self.sheets = []
+        
+        self._init_styles()
+        self._add_sheet()
+    
+    def _add_sheet(self):
+        """بدء ورقة جديدة (الأولى أو ورقة استكمال) بالعنوان والهيدر"""
+        number = len(self.sheets) + 1
+        title = REPORT_SHEET_TITLE if number == 1 else f"{REPORT_SHEET_TITLE} ({number})"
+        
+        if self.write_only or number > 1:
+            self.ws = self.wb.create_sheet(title)
+        else:
+            self.ws = self.wb.active
+            self.ws.title = title
         
+        self.sheets.append(self.ws)
+        self.sheet_count = 0
+        
+        self._init_layout()
+        self._write_title_and_header()
+        
+        if number > 1:
+            logger.info(f"Report sheet limit reached, continuing in sheet: {title}")
+    
+    def _finish_sheet(self):
+        # تلوين النطاق
+        add_zone_conditional_formatting(self.ws, REPORT_HEADER_ROWS + 1, self.sheet_count + REPORT_HEADER_ROWS)
+    
+    def _init_styles(self):
         # ======================== التنسيقات ======================== #
         
-        # ألوان الهيدر
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        
-        # ألوان النطاق
-        inside_zone_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-        outside_zone_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-        undefined_zone_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-        
-        # الحدود
-        border = Border(
-            left=Side(style='thin', color='000000'),
-            right=Side(style='thin', color='000000'),
-            top=Side(style='thin', color='000000'),
-            bottom=Side(style='thin', color='000000')
-        )
+        for style in report_named_styles():
+            self.wb.add_named_style(style)
+    
+    def _init_layout(self):
+        ws = self.ws
+        
+        # ======================== ضبط العرض ======================== #
+        
+        for column, width in REPORT_COLUMN_WIDTHS.items():
+            ws.column_dimensions[column].width = width
+        
+        # تجميد الصفوف
+        ws.freeze_panes = 'A3'
         
+        ws.row_dimensions[1].height = 30
+        ws.row_dimensions[2].height = 25
+    
+    def _write_row(self, row_num, cells):
+        """كتابة صف من (القيمة، اسم التنسيق)"""
+        ws = self.ws
+        
+        if self.write_only:
+            row = []
+            for value, style in cells:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.style = style
+                row.append(cell)
+            ws.append(row)
+            return
+        
+        for col_num, (value, style) in enumerate(cells, 1):
+            cell = ws.cell(row=row_num, column=col_num)
+            cell.value = value
+            cell.style = style
+    
+    def _write_title_and_header(self):
         # ======================== صف العنوان ======================== #
         
-        car_header = "كود السيارة" if mode == "engine_idle" else "لوحة السيارة"
+        car_header = "كود السيارة" if self.mode == "engine_idle" else "لوحة السيارة"
         headers = ['#', car_header, 'بداية التوقف', 'نهاية التوقف', 'مدة التوقف', 
                    'الإحداثيات', 'النطاق', 'الموقع', 'المصدر']
         
         # دمج الخلايا للعنوان
-        ws.merge_cells('A1:I1')
-        title_cell = ws['A1']
-        title_text = "تقرير توقفات السيارات" if mode == "engine_idle" else "تقرير مواقع السيارات"
-        title_cell.value = f"🚗 {title_text} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        title_cell.font = Font(name='Arial', size=14, bold=True, color="1F4E78")
-        title_cell.alignment = Alignment(horizontal='center', vertical='center')
-        title_cell.fill = PatternFill(start_color="B4C7E7", end_color="B4C7E7", fill_type="solid")
-        ws.row_dimensions[1].height = 30
-        
-        # ======================== صف الهيدر ======================== #
+        if self.write_only:
+            self.ws.merged_cells.add('A1:I1')
+        else:
+            self.ws.merge_cells('A1:I1')
         
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=2, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
+        title_text = "تقرير توقفات السيارات" if self.mode == "engine_idle" else "تقرير مواقع السيارات"
+        title = f"🚗 {title_text} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        self._write_row(1, [(title, 'report_title')])
         
-        ws.row_dimensions[2].height = 25
+        # ======================== صف الهيدر ======================== #
         
-        # ======================== صفوف البيانات ======================== #
+        self._write_row(2, [(header, 'report_header') for header in headers])
+    
+    def _row_cells(self, idx, record):
+        """(القيمة، اسم التنسيق) لخلايا صف سجل واحد بترتيب الأعمدة"""
+        start_val = record.get('start_time', '')
+        end_val = record.get('end_time', '')
+        duration = record.get('duration', '')
+        coordinates = record.get('coordinates', '')
+        address_text = record.get('address', '')
         
-        for idx, record in enumerate(data, 1):
-            row_num = idx + 2
-            
-            # الرقم التسلسلي
-            cell = ws.cell(row=row_num, column=1)
-            cell.value = idx
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-            
-            # كود السيارة
-            cell = ws.cell(row=row_num, column=2)
-            cell.value = record.get('car_code', '')
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-            cell.font = Font(name='Arial', size=11, bold=True)
-            
-            # وقت البداية
-            cell = ws.cell(row=row_num, column=3)
-            start_val = record.get('start_time', '')
-            if isinstance(start_val, datetime):
-                cell.value = start_val
-                cell.number_format = 'DD/MM/YYYY HH:MM:SS'
-            else:
-                cell.value = start_val
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-            
-            # وقت النهاية
-            cell = ws.cell(row=row_num, column=4)
-            end_val = record.get('end_time', '')
-            if isinstance(end_val, datetime):
-                cell.value = end_val
-                cell.number_format = 'DD/MM/YYYY HH:MM:SS'
-            else:
-                cell.value = end_val
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-            
+        return (
+            # الرقم التسلسلي وكود السيارة
+            (idx, 'report_cell'),
+            (record.get('car_code', ''), 'report_car'),
+            # وقت البداية والنهاية
+            (start_val, 'report_datetime' if isinstance(start_val, datetime) else 'report_cell'),
+            (end_val, 'report_datetime' if isinstance(end_val, datetime) else 'report_cell'),
             # المدة
-            cell = ws.cell(row=row_num, column=5)
-            cell.value = record.get('duration', '')
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-            cell.font = Font(name='Arial', size=11, bold=True, color="C00000")
-            
+            (duration, duration_style(duration)),
             # الإحداثيات (مع رابط Google Maps)
-            cell = ws.cell(row=row_num, column=6)
-            coordinates = record.get('coordinates', '')
-            cell.value = coordinates
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-            
-            if coordinates:
-                maps_url = f'https://www.google.com/maps?q={coordinates}'
-                cell.hyperlink = maps_url
-                cell.font = Font(name='Arial', size=10, color="0563C1", underline="single", bold=True)
-            
-            # النطاق (مع تلوين)
-            cell = ws.cell(row=row_num, column=7)
-            zone_status = record.get('zone', 'غير محدد')
-            cell.value = zone_status
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-            
-            if zone_status == "داخل النطاق":
-                cell.fill = inside_zone_fill
-                cell.font = Font(name='Arial', size=11, bold=True, color="006100")
-            elif zone_status == "خارج النطاق":
-                cell.fill = outside_zone_fill
-                cell.font = Font(name='Arial', size=11, bold=True, color="9C0006")
-            else:
-                cell.fill = undefined_zone_fill
-                cell.font = Font(name='Arial', size=11, bold=True, color="9C6500")
-            
+            (maps_link_formula(coordinates), 'report_link') if coordinates else (coordinates, 'report_cell'),
+            # النطاق (التلوين بالتنسيق الشرطي)
+            (record.get('zone', 'غير محدد'), 'report_zone'),
             # العنوان
-            cell = ws.cell(row=row_num, column=8)
-            address_text = record.get('address', '')
-            
-            if not address_text:
-                cell.value = "غير متوفر"
-                cell.font = Font(name='Arial', size=10, color="999999", italic=True)
-            else:
-                cell.value = address_text
-                cell.font = Font(name='Arial', size=10, bold=True, color="0066CC")
-            
-            cell.alignment = Alignment(horizontal='right', vertical='center', wrap_text=True)
-            cell.border = border
-            
+            (address_text, 'report_address') if address_text else ("غير متوفر", 'report_address_missing'),
             # المصدر
-            cell = ws.cell(row=row_num, column=9)
-            cell.value = record.get('source_sheet', '')
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-            cell.font = Font(name='Arial', size=9, color="666666")
+            (record.get('source_sheet', ''), 'report_source')
+        )
+    
+    def append(self, record):
+        """كتابة سجل واحد كصف في التقرير"""
+        if self.sheet_count >= self.rows_per_sheet:
+            self._finish_sheet()
+            self._add_sheet()
         
-        # ======================== ضبط العرض ======================== #
+        self.count += 1
+        self.sheet_count += 1
         
-        ws.column_dimensions['A'].width = 8
-        ws.column_dimensions['B'].width = 18
-        ws.column_dimensions['C'].width = 22
-        ws.column_dimensions['D'].width = 22
-        ws.column_dimensions['E'].width = 18
-        ws.column_dimensions['F'].width = 25
-        ws.column_dimensions['G'].width = 18
-        ws.column_dimensions['H'].width = 50
-        ws.column_dimensions['I'].width = 30
+        # ======================== صفوف البيانات ======================== #
         
-        # تجميد الصفوف
-        ws.freeze_panes = 'A3'
+        self._write_row(self.sheet_count + REPORT_HEADER_ROWS, self._row_cells(self.count, record))
+    
+    def extend(self, records):
+        """كتابة مجموعة سجلات (قائمة أو مكرر أو RecordBatch)"""
+        if isinstance(records, RecordBatch):
+            records = records.iter_dicts()
+        for record in records:
+            self.append(record)
+    
+    def close(self):
+        """
+        إنهاء التقرير وحفظه
+        
+        Returns:
+            str: مسار الملف المحفوظ
+        """
+        if not self.count:
+            self.discard()
+            raise ValueError("No data to create report")
+        
+        self._finish_sheet()
         
         # حفظ الملف
-        wb.save(output_path)
-        wb.close()
+        self.wb.save(self.output_path)
+        self.wb.close()
+        
+        logger.info(f"Summary report created successfully: {self.output_path} ({self.count} records)")
+        return self.output_path
+    
+    def discard(self):
+        """إلغاء التقرير دون حفظ"""
+        if self.write_only:
+            # إغلاق ملفات الأوراق المؤقتة التي كُتبت إليها الصفوف وحذفها
+            for ws in self.wb.worksheets:
+                if ws._writer is not None and not ws.closed:
+                    ws.close()
+                    ws._writer.cleanup()
+        self.wb.close()
+        # ملف جزئي من حفظ فاشل
+        try:
+            os.remove(self.output_path)
+        except OSError:
+            pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+        return False
+
+
+def _safe_part_name(value):
+    """جزء آمن من اسم الملف (كود السيارة مثلًا)"""
+    return re.sub(r'[^\w\-]+', '_', str(value)).strip('_') or 'unknown'
+
+
+def unique_part_name(value, used_names):
+    """
+    اسم جزء آمن وفريد داخل ملف ZIP واحد
+
+    الأكواد المختلفة التي تعطي نفس الاسم الآمن ('ABC 1' و 'ABC/1') تأخذ
+    لاحقة _2 و _3 ...، والاسم الناتج يُضاف إلى used_names فلا تتصادم
+    اللاحقة مع كود سيارة حقيقي يأتي لاحقًا.
+    """
+    base = _safe_part_name(value)
+    name = base
+    suffix = 1
+    while name.lower() in used_names:
+        suffix += 1
+        name = f"{base}_{suffix}"
+    used_names.add(name.lower())
+    return name
+
+
+def _spill_batch(path, batch):
+    """إلحاق دفعة بملف سيارة مؤقت (يُفتح ويُغلق في كل مرة)"""
+    with open(path, 'ab') as f:
+        pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_spilled(path):
+    """قراءة كل الدفعات الملحقة بملف سيارة مؤقت كدفعة واحدة"""
+    batches = []
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                batches.append(pickle.load(f))
+            except EOFError:
+                break
+    return RecordBatch.concat(batches)
+
+
+def _render_car_report(spill_path, output_path, mode, max_rows_per_sheet=EXCEL_MAX_ROWS):
+    """
+    رسم مصنف سيارة واحدة من ملف سجلاتها المؤقت
+    
+    عند الفشل يُحذف المصنف الجزئي وملف السجلات المؤقت قبل إعادة رفع الخطأ.
+    """
+    writer = SummaryReportWriter(output_path, mode, max_rows_per_sheet=max_rows_per_sheet)
+    try:
+        writer.extend(_load_spilled(spill_path))
+        writer.close()
+    except Exception:
+        try:
+            writer.discard()
+        except Exception as discard_error:
+            logger.warning(f"Error discarding car report {os.path.basename(output_path)}: {discard_error}")
+        for path in (output_path, spill_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+    os.remove(spill_path)
+    return output_path
+
+
+class SplitReportWriter:
+    """
+    تقسيم التقرير الموحد إلى عدة مصنفات داخل ملف ZIP واحد
+    
+    split_by='size': مصنف جديد كل split_rows سجل، وكل مصنف يُحفظ في ZIP فور
+    امتلائه فلا يبقى مفتوحًا إلا مصنف واحد.
+    split_by='car': مصنف لكل سيارة. السيارة قد تظهر في أكثر من ملف مرفوع،
+    لذلك تُقسَّم السجلات أولًا حسب السيارة وتُلحق بملف مؤقت لكل سيارة
+    (دفعات عمودية مضغوطة)، ثم تُرسَم مصنفات السيارات عند الإغلاق بالتوازي
+    في مجمع عمليات (max_workers)، وكل عملية تقرأ ملف سيارتها بنفسها - لا تبقى
+    ملفات أو مصنفات مفتوحة لكل سيارة ولا يبقى كامل السجلات في الذاكرة.
+    
+    أسماء المصنفات فريدة (unique_part_name). الواجهة نفسها:
+    append / extend / close / discard.
+    """
+    
+    SPLIT_MODES = ('size', 'car')
+    
+    # السجلات المضافة فرديًا تُجمَّع بهذا العدد قبل توزيعها على ملفات السيارات
+    SPILL_ROWS = 50000
+    
+    def __init__(self, output_path, mode="engine_idle", split_by='size', split_rows=None,
+                 max_rows_per_sheet=EXCEL_MAX_ROWS, max_workers=None):
+        if split_by not in self.SPLIT_MODES:
+            raise ValueError(f"Unknown report split mode: {split_by}")
+        
+        self.output_path = output_path
+        self.mode = mode
+        self.split_by = split_by
+        self.split_rows = split_rows or DEFAULT_SPLIT_ROWS
+        self.max_rows_per_sheet = max_rows_per_sheet
+        self.max_workers = max_workers
+        self.count = 0
+        self.parts = 0
+        
+        base_name = os.path.splitext(os.path.basename(output_path))[0]
+        self._base_name = base_name
+        self._parts_dir = os.path.join(os.path.dirname(output_path) or '.', f"{base_name}_parts")
+        os.makedirs(self._parts_dir, exist_ok=True)
+        
+        self._part_names = set()
+        self._archive = None
+        self._current = None
+        self._builder = RecordBatchBuilder()
+        # كود السيارة -> (الكود كما ظهر أولًا، ملف السجلات المؤقت) بترتيب أول ظهور
+        self._car_spills = {}
+    
+    def _part_path(self, name):
+        return os.path.join(self._parts_dir, f"{self._base_name}_{unique_part_name(name, self._part_names)}.xlsx")
+    
+    def _store(self, part_path):
+        """إضافة مصنف محفوظ إلى ZIP وحذفه من مجلد الأجزاء"""
+        if self._archive is None:
+            # ملفات xlsx مضغوطة أصلًا، لذلك تُخزَّن دون إعادة ضغط
+            self._archive = zipfile.ZipFile(self.output_path, 'w', zipfile.ZIP_STORED)
+        self._archive.write(part_path, os.path.basename(part_path))
+        os.remove(part_path)
+        self.parts += 1
+    
+    # ---------- split_by='size' ---------- #
+    
+    def _size_writer(self):
+        if self._current is not None and self._current.count >= self.split_rows:
+            self._store(self._current.close())
+            self._current = None
+        if self._current is None:
+            self._current = SummaryReportWriter(
+                self._part_path(f"part{self.parts + 1}"), self.mode, max_rows_per_sheet=self.max_rows_per_sheet
+            )
+        return self._current
+    
+    # ---------- split_by='car' ---------- #
+    
+    def _spill(self, batch):
+        """توزيع دفعة على ملفات السيارات المؤقتة"""
+        for car_code, part in batch.partition('car_code'):
+            key = car_code or ''
+            entry = self._car_spills.get(key)
+            if entry is None:
+                entry = self._car_spills[key] = (key, os.path.join(self._parts_dir, f"car{len(self._car_spills)}.pkl"))
+            _spill_batch(entry[1], part.compact())
+    
+    def _flush_builder(self):
+        # السجلات المضافة فرديًا تسبق الدفعة التالية للحفاظ على الترتيب
+        if len(self._builder):
+            self._spill(self._builder.build())
+            self._builder = RecordBatchBuilder()
+    
+    def _iter_rendered(self):
+        """مسارات مصنفات السيارات فور انتهاء رسم كل منها"""
+        jobs = [
+            (spill_path, self._part_path(car_code), self.mode, self.max_rows_per_sheet)
+            for car_code, spill_path in self._car_spills.values()
+        ]
+        workers = get_worker_count(self.max_workers, len(jobs))
+        logger.info(f"Rendering {len(jobs)} per-car workbooks with {workers} workers")
+        
+        if workers == 1:
+            for job in jobs:
+                yield _render_car_report(*job)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_mp_context()) as executor:
+            futures = [executor.submit(_render_car_report, *job) for job in jobs]
+            for future in as_completed(futures):
+                yield future.result()
+    
+    # ---------- الواجهة ---------- #
+    
+    def append(self, record):
+        """كتابة سجل واحد في المصنف المناسب"""
+        if self.split_by == 'car':
+            self._builder.append_record(record)
+            if len(self._builder) >= self.SPILL_ROWS:
+                self._flush_builder()
+        else:
+            self._size_writer().append(record)
+        self.count += 1
+    
+    def extend(self, records):
+        """كتابة مجموعة سجلات (قائمة أو مكرر أو RecordBatch)"""
+        if isinstance(records, RecordBatch):
+            if self.split_by == 'car':
+                self._flush_builder()
+                self._spill(records)
+                self.count += len(records)
+                return
+            records = records.iter_dicts()
+        for record in records:
+            self.append(record)
+    
+    def close(self):
+        """
+        حفظ جميع المصنفات وضمها في ملف ZIP
+        
+        Returns:
+            str: مسار ملف ZIP
+        """
+        if not self.count:
+            self.discard()
+            raise ValueError("No data to create report")
+        
+        try:
+            if self.split_by == 'car':
+                self._flush_builder()
+                for part_path in self._iter_rendered():
+                    self._store(part_path)
+            else:
+                self._store(self._current.close())
+                self._current = None
+            self._archive.close()
+            self._archive = None
+        except Exception:
+            self.discard()
+            raise
+        finally:
+            shutil.rmtree(self._parts_dir, ignore_errors=True)
+        
+        logger.info(f"Split report created: {self.output_path} "
+                    f"({self.count} records in {self.parts} workbooks, split by {self.split_by})")
+        return self.output_path
+    
+    def discard(self):
+        """إلغاء جميع المصنفات دون حفظ"""
+        if self._current is not None:
+            self._current.discard()
+            self._current = None
+        self._builder = RecordBatchBuilder()
+        self._car_spills = {}
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        try:
+            os.remove(self.output_path)
+        except OSError:
+            pass
+        shutil.rmtree(self._parts_dir, ignore_errors=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+        return False
+
+
+# صيغ الإخراج: التقرير المنسق أو الصيغ الآلية الأسرع (بدون تنسيق)
+REPORT_FORMATS = ('xlsx',) + tuple(RECORD_WRITERS)
+
+
+def open_report_writer(output_path, mode="engine_idle", split_by=None, split_rows=None, output_format='xlsx',
+                       per_car=False, max_workers=None):
+    """
+    كاتب التقرير المناسب: مصنف واحد، أو مصنفات مقسمة في ZIP، أو ملف آلي
+    
+    Args:
+        output_path: مسار التقرير (.xlsx أو .zip عند التقسيم أو امتداد الصيغة)
+        mode: وضع التقرير
+        split_by: None أو 'size' أو 'car' (لتقارير xlsx فقط)
+        split_rows: عدد السجلات لكل مصنف عند split_by='size'
+        output_format: 'xlsx' أو 'csv' أو 'parquet' أو 'jsonl' أو 'geojson'
+        per_car: مصنف لكل سيارة في ZIP (نفس split_by='car')
+        max_workers: الحد الأقصى للعمليات عند رسم مصنفات السيارات
+    
+    Returns:
+        SummaryReportWriter | SplitReportWriter | RecordFileWriter
+    """
+    if output_format != 'xlsx':
+        if output_format not in RECORD_WRITERS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        return RECORD_WRITERS[output_format](output_path, mode)
+    if per_car:
+        split_by = 'car'
+    if split_by:
+        return SplitReportWriter(output_path, mode, split_by, split_rows, max_workers=max_workers)
+    return SummaryReportWriter(output_path, mode)
+
+
+def create_summary_report(data, output_path, mode="engine_idle"):
+    """
+    إنشاء تقرير موحّد بتنسيق احترافي
+    
+    Args:
+        data: قائمة السجلات أو RecordBatch
+        output_path: مسار الحفظ
+        mode: وضع التقرير
+    
+    Returns:
+        str: مسار الملف المحفوظ
+    """
+    if not data:
+        raise ValueError("No data to create report")
+    
+    try:
+        logger.info(f"Creating summary report with {len(data)} records")
         
-        logger.info(f"Summary report created successfully: {output_path}")
-        return output_path
+        writer = SummaryReportWriter(output_path, mode)
+        writer.extend(data)
+        return writer.close()
         
     except Exception as e:
         logger.error(f"Error creating summary report: {e}", exc_info=True)
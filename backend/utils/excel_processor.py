@@ -1,20 +1,188 @@
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.worksheet.table import Table, TableStyleInfo
-import pandas as pd
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import to_excel
+from datetime import date, datetime, time as datetime_time
+from xml.sax.saxutils import escape as xml_escape
 import os
+import zipfile
 import logging
+from utils.sheet_readers import open_legacy_reader, sniff_file_format
 
 logger = logging.getLogger(__name__)
 
 
 # ======================== تحويل الملفات المحسّن ======================== #
 
+# أنماط الخلايا في ملف التحويل: 0 عام، 1 تاريخ ووقت، 2 وقت، 3 تاريخ (تنسيقات Excel المدمجة)
+_XLSX_STYLE_DATETIME = 1
+_XLSX_STYLE_TIME = 2
+_XLSX_STYLE_DATE = 3
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="21" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+
+# عدد الصفوف التي تُجمَّع قبل كتابتها إلى ملف الورقة
+_XLSX_ROWS_PER_CHUNK = 1000
+
+
+def _xlsx_cell(reference, value):
+    """عنصر <c> لقيمة واحدة بنوعها (None = بدون خلية)"""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        value = ILLEGAL_CHARACTERS_RE.sub('', value)
+        return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{xml_escape(value)}</t></is></c>'
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        if value != value or value in (float('inf'), float('-inf')):
+            return ''
+        return f'<c r="{reference}"><v>{value!r}</v></c>'
+    if isinstance(value, datetime):
+        style = _XLSX_STYLE_DATETIME
+    elif isinstance(value, date):
+        style = _XLSX_STYLE_DATE
+    elif isinstance(value, datetime_time):
+        style = _XLSX_STYLE_TIME
+    else:
+        return _xlsx_cell(reference, str(value))
+    return f'<c r="{reference}" s="{style}"><v>{to_excel(value)!r}</v></c>'
+
+
+def _unique_sheet_title(title, used):
+    # اسم آمن للشيت (31 حرف كحد أقصى وبدون تكرار)
+    base = title[:31] or 'Sheet'
+    candidate = base
+    counter = 1
+    while candidate.lower() in used:
+        suffix = str(counter)
+        candidate = base[:31 - len(suffix)] + suffix
+        counter += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def write_rows_to_xlsx(sheets, output_path):
+    """
+    كتابة الأوراق إلى XLSX كمصنف write-only مبسط (صف بصف بدون كائنات خلايا)
+    
+    كل صف يُحوَّل مباشرة إلى XML الورقة داخل الأرشيف، والقيم تحتفظ بأنواعها:
+    الأرقام كأرقام، والتواريخ والأوقات كأرقام Excel بتنسيق تاريخ/وقت مدمج.
+    
+    Args:
+        sheets: مكرر (اسم الورقة، مكرر الصفوف)
+        output_path: مسار الحفظ
+    """
+    titles = []
+    used_titles = set()
+    columns = []
+    
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for sheet_name, rows in sheets:
+            titles.append(_unique_sheet_title(sheet_name, used_titles))
+            
+            with archive.open(f'xl/worksheets/sheet{len(titles)}.xml', 'w', force_zip64=True) as part:
+                part.write(_XLSX_SHEET_HEAD.encode('utf-8'))
+                chunk = []
+                for row_number, row in enumerate(rows, 1):
+                    while len(columns) < len(row):
+                        columns.append(get_column_letter(len(columns) + 1))
+                    cells = ''.join(
+                        _xlsx_cell(f'{column}{row_number}', value)
+                        for column, value in zip(columns, row) if value is not None
+                    )
+                    chunk.append(f'<row r="{row_number}">{cells}</row>')
+                    if len(chunk) >= _XLSX_ROWS_PER_CHUNK:
+                        part.write(''.join(chunk).encode('utf-8'))
+                        chunk = []
+                chunk.append(_XLSX_SHEET_TAIL)
+                part.write(''.join(chunk).encode('utf-8'))
+        
+        if not titles:
+            raise Exception("No sheets to write")
+        
+        sheet_entries = ''.join(
+            f'<sheet name="{xml_escape(title, {chr(34): "&quot;"})}" sheetId="{idx}" r:id="rId{idx}"/>'
+            for idx, title in enumerate(titles, 1)
+        )
+        sheet_rels = ''.join(
+            f'<Relationship Id="rId{idx}" '
+            f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{idx}.xml"/>'
+            for idx in range(1, len(titles) + 1)
+        )
+        sheet_types = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{idx}.xml" '
+            f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for idx in range(1, len(titles) + 1)
+        )
+        
+        archive.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES.format(sheets=sheet_types))
+        archive.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheet_entries}</sheets></workbook>'
+        ))
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{sheet_rels}<Relationship Id="rId{len(titles) + 1}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/></Relationships>'
+        ))
+        archive.writestr('xl/styles.xml', _XLSX_STYLES)
+
+
 def convert_xls_to_xlsx(file_path, output_folder):
     """
     تحويل ملف XLS إلى XLSX بشكل احترافي
     يدعم ملفات XLS الحقيقية وملفات HTML من iTrack
     
+    الخلايا تُنقل بأنواعها الأصلية (أرقام، تواريخ، أوقات) من قارئ XLS/HTML
+    مباشرة إلى XML الأوراق (write_rows_to_xlsx)، لذلك تكلفة التحويل قريبة من
+    تكلفة قراءة الملف.
+    
     Args:
         file_path: مسار الملف المصدر
         output_folder: مجلد الحفظ
@@ -31,81 +199,15 @@ def convert_xls_to_xlsx(file_path, output_folder):
             return file_path
         
         logger.info(f"Converting XLS file: {filename}")
-        
-        df_sheets = {}
-        
-        try:
-            # المحاولة الأولى: قراءة XLS حقيقي
-            xls_file = pd.ExcelFile(file_path, engine='xlrd')
-            for sheet_name in xls_file.sheet_names:
-                df_sheets[sheet_name] = pd.read_excel(xls_file, sheet_name=sheet_name, header=None)
-            xls_file.close()
-            logger.info(f"Successfully read as XLS: {filename}")
-            
-        except Exception as e:
-            # المحاولة الثانية: قراءة HTML (iTrack)
-            logger.warning(f"Standard XLS read failed ({e}), trying HTML fallback...")
-            
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-            
-            if "<table" in content.lower():
-                html_sheets = pd.read_html(content)
-                if not html_sheets:
-                    raise Exception("No <table> elements found in HTML content")
-                df_sheets["iTrack Report"] = html_sheets[0]
-                logger.info(f"Successfully parsed HTML iTrack report: {filename}")
-            else:
-                raise Exception(f"Unsupported file format: {e}")
-        
-        # تصدير إلى XLSX باستخدام openpyxl
-        wb = openpyxl.Workbook()
-        wb.remove(wb.active)  # حذف الشيت الافتراضي
-        
-        for sheet_name, df in df_sheets.items():
-            # اسم آمن للشيت (32 حرف كحد أقصى)
-            safe_name = sheet_name[:31]
-            ws = wb.create_sheet(title=safe_name)
-            
-            # كتابة البيانات
-            for r_idx, row in enumerate(df.values, 1):
-                for c_idx, value in enumerate(row, 1):
-                    cell = ws.cell(row=r_idx, column=c_idx)
-                    cell.value = None if pd.isna(value) else str(value)
-            
-            # إضافة تنسيق جدول
-            try:
-                max_row, max_col = ws.max_row, ws.max_column
-                if max_row > 0 and max_col > 0:
-                    # إنشاء اسم جدول فريد
-                    table_name = f"Table_{safe_name.replace(' ', '_')}"
-                    table_name = ''.join(c if c.isalnum() or c == '_' else '_' for c in table_name)
-                    table_name = table_name[:255]  # حد Excel
-                    
-                    # نطاق الجدول
-                    table_range = f"A1:{openpyxl.utils.get_column_letter(max_col)}{max_row}"
-                    
-                    # إنشاء الجدول
-                    tab = Table(displayName=table_name, ref=table_range)
-                    style = TableStyleInfo(
-                        name="TableStyleMedium9",
-                        showFirstColumn=False,
-                        showLastColumn=False,
-                        showRowStripes=True,
-                        showColumnStripes=False
-                    )
-                    tab.tableStyleInfo = style
-                    ws.add_table(tab)
-                    
-                    logger.info(f"Applied table formatting to sheet: {safe_name}")
-                    
-            except Exception as table_error:
-                logger.warning(f"Could not apply table formatting to {sheet_name}: {table_error}")
-        
-        # حفظ الملف
         output_path = os.path.join(output_folder, f"{name}.xlsx")
-        wb.save(output_path)
-        wb.close()
+        
+        # XLS حقيقي (الأوراق تُحمَّل عند الطلب) أو تقرير HTML من iTrack
+        with open_legacy_reader(file_path) as reader:
+            logger.info(f"Successfully read as {reader.name.upper()}: {filename}")
+            write_rows_to_xlsx(
+                ((sheet_name, reader.iter_rows(index)) for index, sheet_name in enumerate(reader.sheet_names)),
+                output_path
+            )
         
         if os.path.exists(output_path):
             logger.info(f"Successfully converted to XLSX: {output_path}")
@@ -127,6 +229,7 @@ def validate_excel_file(file_path):
     
     Returns:
         tuple: (is_valid, file_type, error_message)
+            file_type: 'xlsx' أو 'xls' أو 'html' (تقرير iTrack بامتداد xls)
     """
     try:
         if not os.path.exists(file_path):
@@ -137,20 +240,11 @@ def validate_excel_file(file_path):
         if file_ext not in ['.xls', '.xlsx']:
             return False, None, "File is not an Excel file (.xls or .xlsx)"
         
-        # محاولة الفتح
-        if file_ext == '.xls':
-            try:
-                pd.ExcelFile(file_path, engine='xlrd')
-                return True, 'xls', None
-            except Exception as e:
-                return False, 'xls', f"Invalid XLS file: {str(e)}"
-        
-        else:  # .xlsx
-            try:
-                openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-                return True, 'xlsx', None
-            except Exception as e:
-                return False, 'xlsx', f"Invalid XLSX file: {str(e)}"
+        # التعرف على الصيغة من أول بايتات الملف وفهرس ZIP بدون تحميل المصنف
+        try:
+            return True, sniff_file_format(file_path), None
+        except ValueError as e:
+            return False, file_ext[1:], f"Invalid {file_ext[1:].upper()} file: {e}"
         
     except Exception as e:
         return False, None, f"Validation error: {str(e)}"
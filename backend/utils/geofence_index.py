@@ -0,0 +1,279 @@
+import numpy as np
+import heapq
+import hashlib
+import threading
+import logging
+from utils.zone_classifier import ZoneClassifier, ZONE_OUTSIDE, ZONE_UNDEFINED
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== فهرس النطاقات الجغرافية ======================== #
+
+# أقصى عدد خلايا في كل محور من الشبكة
+MAX_GRID_CELLS = 1024
+
+# النطاق الذي يغطي إطاره أكثر من هذا العدد من الخلايا لا يُسجَّل في كل خلية،
+# بل يُضاف إلى مرشحي كل الخلايا ويُفحص بإطاره (تكلفة البناء لا تتجاوز هذا لكل نطاق)
+MAX_POLYGON_CELLS = 256
+
+
+def parse_polygon(points):
+    """
+    التحقق من نقاط مضلع وتحويلها إلى مصفوفة (lat, lon)
+
+    Args:
+        points: قائمة نقاط [[lat, lon], ...]
+
+    Returns:
+        numpy.ndarray: مصفوفة Nx2
+
+    Raises:
+        ValueError: إذا كان المضلع غير صالح
+    """
+    try:
+        polygon = np.asarray(points, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("Polygon points must be numeric [lat, lon] pairs")
+
+    if polygon.ndim != 2 or polygon.shape[1] != 2:
+        raise ValueError("Polygon points must be [lat, lon] pairs")
+    if len(polygon) < 3:
+        raise ValueError("Polygon must have at least 3 points")
+    if not np.isfinite(polygon).all():
+        raise ValueError("Polygon points must be finite numbers")
+    if (np.abs(polygon[:, 0]) > 90).any() or (np.abs(polygon[:, 1]) > 180).any():
+        raise ValueError("Polygon points are out of lat/lon range")
+
+    return polygon
+
+
+def points_in_polygon(lats, lons, polygon):
+    """
+    فحص نقطة داخل مضلع (ray casting) لمصفوفة نقاط دفعة واحدة
+
+    Args:
+        lats: مصفوفة خطوط العرض
+        lons: مصفوفة خطوط الطول
+        polygon: مصفوفة Nx2 من (lat, lon)
+
+    Returns:
+        numpy.ndarray: قيم منطقية لكل نقطة
+    """
+    inside = np.zeros(len(lats), dtype=bool)
+    poly_lats = polygon[:, 0]
+    poly_lons = polygon[:, 1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        j = len(polygon) - 1
+        for i in range(len(polygon)):
+            yi, xi = poly_lats[i], poly_lons[i]
+            yj, xj = poly_lats[j], poly_lons[j]
+            crosses = (yi > lats) != (yj > lats)
+            x_cross = (xj - xi) * (lats - yi) / (yj - yi) + xi
+            inside ^= crosses & (lons < x_cross)
+            j = i
+
+    return inside
+
+
+class GeofenceIndex(ZoneClassifier):
+    """
+    فهرس شبكي لمكتبة نطاقات مسماة (مستودعات، مواقع عملاء)
+
+    يتم تقسيم المساحة التي تغطيها النطاقات إلى شبكة منتظمة، وكل خلية
+    تحتفظ بالنطاقات التي يتقاطع إطارها مع الخلية. كل نقطة تُفحص فقط مقابل
+    مرشحي خليتها، لذلك تبقى تكلفة التصنيف شبه ثابتة مع زيادة عدد النطاقات.
+    النطاقات الواسعة (أكثر من MAX_POLYGON_CELLS خلية) مرشحة في كل الخلايا.
+    عند تداخل نطاقين يفوز الأصغر مساحة (الأكثر تحديدًا).
+    """
+
+    def __init__(self, geofences):
+        """
+        Args:
+            geofences: قائمة (name, points)
+        """
+        self.names = []
+        self.polygons = []
+        bboxes = []
+        areas = []
+
+        for name, points in geofences:
+            polygon = parse_polygon(points)
+            self.names.append(name)
+            self.polygons.append(polygon)
+            bboxes.append((*polygon.min(axis=0), *polygon.max(axis=0)))
+            lat, lon = polygon[:, 0], polygon[:, 1]
+            areas.append(0.5 * abs(np.dot(lon, np.roll(lat, 1)) - np.dot(lat, np.roll(lon, 1))))
+
+        self.bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        self._order = np.argsort(areas, kind='stable')
+        self._version = None
+        self._build_grid()
+
+    def __len__(self):
+        return len(self.polygons)
+
+    @property
+    def version(self):
+        """بصمة أسماء ونقاط جميع النطاقات (تُحسب مرة واحدة)"""
+        if self._version is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for name, polygon in zip(self.names, self.polygons):
+                digest.update(name.encode('utf-8'))
+                digest.update(b'\x1f')
+                digest.update(polygon.tobytes())
+            self._version = f"geofences:{digest.hexdigest()}"
+        return self._version
+
+    def _build_grid(self):
+        self._cells = {}
+        self._wide = []
+        if not len(self.polygons):
+            return
+
+        self.lat_min, self.lon_min = self.bboxes[:, 0].min(), self.bboxes[:, 1].min()
+        self.lat_max, self.lon_max = self.bboxes[:, 2].max(), self.bboxes[:, 3].max()
+
+        # حجم الخلية ≈ متوسط حجم النطاق، بحد أقصى MAX_GRID_CELLS خلية لكل محور
+        extent_lat = max(self.lat_max - self.lat_min, 1e-9)
+        extent_lon = max(self.lon_max - self.lon_min, 1e-9)
+        cell_lat = max(np.median(self.bboxes[:, 2] - self.bboxes[:, 0]), extent_lat / MAX_GRID_CELLS, 1e-9)
+        cell_lon = max(np.median(self.bboxes[:, 3] - self.bboxes[:, 1]), extent_lon / MAX_GRID_CELLS, 1e-9)
+
+        self._cell_lat = cell_lat
+        self._cell_lon = cell_lon
+        self._rows = int(extent_lat // cell_lat) + 1
+        self._cols = int(extent_lon // cell_lon) + 1
+
+        # رتبة كل نطاق حسب المساحة (ترتيب فحص المرشحين في كل خلية)
+        self._rank = np.empty(len(self.polygons), dtype=np.int64)
+        self._rank[self._order] = np.arange(len(self.polygons))
+        self._rank = self._rank.tolist()
+
+        for polygon_idx in self._order.tolist():
+            lat0, lon0, lat1, lon1 = self.bboxes[polygon_idx]
+            row0, col0 = self._cell_of(lat0, lon0)
+            row1, col1 = self._cell_of(lat1, lon1)
+            if (row1 - row0 + 1) * (col1 - col0 + 1) > MAX_POLYGON_CELLS:
+                self._wide.append(polygon_idx)
+                continue
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    self._cells.setdefault(row * self._cols + col, []).append(polygon_idx)
+
+        logger.info(f"Built geofence index: {len(self.polygons)} zones, "
+                    f"{self._rows}x{self._cols} grid, {len(self._cells)} occupied cells, "
+                    f"{len(self._wide)} wide zones")
+
+    def _cell_candidates(self, key):
+        """مرشحو الخلية والنطاقات الواسعة بترتيب المساحة"""
+        polygon_ids = self._cells.get(key, ())
+        if not self._wide:
+            return polygon_ids
+        if not polygon_ids:
+            return self._wide
+        return list(heapq.merge(polygon_ids, self._wide, key=self._rank.__getitem__))
+
+    def _cell_of(self, lat, lon):
+        row = min(int((lat - self.lat_min) // self._cell_lat), self._rows - 1)
+        col = min(int((lon - self.lon_min) // self._cell_lon), self._cols - 1)
+        return row, col
+
+    def classify(self, lats, lons):
+        """
+        تصنيف مصفوفات الإحداثيات مقابل جميع النطاقات
+
+        Returns:
+            numpy.ndarray: اسم النطاق المطابق، أو "خارج النطاق"، أو "غير محدد"
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+
+        labels = np.full(len(lats), ZONE_OUTSIDE, dtype=object)
+        valid = ~(np.isnan(lats) | np.isnan(lons))
+        labels[~valid] = ZONE_UNDEFINED
+
+        if not self.polygons:
+            return labels
+
+        with np.errstate(invalid='ignore'):
+            candidates = np.flatnonzero(
+                valid
+                & (lats >= self.lat_min) & (lats <= self.lat_max)
+                & (lons >= self.lon_min) & (lons <= self.lon_max)
+            )
+        if not len(candidates):
+            return labels
+
+        rows = np.minimum(((lats[candidates] - self.lat_min) // self._cell_lat).astype(np.int64), self._rows - 1)
+        cols = np.minimum(((lons[candidates] - self.lon_min) // self._cell_lon).astype(np.int64), self._cols - 1)
+        keys = rows * self._cols + cols
+
+        # تجميع النقاط حسب الخلية
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        candidates = candidates[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+
+        for start, end in zip(starts, ends):
+            polygon_ids = self._cell_candidates(int(keys[start]))
+            if not polygon_ids:
+                continue
+
+            remaining = candidates[start:end]
+            for polygon_idx in polygon_ids:
+                lat0, lon0, lat1, lon1 = self.bboxes[polygon_idx]
+                point_lats = lats[remaining]
+                point_lons = lons[remaining]
+                in_box = (point_lats >= lat0) & (point_lats <= lat1) & (point_lons >= lon0) & (point_lons <= lon1)
+                if not in_box.any():
+                    continue
+
+                boxed = remaining[in_box]
+                hit = points_in_polygon(lats[boxed], lons[boxed], self.polygons[polygon_idx])
+                if hit.any():
+                    labels[boxed[hit]] = self.names[polygon_idx]
+                    remaining = np.setdiff1d(remaining, boxed[hit], assume_unique=True)
+                    if not len(remaining):
+                        break
+
+        return labels
+
+
+# ======================== التخزين المؤقت لكل مستخدم ======================== #
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+
+def get_cached_index(user_id, version, loader):
+    """
+    الحصول على فهرس نطاقات المستخدم من الذاكرة أو بناؤه
+
+    Args:
+        user_id: معرف المستخدم
+        version: إصدار مكتبة النطاقات (يتغير عند أي تعديل)
+        loader: دالة تُرجع قائمة (name, points) عند الحاجة للبناء
+
+    Returns:
+        GeofenceIndex
+    """
+    with _index_lock:
+        cached = _index_cache.get(user_id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    index = GeofenceIndex(loader())
+
+    with _index_lock:
+        _index_cache[user_id] = (version, index)
+
+    return index
+
+
+def invalidate_cached_index(user_id):
+    """حذف فهرس المستخدم من الذاكرة"""
+    with _index_lock:
+        _index_cache.pop(user_id, None)
@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: القفل بين العمليات غير متاح
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== ذاكرة تخطيطات الهيدر ======================== #
+
+# ملف حفظ التخطيطات المكتشفة (مشترك بين الطلبات والعمليات العاملة)
+LAYOUT_CACHE_PATH = os.environ.get(
+    'HEADER_LAYOUT_CACHE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'header_layouts.json')
+)
+
+# أقصى عدد تخطيطات محفوظة (الأقدم يُحذف أولًا)
+MAX_LAYOUT_ENTRIES = 2000
+
+_DIGITS = re.compile(r'\d')
+
+
+def _cell_token(value):
+    """
+    تمثيل خلية في البصمة: النص بحروف صغيرة والأرقام مستبدلة بـ #،
+    والقيم غير النصية بنوعها فقط (التواريخ والأرقام تتغير بين الملفات)
+    """
+    if not value:
+        return ''
+    if isinstance(value, str):
+        return _DIGITS.sub('#', value.lower())
+    return type(value).__name__
+
+
+def layout_fingerprints(rows_values):
+    """
+    بصمات تراكمية لأول صفوف الورقة
+
+    البصمة رقم k تغطي الصفوف 1..k، مع إخفاء الخلية A1 (عنوان السيارة
+    يختلف بين الأوراق). تطابق البصمة يعني أن اكتشاف الهيدر سيعطي نفس النتيجة.
+
+    Args:
+        rows_values: قيم الصفوف بعد safe_read_value
+
+    Returns:
+        list: بصمة hex لكل صف
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    fingerprints = []
+
+    for row_idx, values in enumerate(rows_values, 1):
+        tokens = [_cell_token(v) for v in values]
+        if row_idx == 1 and tokens and tokens[0]:
+            tokens[0] = '*'
+        while tokens and not tokens[-1]:
+            tokens.pop()
+
+        digest.update('\x1f'.join(tokens).encode('utf-8'))
+        digest.update(b'\x1e')
+        fingerprints.append(digest.hexdigest())
+
+    return fingerprints
+
+
+class HeaderLayoutCache:
+    """
+    ذاكرة بصمة -> (header_row, columns) محفوظة على القرص
+
+    يتم تحميل الملف عند أول استخدام وإعادة تحميله إذا عدّلته عملية أخرى،
+    والحفظ يدمج محتوى الملف الحالي ثم يستبدله بشكل ذري تحت قفل ملف
+    (flock) فلا تضيع تخطيطات عمال gunicorn والعمليات العاملة المتزامنة.
+    """
+
+    def __init__(self, path=LAYOUT_CACHE_PATH, max_entries=MAX_LAYOUT_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read_file(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable header layout cache {self.path}: {e}")
+            return {}
+
+    @contextmanager
+    def _file_lock(self):
+        """قفل حصري بين العمليات حول القراءة والتعديل والكتابة"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        mtime = self._file_mtime()
+        if mtime != self._mtime:
+            self._entries = self._read_file()
+            self._mtime = mtime
+
+    def lookup(self, fingerprints, first_row=2):
+        """
+        البحث عن أول صف يطابق تخطيطًا محفوظًا
+
+        Args:
+            fingerprints: بصمات layout_fingerprints
+            first_row: أول صف يُبحث فيه
+
+        Returns:
+            tuple: (header_row, columns) أو None
+        """
+        with self._lock:
+            self._refresh()
+            for row_idx in range(first_row, len(fingerprints) + 1):
+                entry = self._entries.get(fingerprints[row_idx - 1])
+                if entry and entry[0] == row_idx:
+                    self.hits += 1
+                    return entry[0], dict(entry[1])
+            self.misses += 1
+            return None
+
+    def remember(self, fingerprint, header_row, columns):
+        """حفظ تخطيط مكتشف"""
+        entry = [header_row, columns]
+        with self._lock:
+            try:
+                with self._file_lock():
+                    entries = self._read_file()
+                    # تعلّمته عملية أخرى بالفعل: لا داعي لإعادة كتابة الملف
+                    if entries.get(fingerprint) != entry:
+                        entries.pop(fingerprint, None)
+                        entries[fingerprint] = entry
+                        while len(entries) > self.max_entries:
+                            entries.pop(next(iter(entries)))
+
+                        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                        with open(tmp_path, 'w', encoding='utf-8') as f:
+                            json.dump(entries, f)
+                        os.replace(tmp_path, self.path)
+                        logger.info(f"Learned header layout: row {header_row}, columns {columns}")
+
+                    self._entries = entries
+                    self._mtime = self._file_mtime()
+            except OSError as e:
+                logger.warning(f"Could not save header layout cache: {e}")
+                self._entries[fingerprint] = [header_row, columns]
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+_layout_cache = None
+_layout_cache_lock = threading.Lock()
+
+
+def get_layout_cache():
+    """ذاكرة التخطيطات المشتركة للعملية الحالية"""
+    global _layout_cache
+    with _layout_cache_lock:
+        if _layout_cache is None:
+            _layout_cache = HeaderLayoutCache()
+        return _layout_cache
@@ -0,0 +1,64 @@
+import os
+import multiprocessing
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== مجمع العمليات المتعددة ======================== #
+
+def get_cpu_quota():
+    """
+    عدد الأنوية المتاحة فعليًا للحاوية (حصة cgroup ثم affinity ثم cpu_count)
+
+    Returns:
+        int: عدد الأنوية (1 على الأقل)
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()[:2]
+            if limit != 'max':
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0 and period > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+
+    return max(1, cpus)
+
+
+def get_worker_count(max_workers=None, jobs=None):
+    """
+    حجم مجمع العمليات: الحد المحدد أو حصة المعالج، وبحد أقصى عدد المهام
+    """
+    workers = max_workers or get_cpu_quota()
+    if jobs is not None:
+        workers = min(workers, jobs)
+    return max(1, workers)
+
+
+def get_mp_context():
+    """forkserver على لينكس (آمن مع خيوط gunicorn) وspawn على غيره"""
+    try:
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(['utils.data_extractor', 'utils.excel_processor'])
+        return ctx
+    except ValueError:
+        return multiprocessing.get_context('spawn')
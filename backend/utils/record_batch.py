@@ -0,0 +1,309 @@
+import numpy as np
+from array import array
+from datetime import datetime, timedelta
+import logging
+from utils.zone_classifier import parse_coordinate, ZONE_UNDEFINED
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== مخزن السجلات العمودي ======================== #
+
+# ترتيب حقول السجل (نفس مفاتيح القاموس القديم)
+RECORD_FIELDS = ('car_code', 'start_time', 'end_time', 'duration', 'coordinates', 'zone', 'address', 'source_sheet')
+
+# حقول مُرمَّزة بالقاموس (قيم متكررة بكثرة)
+CATEGORICAL_FIELDS = ('car_code', 'duration', 'coordinates', 'zone', 'address', 'source_sheet')
+
+# حقول الوقت (datetime64)
+TIME_FIELDS = ('start_time', 'end_time')
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_US = timedelta(microseconds=1)
+_NAT = np.iinfo(np.int64).min  # تمثيل NaT في datetime64
+
+
+def _category_key(value):
+    """مفتاح القاموس: يفصل 1 عن 1.0 عن True"""
+    return value if type(value) is str else (type(value), value)
+
+
+class RecordBatchBuilder:
+    """
+    بناء RecordBatch صفًا بصف دون إنشاء قاموس لكل سجل
+
+    كل حقل نصي يُخزَّن كرمز int32 في قاموس القيم، والأوقات كأعداد
+    ميكروثانية، والإحداثيات كرقمين float64.
+    """
+
+    def __init__(self):
+        self._lookup = {field: {} for field in CATEGORICAL_FIELDS}
+        self._categories = {field: [] for field in CATEGORICAL_FIELDS}
+        self._codes = {field: array('i') for field in CATEGORICAL_FIELDS}
+        self._times = {field: array('q') for field in TIME_FIELDS}
+        self._time_overrides = {field: {} for field in TIME_FIELDS}
+        self._lats = array('d')
+        self._lons = array('d')
+        # (lat, lon) لكل قيمة إحداثيات مختلفة - يُحلَّل النص مرة واحدة فقط
+        self._points = []
+
+    def __len__(self):
+        return len(self._lats)
+
+    def _encode(self, field, value):
+        key = _category_key(value)
+        lookup = self._lookup[field]
+        code = lookup.get(key)
+        if code is None:
+            code = lookup[key] = len(self._categories[field])
+            self._categories[field].append(value)
+        self._codes[field].append(code)
+        return code
+
+    def _encode_time(self, field, value):
+        if isinstance(value, datetime) and value.tzinfo is None:
+            self._times[field].append((value - _EPOCH) // _ONE_US)
+            return
+        # القيم غير الزمنية (نصوص الوقت مثلًا) تُحفظ كما هي بشكل متفرق
+        self._times[field].append(_NAT)
+        if value is not None:
+            self._time_overrides[field][len(self._times[field]) - 1] = value
+
+    def append(self, car_code, start_time, end_time, duration, coordinates, address, source_sheet, zone=None):
+        """إضافة سجل (النطاق يُحدَّد لاحقًا عبر classify_zones إذا لم يُمرَّر)"""
+        self._encode('car_code', car_code)
+        self._encode_time('start_time', start_time)
+        self._encode_time('end_time', end_time)
+        self._encode('duration', duration)
+        coordinates_code = self._encode('coordinates', coordinates)
+        self._encode('address', address)
+        self._encode('source_sheet', source_sheet)
+
+        if coordinates_code == len(self._points):
+            self._points.append(parse_coordinate(coordinates))
+        lat, lon = self._points[coordinates_code]
+        self._lats.append(lat)
+        self._lons.append(lon)
+
+        if zone is not None:
+            self._encode('zone', zone)
+
+    def append_record(self, record):
+        """إضافة سجل من القاموس القديم"""
+        self.append(
+            record.get('car_code', ''), record.get('start_time'), record.get('end_time'),
+            record.get('duration'), record.get('coordinates', ''), record.get('address', ''),
+            record.get('source_sheet', ''), zone=record.get('zone', ZONE_UNDEFINED)
+        )
+
+    def classify_zones(self, zones):
+        """تصنيف نطاق جميع السجلات التي لم يُحدَّد نطاقها بعد - استدعاء واحد للمصنّف"""
+        start = len(self._codes['zone'])
+        if start >= len(self):
+            return
+
+        # التصنيف مرة واحدة لكل قيمة إحداثيات مختلفة ثم التوزيع على السجلات
+        coordinate_codes = np.frombuffer(self._codes['coordinates'], dtype=np.int32)[start:]
+        distinct_codes, row_positions = np.unique(coordinate_codes, return_inverse=True)
+        points = np.asarray(self._points, dtype=np.float64).reshape(-1, 2)[distinct_codes]
+        labels = zones.classify(points[:, 0], points[:, 1])[row_positions]
+
+        unique_labels, inverse = np.unique(labels.astype(str), return_inverse=True)
+        label_codes = np.empty(len(unique_labels), dtype=np.int32)
+        for idx, label in enumerate(unique_labels):
+            key = str(label)
+            code = self._lookup['zone'].get(key)
+            if code is None:
+                code = self._lookup['zone'][key] = len(self._categories['zone'])
+                self._categories['zone'].append(key)
+            label_codes[idx] = code
+
+        self._codes['zone'].frombytes(label_codes[inverse].astype(np.int32).tobytes())
+
+    def build(self):
+        """إنهاء البناء وإرجاع RecordBatch"""
+        if len(self._codes['zone']) < len(self):
+            # سجلات بدون تصنيف
+            missing = len(self) - len(self._codes['zone'])
+            for _ in range(missing):
+                self._encode('zone', ZONE_UNDEFINED)
+
+        return RecordBatch(
+            codes={field: np.frombuffer(self._codes[field], dtype=np.int32).copy() for field in CATEGORICAL_FIELDS},
+            categories=self._categories,
+            times={field: np.frombuffer(self._times[field], dtype=np.int64).view('datetime64[us]').copy()
+                   for field in TIME_FIELDS},
+            time_overrides=self._time_overrides,
+            lats=np.frombuffer(self._lats, dtype=np.float64).copy(),
+            lons=np.frombuffer(self._lons, dtype=np.float64).copy()
+        )
+
+
+class RecordBatch:
+    """
+    دفعة سجلات عمودية مُرمَّزة بالقاموس
+
+    - lats / lons: مصفوفات float64 (NaN عند غياب الإحداثيات)
+    - car_code / zone / source_sheet / ...: رموز int32 + قائمة القيم
+    - start_time / end_time: مصفوفات datetime64[us] (القيم غير الزمنية تُحفظ بشكل متفرق)
+
+    to_dicts() / iter_dicts() تعيد نفس قواميس السجلات القديمة.
+    """
+
+    def __init__(self, codes, categories, times, time_overrides, lats, lons):
+        self.codes = codes
+        self.categories = categories
+        self.times = times
+        self.time_overrides = time_overrides
+        self.lats = lats
+        self.lons = lons
+
+    def __len__(self):
+        return len(self.lats)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    @property
+    def nbytes(self):
+        """الحجم التقريبي للمصفوفات بالبايت"""
+        return (sum(a.nbytes for a in self.codes.values())
+                + sum(a.nbytes for a in self.times.values())
+                + self.lats.nbytes + self.lons.nbytes)
+
+    # ---------- البناء ---------- #
+
+    @classmethod
+    def empty(cls):
+        return RecordBatchBuilder().build()
+
+    @classmethod
+    def from_records(cls, records):
+        """تحويل قائمة القواميس القديمة إلى RecordBatch"""
+        builder = RecordBatchBuilder()
+        for record in records:
+            builder.append_record(record)
+        return builder.build()
+
+    @classmethod
+    def concat(cls, batches):
+        """دمج عدة دفعات مع توحيد قواميس القيم"""
+        batches = [b for b in batches if b is not None and len(b)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+
+        codes = {}
+        categories = {}
+        for field in CATEGORICAL_FIELDS:
+            lookup = {}
+            merged = []
+            parts = []
+            for batch in batches:
+                remap = np.empty(len(batch.categories[field]), dtype=np.int32)
+                for idx, value in enumerate(batch.categories[field]):
+                    key = _category_key(value)
+                    code = lookup.get(key)
+                    if code is None:
+                        code = lookup[key] = len(merged)
+                        merged.append(value)
+                    remap[idx] = code
+                parts.append(remap[batch.codes[field]] if len(remap) else batch.codes[field])
+            codes[field] = np.concatenate(parts).astype(np.int32)
+            categories[field] = merged
+
+        times = {}
+        time_overrides = {}
+        for field in TIME_FIELDS:
+            times[field] = np.concatenate([b.times[field] for b in batches])
+            overrides = {}
+            offset = 0
+            for batch in batches:
+                for row, value in batch.time_overrides[field].items():
+                    overrides[row + offset] = value
+                offset += len(batch)
+            time_overrides[field] = overrides
+
+        return cls(
+            codes=codes,
+            categories=categories,
+            times=times,
+            time_overrides=time_overrides,
+            lats=np.concatenate([b.lats for b in batches]),
+            lons=np.concatenate([b.lons for b in batches])
+        )
+
+    def take(self, indices):
+        """دفعة جديدة من صفوف محددة (بنفس قواميس القيم)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        position = {int(row): idx for idx, row in enumerate(indices)} if any(self.time_overrides.values()) else {}
+        return RecordBatch(
+            codes={field: self.codes[field][indices] for field in CATEGORICAL_FIELDS},
+            categories=self.categories,
+            times={field: self.times[field][indices] for field in TIME_FIELDS},
+            time_overrides={
+                field: {position[row]: value for row, value in overrides.items() if row in position}
+                for field, overrides in self.time_overrides.items()
+            },
+            lats=self.lats[indices],
+            lons=self.lons[indices]
+        )
+
+    def compact(self):
+        """نسخة بقواميس القيم المستخدمة فقط (أصغر عند النقل بين العمليات)"""
+        codes = {}
+        categories = {}
+        for field in CATEGORICAL_FIELDS:
+            used, inverse = np.unique(self.codes[field], return_inverse=True)
+            codes[field] = inverse.astype(self.codes[field].dtype)
+            categories[field] = [self.categories[field][code] for code in used.tolist()]
+        return RecordBatch(codes, categories, self.times, self.time_overrides, self.lats, self.lons)
+
+    def partition(self, field):
+        """
+        تقسيم الدفعة حسب قيمة حقل مُرمَّز مع الحفاظ على ترتيب الصفوف داخل كل قسم
+
+        Returns:
+            list: [(القيمة، RecordBatch)] بترتيب أول ظهور لكل قيمة
+        """
+        codes = self.codes[field]
+        order = np.argsort(codes, kind='stable')
+        boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+        groups = sorted(np.split(order, boundaries), key=lambda rows: rows[0]) if len(order) else []
+        categories = self.categories[field]
+        return [(categories[codes[rows[0]]], self.take(rows)) for rows in groups]
+
+    # ---------- القراءة ---------- #
+
+    def column(self, field):
+        """قيم حقل كقائمة Python (نفس قيم القواميس القديمة)"""
+        if field in CATEGORICAL_FIELDS:
+            categories = self.categories[field]
+            return [categories[code] for code in self.codes[field].tolist()]
+
+        values = self.times[field].tolist()
+        for row, value in self.time_overrides[field].items():
+            values[row] = value
+        return values
+
+    def iter_dicts(self):
+        """تكرار السجلات كقواميس (تُنشأ عند الطلب فقط)"""
+        columns = [self.column(field) for field in RECORD_FIELDS]
+        for values in zip(*columns):
+            yield dict(zip(RECORD_FIELDS, values))
+
+    def to_dicts(self):
+        """المحوّل إلى قائمة القواميس القديمة"""
+        return list(self.iter_dicts())
+
+    def zone_counts(self):
+        """عدد السجلات لكل قيمة نطاق"""
+        counts = np.bincount(self.codes['zone'], minlength=len(self.categories['zone']))
+        return {label: int(count) for label, count in zip(self.categories['zone'], counts) if count}
+
+    def distinct_count(self, field):
+        """عدد القيم غير الفارغة المستخدمة فعليًا في حقل مُرمَّز"""
+        used = np.unique(self.codes[field])
+        categories = self.categories[field]
+        return sum(1 for code in used.tolist() if categories[code])
@@ -0,0 +1,270 @@
+import os
+import csv
+import json
+import math
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+import logging
+from utils.record_batch import RecordBatch, RECORD_FIELDS
+from utils.record_merge import sort_time
+from utils.zone_classifier import parse_coordinate
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow في requirements.txt، لكن الصيغ الأخرى تعمل بدونه
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== صيغ الإخراج الآلية ======================== #
+
+# عدد السجلات في كل مجموعة صفوف Parquet
+PARQUET_ROW_GROUP_SIZE = 50000
+
+# أنواع أعمدة Parquet غير النصية
+PARQUET_FIELD_TYPES = {
+    'start_time': pa.timestamp('us'),
+    'end_time': pa.timestamp('us'),
+    'duration': pa.duration('s')
+} if pa is not None else {}
+
+
+def _elapsed_text(value):
+    """مدة timedelta بصيغة [h]:mm:ss (بدلًا من "1 day, 6:05:00")"""
+    seconds = round(value.total_seconds())
+    sign = '-' if seconds < 0 else ''
+    hours, remainder = divmod(abs(seconds), 3600)
+    return f"{sign}{hours}:{remainder // 60:02d}:{remainder % 60:02d}"
+
+
+def _text_value(value):
+    """القيمة كنص (الأوقات بصيغة ISO والمدد بصيغة [h]:mm:ss)"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, timedelta):
+        return _elapsed_text(value)
+    return value if isinstance(value, str) else str(value)
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, timedelta):
+        return _elapsed_text(value)
+    return value
+
+
+class RecordFileWriter(ABC):
+    """
+    أساس كتّاب السجلات الآلية (بدون تنسيق Excel)
+
+    نفس واجهة SummaryReportWriter: append / extend / close / discard و count،
+    لذلك يمكن استخدامها في نفس مسار التدفق.
+    """
+
+    extension = None
+    mimetype = 'application/octet-stream'
+
+    def __init__(self, output_path, mode="engine_idle"):
+        self.output_path = output_path
+        self.mode = mode
+        self.count = 0
+        self._file = None
+
+    def _open_text(self, newline=None, encoding='utf-8'):
+        self._file = open(self.output_path, 'w', encoding=encoding, newline=newline)
+        return self._file
+
+    @abstractmethod
+    def append(self, record):
+        """كتابة سجل واحد (قاموس بحقول RECORD_FIELDS)"""
+
+    def extend(self, records):
+        """كتابة مجموعة سجلات (قائمة أو مكرر أو RecordBatch)"""
+        if isinstance(records, RecordBatch):
+            records = records.iter_dicts()
+        for record in records:
+            self.append(record)
+
+    def _finish(self):
+        pass
+
+    def close(self):
+        """
+        إنهاء الملف
+
+        Returns:
+            str: مسار الملف المحفوظ
+        """
+        if not self.count:
+            self.discard()
+            raise ValueError("No data to create report")
+
+        self._finish()
+        if self._file is not None:
+            self._file.close()
+
+        logger.info(f"{self.extension.upper()} export created: {self.output_path} ({self.count} records)")
+        return self.output_path
+
+    def discard(self):
+        """إلغاء الملف دون حفظ"""
+        if self._file is not None:
+            self._file.close()
+        try:
+            os.remove(self.output_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+        return False
+
+
+class CsvRecordWriter(RecordFileWriter):
+    """CSV بترميز UTF-8 مع BOM (ليفتح النص العربي بشكل صحيح في Excel)"""
+
+    extension = 'csv'
+    mimetype = 'text/csv'
+
+    def __init__(self, output_path, mode="engine_idle"):
+        super().__init__(output_path, mode)
+        self._writer = csv.writer(self._open_text(newline='', encoding='utf-8-sig'))
+        self._writer.writerow(RECORD_FIELDS)
+
+    def append(self, record):
+        self._writer.writerow([_text_value(record.get(field)) for field in RECORD_FIELDS])
+        self.count += 1
+
+
+class JsonLinesRecordWriter(RecordFileWriter):
+    """JSON Lines: سجل JSON واحد في كل سطر"""
+
+    extension = 'jsonl'
+    mimetype = 'application/x-ndjson'
+
+    def __init__(self, output_path, mode="engine_idle"):
+        super().__init__(output_path, mode)
+        self._open_text()
+
+    def append(self, record):
+        row = {field: _json_value(record.get(field)) for field in RECORD_FIELDS}
+        self._file.write(json.dumps(row, ensure_ascii=False, default=str))
+        self._file.write('\n')
+        self.count += 1
+
+
+class GeoJsonRecordWriter(RecordFileWriter):
+    """
+    GeoJSON FeatureCollection من نقاط التوقف
+
+    الخصائص هي حقول السجل، والسجلات بدون إحداثيات صالحة تُكتب
+    بـ geometry = null (مسموح في GeoJSON).
+    """
+
+    extension = 'geojson'
+    mimetype = 'application/geo+json'
+
+    def __init__(self, output_path, mode="engine_idle"):
+        super().__init__(output_path, mode)
+        self._open_text().write('{"type": "FeatureCollection", "features": [\n')
+
+    def append(self, record):
+        lat, lon = parse_coordinate(record.get('coordinates'))
+        geometry = None
+        if not (math.isnan(lat) or math.isnan(lon)):
+            geometry = {'type': 'Point', 'coordinates': [lon, lat]}
+
+        feature = {
+            'type': 'Feature',
+            'geometry': geometry,
+            'properties': {field: _json_value(record.get(field)) for field in RECORD_FIELDS}
+        }
+
+        if self.count:
+            self._file.write(',\n')
+        self._file.write(json.dumps(feature, ensure_ascii=False, default=str))
+        self.count += 1
+
+    def _finish(self):
+        self._file.write('\n]}\n')
+
+
+class ParquetRecordWriter(RecordFileWriter):
+    """
+    Parquet عبر pyarrow بأعمدة مُنمَّطة
+
+    start_time / end_time من نوع timestamp، والأوقات النصية تُحلَّل بـ sort_time
+    (غير المفهومة تُكتب null)، و duration من نوع duration بالثواني (المدة غير
+    المفهومة null لا صفر)، وباقي الحقول نصية. السجلات تُجمَّع في مجموعات صفوف
+    من PARQUET_ROW_GROUP_SIZE سجل.
+    """
+
+    extension = 'parquet'
+    mimetype = 'application/vnd.apache.parquet'
+
+    def __init__(self, output_path, mode="engine_idle"):
+        if pa is None:
+            raise ImportError("pyarrow is required for Parquet output")
+        # استيراد متأخر: data_extractor يستورد هذه الوحدة
+        from utils.data_extractor import parse_duration
+
+        super().__init__(output_path, mode)
+        self._parse_duration = parse_duration
+        self._schema = pa.schema([
+            (field, PARQUET_FIELD_TYPES.get(field, pa.string())) for field in RECORD_FIELDS
+        ])
+        self._parquet = pq.ParquetWriter(output_path, self._schema, compression='snappy')
+        self._pending = {field: [] for field in RECORD_FIELDS}
+
+    def append(self, record):
+        for field in RECORD_FIELDS:
+            value = record.get(field)
+            if field in ('start_time', 'end_time'):
+                value = sort_time(value)
+            elif field == 'duration':
+                value = self._parse_duration(value)
+            else:
+                value = _text_value(value)
+            self._pending[field].append(value)
+        self.count += 1
+
+        if len(self._pending['car_code']) >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._pending['car_code']:
+            self._parquet.write_table(pa.Table.from_pydict(self._pending, schema=self._schema))
+            self._pending = {field: [] for field in RECORD_FIELDS}
+
+    def _finish(self):
+        self._flush()
+        self._parquet.close()
+
+    def discard(self):
+        self._parquet.close()
+        super().discard()
+
+
+RECORD_WRITERS = {
+    'csv': CsvRecordWriter,
+    'parquet': ParquetRecordWriter,
+    'jsonl': JsonLinesRecordWriter,
+    'geojson': GeoJsonRecordWriter
+}
+
+
+def available_formats():
+    """صيغ الإخراج الآلية المتاحة في هذه البيئة"""
+    return [name for name in RECORD_WRITERS if name != 'parquet' or pa is not None]
@@ -0,0 +1,328 @@
+import heapq
+import pickle
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+import logging
+import numpy as np
+from utils.record_batch import RecordBatch, _category_key
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== ترتيب السجلات زمنيًا ======================== #
+
+# source: ترتيب الملفات ثم الأوراق (الافتراضي)
+# time: ترتيب زمني حسب وقت البداية عبر كل الملفات والأوراق
+# car,time: حسب كود السيارة ثم وقت البداية
+RECORD_ORDERS = ('source', 'time', 'car,time')
+
+# عدد السجلات التي تُحوَّل إلى قواميس في كل مرة من كل ورقة أثناء الدمج،
+# وحجم أجزاء السلاسل المرتبة على القرص (SpilledRecordMerge)
+MERGE_CHUNK_SIZE = 10000
+
+# صيغ الأوقات النصية في ملفات التتبع (بعد ISO)
+TEXT_TIME_FORMATS = (
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M',
+    '%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M'
+)
+
+_LAST = np.iinfo(np.int64).max
+_NO_TIME = datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=65536)
+def _parse_text_time(text):
+    text = text.strip()
+    try:
+        value = datetime.fromisoformat(text)
+    except ValueError:
+        value = None
+        for time_format in TEXT_TIME_FORMATS:
+            try:
+                value = datetime.strptime(text, time_format)
+                break
+            except ValueError:
+                continue
+    if value is None or value.tzinfo is not None:
+        return None
+    return value
+
+
+def sort_time(value):
+    """وقت الترتيب: datetime كما هو، والنص يُحلَّل (None عند التعذر)"""
+    if isinstance(value, datetime):
+        return value if value.tzinfo is None else None
+    if isinstance(value, str):
+        return _parse_text_time(value)
+    return None
+
+
+def _time_key(value):
+    """الأوقات غير الصالحة (نصوص غير مفهومة، فارغة) تأتي بعد كل الأوقات"""
+    value = sort_time(value)
+    if value is None:
+        return 1, _NO_TIME
+    return 0, value
+
+
+def record_sort_key(order):
+    """
+    دالة مفتاح الترتيب لقاموس السجل
+
+    Args:
+        order: 'time' أو 'car,time'
+    """
+    if order == 'time':
+        return lambda record: _time_key(record.get('start_time'))
+    if order == 'car,time':
+        return lambda record: (str(record.get('car_code') or ''), _time_key(record.get('start_time')))
+    raise ValueError(f"Unknown record order: {order}")
+
+
+def merge_record_streams(streams, order):
+    """
+    دمج k-way لعدة مكررات سجلات مرتبة مسبقًا (ورقة لكل مكرر)
+
+    الدمج عبر heap لا يحتفظ إلا بالسجل الحالي من كل مكرر، والسجلات
+    المتساوية في المفتاح تبقى بترتيب المكررات (ملف ثم ورقة).
+
+    Yields:
+        dict: السجلات بالترتيب المطلوب
+    """
+    return heapq.merge(*streams, key=record_sort_key(order))
+
+
+def _sheet_order(batch, order):
+    """
+    ترتيب صفوف الدفعة (مستقر) - ورقة مرتبة غالبًا فلا تُعاد كتابتها
+
+    الفرز المستقر لدفعة ملف كاملة (أوراقها متتالية) يعطي نفس نتيجة دمج
+    أوراقها k-way: السجلات المتساوية تبقى بترتيب الأوراق.
+    """
+    times = batch.times['start_time'].copy()
+    for row, value in batch.time_overrides['start_time'].items():
+        value = sort_time(value)
+        if value is not None:
+            times[row] = np.datetime64(value, 'us')
+    times = times.view(np.int64)
+    times[times == np.iinfo(np.int64).min] = _LAST
+
+    if order == 'time':
+        return np.argsort(times, kind='stable')
+
+    # رتبة كل كود سيارة حسب النص (نفس مقارنة record_sort_key)
+    categories = batch.categories['car_code']
+    names = [str(value or '') for value in categories]
+    ranks = np.empty(len(names), dtype=np.int64)
+    ranks[sorted(range(len(names)), key=names.__getitem__)] = np.arange(len(names))
+    return np.lexsort((times, ranks[batch.codes['car_code']]))
+
+
+def _iter_sheet(batch, rows):
+    for start in range(0, len(rows), MERGE_CHUNK_SIZE):
+        yield from batch.take(rows[start:start + MERGE_CHUNK_SIZE]).iter_dicts()
+
+
+def iter_sheet_streams(batch, order):
+    """
+    مكرر مرتب لكل ورقة في RecordBatch (الأوراق متتالية داخل دفعة الملف)
+
+    كل ورقة مرتبة زمنيًا في الغالب، لذلك لا يوجد فرز إلا إذا وُجدت
+    صفوف خارج الترتيب داخل الورقة نفسها، ولا يتجاوز أي فرز حجم الورقة.
+    """
+    sheet_codes = batch.codes['source_sheet']
+    boundaries = np.flatnonzero(np.diff(sheet_codes)) + 1
+    for rows in np.split(np.arange(len(batch)), boundaries):
+        if not len(rows):
+            continue
+        sheet_rows = rows[_sheet_order(batch.take(rows), order)]
+        if not np.array_equal(sheet_rows, rows):
+            logger.info(f"Sheet '{batch.categories['source_sheet'][sheet_codes[rows[0]]]}' re-sorted before merge")
+        yield _iter_sheet(batch, sheet_rows)
+
+
+def merge_batches(batches, order):
+    """
+    دمج سجلات عدة دفعات (ملف لكل دفعة) بالترتيب المطلوب
+
+    Args:
+        batches: RecordBatch لكل ملف بترتيب الرفع
+        order: 'source' أو 'time' أو 'car,time'
+
+    Returns:
+        مكرر سجلات (أو RecordBatch واحد عند ترتيب source)
+    """
+    if order == 'source':
+        return RecordBatch.concat(batches)
+    streams = [stream for batch in batches if batch for stream in iter_sheet_streams(batch, order)]
+    logger.info(f"Merging {len(streams)} sheet streams by {order}")
+    return merge_record_streams(streams, order)
+
+
+class SpilledRecordMerge:
+    """
+    دمج k-way لدفعات الملفات عبر سلاسل مرتبة على القرص
+
+    كل دفعة ملف تُرتَّب (فرز مستقر واحد) وتُكتب فور وصولها كسلسلة مرتبة
+    بأجزاء من MERGE_CHUNK_SIZE سجل في ملف مؤقت واحد، ثم تُحرَّر من الذاكرة.
+    الدمج يقرأ جزءًا واحدًا من كل سلسلة في كل مرة، لذلك الذاكرة تتناسب مع
+    عدد الملفات × MERGE_CHUNK_SIZE لا مع حجم الرفع كله. النتيجة مطابقة لـ
+    merge_batches (السجلات المتساوية بترتيب الملفات ثم الأوراق).
+    """
+
+    def __init__(self, order, spill_dir=None):
+        """
+        Args:
+            order: 'time' أو 'car,time'
+            spill_dir: مجلد الملف المؤقت (مجلد المهمة، افتراضيًا مجلد النظام المؤقت)
+        """
+        if order not in RECORD_ORDERS or order == 'source':
+            raise ValueError(f"Unknown record order: {order}")
+        self.order = order
+        self._file = tempfile.TemporaryFile(prefix='merge_', suffix='.runs', dir=spill_dir)
+        self._runs = []
+
+    def add(self, batch):
+        """كتابة دفعة ملف كسلسلة مرتبة على القرص"""
+        if not len(batch):
+            return
+        rows = _sheet_order(batch, self.order)
+        offsets = []
+        for start in range(0, len(rows), MERGE_CHUNK_SIZE):
+            offsets.append(self._file.tell())
+            chunk = batch.take(rows[start:start + MERGE_CHUNK_SIZE]).compact()
+            pickle.dump(chunk, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._runs.append(offsets)
+
+    def _iter_run(self, offsets):
+        # السلاسل تتشارك الملف: كل جزء يُقرأ كاملًا بعد الانتقال إلى موضعه
+        for offset in offsets:
+            self._file.seek(offset)
+            yield from pickle.load(self._file).iter_dicts()
+
+    def merged(self):
+        """
+        Yields:
+            dict: سجلات كل الدفعات المضافة بالترتيب المطلوب
+        """
+        self._file.flush()
+        logger.info(f"Merging {len(self._runs)} spilled runs by {self.order}")
+        return merge_record_streams([self._iter_run(offsets) for offsets in self._runs], self.order)
+
+    def close(self):
+        """حذف الملف المؤقت"""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# ======================== إزالة التوقفات المكررة ======================== #
+
+# مفتاح التوقف المكرر (نفس التوقف في ملفات بفترات متداخلة)
+DEDUP_FIELDS = ('car_code', 'start_time', 'end_time', 'coordinates')
+
+_MIX_1 = np.uint64(0xbf58476d1ce4e5b9)
+_MIX_2 = np.uint64(0x94d049bb133111eb)
+
+
+def _mix(values):
+    """خلط splitmix64 لمصفوفة uint64"""
+    values = (values ^ (values >> np.uint64(30))) * _MIX_1
+    values = (values ^ (values >> np.uint64(27))) * _MIX_2
+    return values ^ (values >> np.uint64(31))
+
+
+def _object_hashes(values):
+    return np.array([hash(_category_key(value)) for value in values], dtype=np.int64).view(np.uint64)
+
+
+def _time_hashes(batch, field):
+    # الأوقات النصية القابلة للتحليل تُطابق نفس الوقت المخزن كـ datetime
+    times = batch.times[field].copy()
+    overrides = {}
+    for row, value in batch.time_overrides[field].items():
+        parsed = sort_time(value)
+        if parsed is None:
+            overrides[row] = value
+        else:
+            times[row] = np.datetime64(parsed, 'us')
+
+    hashes = times.view(np.int64).view(np.uint64).copy()
+    if overrides:
+        rows = np.fromiter(overrides, dtype=np.int64, count=len(overrides))
+        hashes[rows] = _mix(_object_hashes(overrides.values()))
+    return hashes
+
+
+def _missing_times(batch, field):
+    """الصفوف بدون وقت في الحقل (NaT بدون نص، أو نص فارغ)"""
+    missing = batch.times[field].view(np.int64) == np.iinfo(np.int64).min
+    for row, value in batch.time_overrides[field].items():
+        if not (isinstance(value, str) and not value.strip()):
+            missing[row] = False
+    return missing
+
+
+def record_keys(batch):
+    """
+    مفتاح 64 بت لكل سجل من (car_code, start_time, end_time, coordinates)
+
+    القيم المُرمَّزة تُجزَّأ مرة واحدة لكل قيمة مختلفة ثم توزع بالرموز.
+    """
+    keys = np.zeros(len(batch), dtype=np.uint64)
+    for field in DEDUP_FIELDS:
+        if field in batch.codes:
+            column = _object_hashes(batch.categories[field])[batch.codes[field]]
+        else:
+            column = _time_hashes(batch, field)
+        keys = _mix(keys ^ column)
+    return keys
+
+
+class RecordDeduplicator:
+    """
+    حذف التوقفات المكررة عبر دفعات الملفات في مرور واحد
+
+    المفاتيح المرئية تُحفظ كمصفوفة uint64 مرتبة (8 بايت لكل توقف)،
+    وأول ظهور للتوقف (بترتيب الرفع) هو الذي يبقى. السجلات بدون وقت بداية
+    أو نهاية تبقى دائمًا: مفاتيحها متساوية لتوقفات مختلفة (صفوف المدة فقط).
+    """
+
+    def __init__(self):
+        self._seen = np.empty(0, dtype=np.uint64)
+        self.dropped = 0
+
+    def filter(self, batch):
+        """
+        Returns:
+            RecordBatch: الدفعة بدون السجلات المكررة (نفس الدفعة إن لم يوجد تكرار)
+        """
+        if not len(batch):
+            return batch
+
+        rows = np.flatnonzero(~(_missing_times(batch, 'start_time') | _missing_times(batch, 'end_time')))
+        keep = np.ones(len(batch), dtype=bool)
+        if len(rows):
+            keys = record_keys(batch)[rows]
+            unique_keys, first_rows = np.unique(keys, return_index=True)
+            timed_keep = np.zeros(len(rows), dtype=bool)
+            timed_keep[first_rows] = True
+
+            if len(self._seen):
+                positions = np.minimum(np.searchsorted(self._seen, keys), len(self._seen) - 1)
+                timed_keep &= self._seen[positions] != keys
+
+            self._seen = np.union1d(self._seen, unique_keys)
+            keep[rows] = timed_keep
+
+        dropped = len(batch) - int(keep.sum())
+        if not dropped:
+            return batch
+        self.dropped += dropped
+        return batch.take(np.flatnonzero(keep))
@@ -0,0 +1,235 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+import logging
+from utils.record_batch import RecordBatch
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== ذاكرة نتائج الاستخراج ======================== #
+
+# يتغير عند تغيير منطق الاستخراج أو صيغة التخزين لإبطال النتائج القديمة
+RESULT_CACHE_VERSION = 1
+
+# الحجم الافتراضي الأقصى للذاكرة على القرص
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# عدد السجلات في كل جزء يُلحق بالنتيجة أثناء الاستخراج (ResultCacheEntry)
+CACHE_CHUNK_ROWS = 200000
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(file_path):
+    """
+    حساب SHA-256 لمحتوى ملف بقراءة متدرجة
+
+    Returns:
+        str: البصمة hex
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(content_digest, mode, zones, header_layouts=None):
+    """
+    مفتاح النتيجة: (محتوى الملف، وضع الاستخراج، إصدار النطاقات، التخطيطات اليدوية)
+
+    Args:
+        content_digest: SHA-256 لمحتوى الملف المرفوع
+        mode: وضع الاستخراج
+        zones: المصنّف المُجمَّع للعملية (ZoneClassifier أو GeofenceIndex)
+        header_layouts: تخطيطات الهيدر اليدوية للمستخدم
+
+    Returns:
+        str: المفتاح
+    """
+    layouts = json.dumps(sorted((header_layouts or {}).items()), default=str)
+    parts = (str(RESULT_CACHE_VERSION), content_digest, mode, zones.version, layouts)
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class ResultCacheEntry:
+    """
+    كتابة نتيجة في الذاكرة جزءًا بجزء أثناء الاستخراج
+
+    كل جزء (RecordBatch) يُلحق بملف مؤقت فور اكتماله ولا يُحتفظ به، والنتيجة
+    تظهر في الذاكرة عند commit فقط (استبدال ذري)، و discard يحذف الملف المؤقت.
+    """
+
+    def __init__(self, cache, key):
+        self._cache = cache
+        self._path = cache._path(key)
+        self._key = key
+        self._tmp_path = f"{self._path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+
+    def append(self, batch):
+        """إلحاق جزء من النتيجة (الأجزاء تُقرأ بترتيب إلحاقها)"""
+        if self._file is None:
+            return
+        try:
+            pickle.dump(batch, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Could not cache extraction result {self._key}: {e}")
+            self.discard()
+
+    def commit(self):
+        """حفظ النتيجة ثم إخلاء الأقدم إذا تجاوز الحجم الحد الأقصى"""
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+            self._file = None
+            os.replace(self._tmp_path, self._path)
+        except Exception as e:
+            logger.warning(f"Could not cache extraction result {self._key}: {e}")
+            self.discard()
+            return
+        self._cache._evict()
+
+    def discard(self):
+        """إلغاء النتيجة دون حفظ"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._cache._remove(self._tmp_path)
+
+
+class ResultCache:
+    """
+    ذاكرة RecordBatch على القرص بحجم محدود وإخلاء الأقل استخدامًا (LRU)
+
+    كل نتيجة ملف مستقل (أجزاء RecordBatch متتالية في ملف واحد)، ووقت التعديل
+    يُحدَّث عند كل إصابة ليُستخدم كترتيب الاستخدام عند الإخلاء.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """
+        قراءة نتيجة محفوظة
+
+        Returns:
+            RecordBatch أو None عند عدم الوجود
+        """
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            parts = []
+            with open(path, 'rb') as f:
+                while True:
+                    try:
+                        parts.append(pickle.load(f))
+                    except EOFError:
+                        break
+            batch = RecordBatch.concat(parts) if len(parts) > 1 else parts[0]
+            os.utime(path)
+        except FileNotFoundError:
+            batch = None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {e}")
+            self._remove(path)
+            batch = None
+
+        with self._lock:
+            if batch is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return batch
+
+    def open_entry(self, key):
+        """
+        بدء كتابة نتيجة جزءًا بجزء (انظر ResultCacheEntry)
+
+        Returns:
+            ResultCacheEntry أو None إذا كانت الذاكرة معطلة أو تعذر إنشاء الملف
+        """
+        if not self.enabled:
+            return None
+        try:
+            return ResultCacheEntry(self, key)
+        except OSError as e:
+            logger.warning(f"Could not cache extraction result {key}: {e}")
+            return None
+
+    def put(self, key, batch):
+        """حفظ نتيجة كاملة ثم إخلاء الأقدم إذا تجاوز الحجم الحد الأقصى"""
+        entry = self.open_entry(key)
+        if entry is not None:
+            entry.append(batch)
+            entry.commit()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pkl'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(os.path.join(self.cache_dir, name))
+                total -= size
+                self.evictions += 1
+                logger.info(f"Evicted cached result: {name}")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        """حذف جميع النتائج المحفوظة"""
+        with self._lock:
+            for _, _, name in self._entries():
+                self._remove(os.path.join(self.cache_dir, name))
+
+    def stats(self):
+        """عدادات الإصابة والإخفاق وحجم الذاكرة الحالي"""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'size_bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes
+        }
@@ -0,0 +1,741 @@
+import os
+import re
+import codecs
+import posixpath
+import zipfile
+import logging
+import openpyxl
+import xlrd
+from lxml import etree
+from openpyxl.styles.numbers import is_date_format, builtin_format_code
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import from_excel, from_ISO8601, WINDOWS_EPOCH, CALENDAR_MAC_1904
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== قارئات أوراق Excel ======================== #
+
+# القارئ الافتراضي (يمكن تغييره عبر متغير البيئة SHEET_READER)
+DEFAULT_READER = os.environ.get('SHEET_READER', 'lxml')
+
+SHEET_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+_ROW_TAG = f'{{{SHEET_MAIN_NS}}}row'
+_CELL_TAG = f'{{{SHEET_MAIN_NS}}}c'
+_VALUE_TAG = f'{{{SHEET_MAIN_NS}}}v'
+_INLINE_TAG = f'{{{SHEET_MAIN_NS}}}is'
+_TEXT_TAG = f'{{{SHEET_MAIN_NS}}}t'
+_RUN_TAG = f'{{{SHEET_MAIN_NS}}}r'
+_SI_TAG = f'{{{SHEET_MAIN_NS}}}si'
+_DIMENSION_TAG = f'{{{SHEET_MAIN_NS}}}dimension'
+_SHEET_DATA_TAG = f'{{{SHEET_MAIN_NS}}}sheetData'
+
+
+class OpenpyxlSheetReader:
+    """القارئ الأصلي: openpyxl بوضع القراءة فقط"""
+
+    name = 'openpyxl'
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.wb = openpyxl.load_workbook(file_path, data_only=True, read_only=True)
+
+    @property
+    def sheet_names(self):
+        return [ws.title for ws in self.wb.worksheets]
+
+    def iter_rows(self, sheet_index):
+        """قيم صفوف ورقة كـ tuples (نفس iter_rows(values_only=True))"""
+        ws = self.wb.worksheets[sheet_index]
+        # بعض المولّدات تكتب أبعادًا خاطئة للورقة مما يقتطع الصفوف في وضع القراءة فقط
+        ws.reset_dimensions()
+        return ws.iter_rows(values_only=True)
+
+    def sheet_dimension(self, sheet_index):
+        """مرجع أبعاد الورقة المكتوب في ملفها (None إذا لم يُكتب)"""
+        try:
+            return self.wb.worksheets[sheet_index].calculate_dimension()
+        except ValueError:
+            return None
+
+    def close(self):
+        self.wb.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def _text_content(node):
+    """نص عقدة si / is بدون التنسيق (مثل openpyxl Text.content)"""
+    snippets = []
+    for child in node:
+        if child.tag == _TEXT_TAG:
+            snippets.append(child.text or '')
+        elif child.tag == _RUN_TAG:
+            text = child.find(_TEXT_TAG)
+            if text is not None and text.text is not None:
+                snippets.append(text.text)
+    return ''.join(snippets)
+
+
+def _cast_number(value):
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+class LxmlSheetReader:
+    """
+    قارئ XLSX مباشر: يقرأ xl/worksheets/sheetN.xml بـ lxml iterparse
+
+    لا يُنشئ أي كائن خلية؛ كل صف يُعاد كـ tuple من القيم بنفس تحويلات
+    openpyxl في وضع القراءة فقط (النصوص المشتركة، التواريخ حسب تنسيق
+    الرقم، القيم المنطقية، نتائج المعادلات المحفوظة).
+    """
+
+    name = 'lxml'
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.archive = zipfile.ZipFile(file_path)
+        try:
+            self._read_workbook()
+            self._read_styles()
+            self._shared_strings = None
+            self._column_index = {}
+        except Exception:
+            self.archive.close()
+            raise
+
+    # ---------- بيانات المصنف ---------- #
+
+    def _part_rels(self, part):
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, '_rels', f'{name}.rels')
+        if rels_path not in self.archive.namelist():
+            return {}
+
+        rels = {}
+        root = etree.fromstring(self.archive.read(rels_path))
+        for rel in root.iter(f'{{{PKG_REL_NS}}}Relationship'):
+            target = rel.get('Target')
+            if target.startswith('/'):
+                target = target.lstrip('/')
+            else:
+                target = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get('Id')] = (rel.get('Type', ''), target)
+        return rels
+
+    def _read_workbook(self):
+        workbook_part = 'xl/workbook.xml'
+        for rel_type, target in self._part_rels('').values():
+            if rel_type.endswith('/officeDocument'):
+                workbook_part = target
+
+        root = etree.fromstring(self.archive.read(workbook_part))
+        properties = root.find(f'{{{SHEET_MAIN_NS}}}workbookPr')
+        date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+        self.epoch = CALENDAR_MAC_1904 if date1904 else WINDOWS_EPOCH
+
+        rels = self._part_rels(workbook_part)
+        self._sheets = []
+        self._strings_part = None
+        self._styles_part = None
+
+        for rel_type, target in rels.values():
+            if rel_type.endswith('/sharedStrings'):
+                self._strings_part = target
+            elif rel_type.endswith('/styles'):
+                self._styles_part = target
+
+        for sheet in root.iter(f'{{{SHEET_MAIN_NS}}}sheet'):
+            rel_type, target = rels.get(sheet.get(f'{{{REL_NS}}}id'), ('', None))
+            # أوراق الرسوم البيانية ليست ضمن wb.worksheets
+            if target and rel_type.endswith('/worksheet'):
+                self._sheets.append((sheet.get('name'), target))
+
+    def _read_styles(self):
+        # أرقام أنماط الخلايا ذات تنسيق التاريخ (كنصوص كما تظهر في السمة s)
+        self._date_style_ids = set()
+        if not self._styles_part or self._styles_part not in self.archive.namelist():
+            return
+
+        root = etree.fromstring(self.archive.read(self._styles_part))
+        custom = {
+            int(fmt.get('numFmtId')): fmt.get('formatCode')
+            for fmt in root.iter(f'{{{SHEET_MAIN_NS}}}numFmt')
+        }
+
+        cell_xfs = root.find(f'{{{SHEET_MAIN_NS}}}cellXfs')
+        if cell_xfs is None:
+            return
+
+        for idx, xf in enumerate(cell_xfs.iter(f'{{{SHEET_MAIN_NS}}}xf')):
+            fmt_id = int(xf.get('numFmtId', 0))
+            fmt = custom[fmt_id] if fmt_id in custom else builtin_format_code(fmt_id)
+            if is_date_format(fmt):
+                self._date_style_ids.add(str(idx))
+
+    def _read_shared_strings(self, limit=None):
+        strings = []
+        if limit == 0 or not self._strings_part or self._strings_part not in self.archive.namelist():
+            return strings
+        with self.archive.open(self._strings_part) as src:
+            for _, node in etree.iterparse(src, tag=_SI_TAG):
+                strings.append(_text_content(node).replace('x005F_', ''))
+                node.clear()
+                if len(strings) == limit:
+                    break
+        return strings
+
+    @property
+    def shared_strings(self):
+        """جدول النصوص المشتركة (يُقرأ عند أول حاجة)"""
+        if self._shared_strings is None:
+            self._shared_strings = self._read_shared_strings()
+        return self._shared_strings
+
+    @property
+    def sheet_names(self):
+        return [name for name, _ in self._sheets]
+
+    # ---------- قراءة الصفوف ---------- #
+
+    def iter_rows(self, sheet_index):
+        """
+        قيم صفوف ورقة كـ tuples بنفس شكل openpyxl في وضع القراءة فقط
+
+        الصف يمتد من العمود الأول حتى آخر خلية فيه، والصفوف المفقودة
+        تُعاد كـ tuple فارغ.
+        """
+        _, part = self._sheets[sheet_index]
+        shared_strings = self.shared_strings
+        parsed_row = 0
+        next_row = 1
+
+        with self.archive.open(part) as src:
+            for _, row in etree.iterparse(src, tag=_ROW_TAG):
+                row_number = row.get('r')
+                parsed_row = int(float(row_number)) if row_number else parsed_row + 1
+
+                # الصفوف المفقودة
+                while next_row < parsed_row:
+                    next_row += 1
+                    yield ()
+
+                if next_row == parsed_row:
+                    next_row += 1
+                    yield self._row_values(row, shared_strings)
+
+                # تحرير الذاكرة
+                row.clear()
+                while row.getprevious() is not None:
+                    del row.getparent()[0]
+
+    def sheet_dimension(self, sheet_index):
+        """مرجع <dimension ref> من بداية XML الورقة (قبل sheetData) دون قراءة الصفوف"""
+        _, part = self._sheets[sheet_index]
+        with self.archive.open(part) as src:
+            for _, node in etree.iterparse(src, events=('start',), tag=(_DIMENSION_TAG, _SHEET_DATA_TAG)):
+                return node.get('ref') if node.tag == _DIMENSION_TAG else None
+        return None
+
+    def head_rows(self, sheet_index, count):
+        """
+        أول count صف (نفس قيم iter_rows) دون تحميل جدول النصوص المشتركة كاملًا
+
+        تُقرأ النصوص المشتركة حتى أكبر فهرس مستخدم في هذه الصفوف فقط.
+        """
+        _, part = self._sheets[sheet_index]
+        rows = {}
+        parsed_row = 0
+
+        with self.archive.open(part) as src:
+            for _, row in etree.iterparse(src, tag=_ROW_TAG):
+                row_number = row.get('r')
+                parsed_row = int(float(row_number)) if row_number else parsed_row + 1
+                if parsed_row > count:
+                    break
+                rows.setdefault(parsed_row, row)
+
+        if not rows:
+            return []
+
+        shared_strings = self._shared_strings
+        if shared_strings is None:
+            indices = [
+                int(cell.findtext(_VALUE_TAG))
+                for row in rows.values() for cell in row.iterchildren(_CELL_TAG)
+                if cell.get('t') == 's' and cell.findtext(_VALUE_TAG)
+            ]
+            shared_strings = self._read_shared_strings(max(indices) + 1 if indices else 0)
+
+        return [
+            self._row_values(rows[row_number], shared_strings) if row_number in rows else ()
+            for row_number in range(1, max(rows) + 1)
+        ]
+
+    def _row_values(self, row, shared_strings):
+        values = []
+        col_counter = 0
+        columns = self._column_index
+        date_styles = self._date_style_ids
+
+        for cell in row.iterchildren(_CELL_TAG):
+            coordinate = cell.get('r')
+            if coordinate:
+                letters = coordinate.rstrip('0123456789')
+                col_counter = columns.get(letters) or columns.setdefault(letters, column_index_from_string(letters))
+            else:
+                col_counter += 1
+
+            if col_counter > len(values):
+                values.extend([None] * (col_counter - len(values)))
+
+            data_type = cell.get('t')
+
+            if data_type == 'inlineStr':
+                child = cell.find(_INLINE_TAG)
+                values[col_counter - 1] = _text_content(child) if child is not None else None
+                continue
+
+            value = cell.findtext(_VALUE_TAG)
+            if not value:
+                continue
+
+            if data_type is None or data_type == 'n':
+                value = _cast_number(value)
+                if cell.get('s') in date_styles:
+                    try:
+                        value = from_excel(value, self.epoch)
+                    except (OverflowError, ValueError):
+                        value = '#VALUE!'
+            elif data_type == 's':
+                value = shared_strings[int(value)]
+            elif data_type == 'b':
+                value = bool(int(value))
+            elif data_type == 'd':
+                value = from_ISO8601(value)
+            # 'str' (نتيجة معادلة نصية) و 'e' (خطأ) تبقى كما هي
+
+            values[col_counter - 1] = value
+
+        # عرض الصف يحدده آخر خلية فيه
+        del values[col_counter:]
+        return tuple(values)
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def xls_cell_value(cell_type, value, datemode):
+    """
+    قيمة خلية XLS بنوعها الأصلي (رقم / تاريخ / وقت / منطقي / نص)
+
+    الأعداد الصحيحة تُعاد كـ int (كما كان pandas يقرؤها)، والتواريخ
+    الأقل من يوم واحد تُعاد كوقت (مدة التوقف مثلًا).
+    """
+    if cell_type == xlrd.XL_CELL_TEXT:
+        return value
+    if cell_type == xlrd.XL_CELL_NUMBER:
+        return int(value) if value.is_integer() else value
+    if cell_type == xlrd.XL_CELL_DATE:
+        try:
+            converted = xlrd.xldate_as_datetime(value, datemode)
+        except (xlrd.xldate.XLDateError, OverflowError, ValueError):
+            return value
+        return converted.time() if 0 <= value < 1 else converted
+    if cell_type == xlrd.XL_CELL_BOOLEAN:
+        return bool(value)
+    # فارغة / أخطاء
+    return None
+
+
+def _trimmed_row(values):
+    """الصف حتى آخر قيمة غير فارغة (نفس عرض الصف في ملف XLSX محوَّل)"""
+    end = len(values)
+    while end and values[end - 1] is None:
+        end -= 1
+    return tuple(values[:end])
+
+
+class XlsSheetReader:
+    """
+    قارئ XLS (BIFF) مباشر عبر xlrd بدون تحويل إلى XLSX
+
+    المصنف يُفتح بـ on_demand=True فتُحمَّل كل ورقة عند قراءتها فقط
+    وتُحرَّر بعدها، والقيم بنفس أنواعها في ملف XLSX المحوَّل.
+    """
+
+    name = 'xls'
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.book = xlrd.open_workbook(file_path, on_demand=True)
+
+    @property
+    def sheet_names(self):
+        return self.book.sheet_names()
+
+    def iter_rows(self, sheet_index):
+        sheet = self.book.sheet_by_index(sheet_index)
+        datemode = self.book.datemode
+        try:
+            for row_index in range(sheet.nrows):
+                yield _trimmed_row([
+                    xls_cell_value(cell_type, value, datemode)
+                    for cell_type, value in zip(sheet.row_types(row_index), sheet.row_values(row_index))
+                ])
+        finally:
+            self.book.unload_sheet(sheet_index)
+
+    def sheet_dimension(self, sheet_index):
+        """xlrd لا يوفّر أبعاد الورقة دون تحميلها (مثل جداول HTML)"""
+        return None
+
+    def close(self):
+        self.book.release_resources()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+_HTML_WHITESPACE = re.compile(r'\s+')
+_HTML_CHARSET = re.compile(rb'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+def _html_encoding(file_path):
+    """ترميز المستند من وسم meta charset في بدايته (افتراضيًا UTF-8)"""
+    with open(file_path, 'rb') as f:
+        match = _HTML_CHARSET.search(f.read(4096))
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode('ascii')).name
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return 'utf-8'
+
+
+class _Utf8Stream:
+    """قراءة الملف بترميزه مع تجاهل البايتات غير الصالحة وتمريره إلى lxml كـ UTF-8"""
+
+    def __init__(self, file_path, encoding):
+        self._text = open(file_path, 'r', encoding=encoding, errors='ignore', newline='')
+
+    def read(self, size=-1):
+        return self._text.read(size).encode('utf-8')
+
+    def close(self):
+        self._text.close()
+
+
+def _html_span(cell, attribute):
+    try:
+        return max(int(cell.get(attribute) or 1), 1)
+    except ValueError:
+        return 1
+
+
+class HtmlSheetReader:
+    """
+    تقارير iTrack بصيغة HTML بامتداد xls: كل جدول (غير متداخل) ورقة
+
+    الملف يُقرأ بـ lxml iterparse صفًا بصف دون بناء المستند كاملًا، وكل
+    صف <tr> يُحرَّر فور قراءته. نص الخلية بمسافات مختصرة (مثل pandas)،
+    و colspan / rowspan تترك خلايا فارغة كالخلايا المدمجة في Excel.
+
+    عدد الجداول لا يُحسب عند الفتح (يتطلب تحليل المستند كاملًا)، بل عند
+    أول طلب لـ sheet_names أو عند وصول القراءة إلى نهاية المستند.
+    """
+
+    name = 'html'
+    sheet_title = 'iTrack Report'
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._encoding = _html_encoding(file_path)
+        self._table_count = None
+        # مسار القراءة الحالي (الأوراق تُقرأ بالترتيب في مرور واحد)
+        self._stream = None
+        self._events = None
+        self._table_index = -1
+        self._depth = 0
+        self._spans = {}
+
+    def _iterparse(self, stream, tag):
+        return etree.iterparse(
+            stream, events=('start', 'end'), tag=tag, html=True, encoding='utf-8', recover=True, huge_tree=True
+        )
+
+    def _count_tables(self):
+        count = 0
+        depth = 0
+        stream = _Utf8Stream(self.file_path, self._encoding)
+        try:
+            for event, table in self._iterparse(stream, 'table'):
+                if event == 'start':
+                    count += depth == 0
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 0:
+                    table.clear()
+        except etree.XMLSyntaxError:
+            # مستند فارغ أو ليس HTML
+            pass
+        finally:
+            stream.close()
+        return count
+
+    @property
+    def sheet_names(self):
+        if self._table_count is None:
+            self._table_count = self._count_tables()
+        if not self._table_count:
+            raise ValueError("No <table> elements found in HTML content")
+        return [self.sheet_title] + [f"{self.sheet_title} ({idx})" for idx in range(2, self._table_count + 1)]
+
+    def _restart(self):
+        self.close()
+        self._stream = _Utf8Stream(self.file_path, self._encoding)
+        self._events = self._iterparse(self._stream, ('table', 'tr'))
+        self._table_index = -1
+        self._depth = 0
+
+    def iter_rows(self, sheet_index):
+        if sheet_index < 0 or (self._table_count is not None and sheet_index >= self._table_count):
+            raise IndexError(f"Sheet index out of range: {sheet_index}")
+        if self._events is None or sheet_index <= self._table_index:
+            self._restart()
+
+        # الحالة محفوظة في القارئ: ورقة لم تُقرأ حتى نهايتها تُتخطى بقية صفوفها
+        for event, element in self._events:
+            if element.tag == 'table':
+                if event == 'start':
+                    self._depth += 1
+                    if self._depth == 1:
+                        self._table_index += 1
+                        self._spans = {}
+                    continue
+                self._depth -= 1
+                if self._depth == 0:
+                    element.clear()
+                    if self._table_index == sheet_index:
+                        return
+                continue
+
+            # صفوف الجداول المتداخلة تبقى ضمن نص خلية الجدول الخارجي
+            if event != 'end' or self._depth != 1:
+                continue
+            if self._table_index == sheet_index:
+                yield self._row_values(element, self._spans)
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+        # نهاية المستند: عدد الجداول أصبح معروفًا
+        self._table_count = self._table_index + 1
+        self._events = None
+        if sheet_index >= self._table_count:
+            raise IndexError(f"Sheet index out of range: {sheet_index}")
+
+    @staticmethod
+    def _row_values(row, spans):
+        """قيم صف <tr> مع تخطي الأعمدة المحجوزة بـ rowspan من صفوف سابقة"""
+        values = []
+        for cell in row:
+            if cell.tag != 'td' and cell.tag != 'th':
+                continue
+            while spans and spans.get(len(values)):
+                spans[len(values)] -= 1
+                values.append(None)
+
+            text = ''.join(cell.itertext()) if len(cell) else cell.text
+            text = _HTML_WHITESPACE.sub(' ', text).strip() if text else None
+            if not cell.attrib:
+                values.append(text or None)
+                continue
+
+            rowspan = _html_span(cell, 'rowspan')
+            for offset in range(_html_span(cell, 'colspan')):
+                if rowspan > 1:
+                    spans[len(values)] = rowspan - 1
+                values.append((text or None) if offset == 0 else None)
+
+        # أعمدة محجوزة بعد آخر خلية في الصف
+        for column in [column for column, remaining in spans.items() if remaining and column >= len(values)]:
+            spans[column] -= 1
+        return _trimmed_row(values)
+
+    def sheet_dimension(self, sheet_index):
+        """جداول HTML لا تحمل أبعادها (تتطلب قراءة الجدول كاملًا)"""
+        return None
+
+    def close(self):
+        self._events = None
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+SHEET_READERS = {
+    OpenpyxlSheetReader.name: OpenpyxlSheetReader,
+    LxmlSheetReader.name: LxmlSheetReader,
+    XlsSheetReader.name: XlsSheetReader,
+    HtmlSheetReader.name: HtmlSheetReader
+}
+
+# قارئات ملفات XLS (تُختار تلقائيًا حسب محتوى الملف)
+LEGACY_READERS = (XlsSheetReader.name, HtmlSheetReader.name)
+
+
+# ======================== التعرف على صيغة الملف ======================== #
+
+# عدد البايتات المقروءة من بداية الملف للتعرف على صيغته
+SNIFF_BYTES = 4096
+
+# حدود الحماية من ملفات ZIP المضغوطة بشكل مفرط (zip bomb) - حسب الأحجام المعلنة في الفهرس المركزي
+MAX_UNCOMPRESSED_SIZE = int(os.environ.get('MAX_UNCOMPRESSED_MB', 2048)) * 1024 * 1024
+MAX_COMPRESSION_RATIO = 100
+_RATIO_MIN_SIZE = 16 * 1024 * 1024  # الأجزاء الأصغر لا تُفحص نسبة ضغطها
+
+_OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_ZIP_MAGIC = b'PK\x03\x04'
+_HTML_MARKERS = (b'<html', b'<table', b'<!doctype html', b'<head', b'<body', b'<meta')
+
+
+def _check_xlsx_archive(file_path):
+    """فحص الفهرس المركزي لملف XLSX دون فك ضغط أي جزء"""
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            members = archive.infolist()
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Corrupt XLSX file: {e}")
+
+    if not any(member.filename == '[Content_Types].xml' for member in members):
+        raise ValueError("Not an Excel workbook: [Content_Types].xml is missing")
+
+    total = 0
+    for member in members:
+        total += member.file_size
+        if member.file_size > _RATIO_MIN_SIZE and member.file_size > MAX_COMPRESSION_RATIO * max(member.compress_size, 1):
+            raise ValueError(
+                f"Suspicious compression ratio in {member.filename} "
+                f"({member.compress_size} bytes expand to {member.file_size} bytes)"
+            )
+    if total > MAX_UNCOMPRESSED_SIZE:
+        raise ValueError(
+            f"Workbook expands to {total // (1024 * 1024)} MB "
+            f"(limit {MAX_UNCOMPRESSED_SIZE // (1024 * 1024)} MB)"
+        )
+
+
+def sniff_file_format(file_path):
+    """
+    تحديد صيغة الملف من أول بايتات فيه (وفهرس ZIP المركزي لملفات XLSX) دون تحليله
+
+    Args:
+        file_path: مسار الملف
+
+    Returns:
+        str: 'xlsx' أو 'xls' (BIFF حقيقي) أو 'html' (تقرير iTrack بامتداد xls)
+
+    Raises:
+        ValueError: ملف فارغ أو غير مدعوم أو تالف أو مضغوط بشكل مفرط
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+
+    if not head:
+        raise ValueError("File is empty")
+    if head.startswith(_ZIP_MAGIC):
+        _check_xlsx_archive(file_path)
+        return 'xlsx'
+    if head.startswith(_OLE2_MAGIC):
+        # رأس المستند المركب: علامة ترتيب البايتات 0xFFFE عند الإزاحة 28
+        if len(head) < 512 or head[28:30] != b'\xfe\xff':
+            raise ValueError("Corrupt XLS file: invalid compound document header")
+        return 'xls'
+
+    lowered = head.lower()
+    if any(marker in lowered for marker in _HTML_MARKERS):
+        return 'html'
+    raise ValueError("Unsupported file format: not an Excel workbook or HTML report")
+
+
+def open_legacy_reader(file_path, file_format=None):
+    """
+    فتح ملف .xls مباشرة: XLS حقيقي عبر xlrd أو تقرير HTML من iTrack
+
+    القارئ يُختار من صيغة الملف (sniff_file_format) دون محاولة xlrd أولًا.
+
+    Raises:
+        ValueError: إذا لم يكن الملف XLS ولا يحتوي جدول HTML
+    """
+    file_format = file_format or sniff_file_format(file_path)
+    if file_format not in LEGACY_READERS:
+        raise ValueError(f"Unsupported file format: {file_format.upper()} content cannot be read as XLS")
+    try:
+        return SHEET_READERS[file_format](file_path)
+    except xlrd.XLRDError as e:
+        raise ValueError(f"Unsupported file format: {e}")
+
+
+def open_sheet_reader(file_path, backend=None):
+    """
+    فتح ملف Excel بالقارئ المطلوب
+
+    القارئ يُختار حسب محتوى الملف لا امتداده: XLS حقيقي أو HTML يُقرأ مباشرة
+    بقارئ XLS/HTML دون تحويل، وملفات XLSX بالقارئ المطلوب.
+
+    Args:
+        file_path: مسار الملف
+        backend: 'lxml' أو 'openpyxl' لملفات XLSX (افتراضيًا DEFAULT_READER)،
+            أو 'xls' / 'html' لإعادة فتح ملف XLS بنفس قارئه في عملية عاملة
+
+    Returns:
+        قارئ يوفّر sheet_names و iter_rows(sheet_index) و close()
+    """
+    backend = backend or DEFAULT_READER
+    if backend not in SHEET_READERS:
+        raise ValueError(f"Unknown sheet reader: {backend}")
+
+    if backend in LEGACY_READERS:
+        return SHEET_READERS[backend](file_path)
+    file_format = sniff_file_format(file_path)
+    if file_format in LEGACY_READERS:
+        return open_legacy_reader(file_path, file_format)
+
+    try:
+        return SHEET_READERS[backend](file_path)
+    except Exception as e:
+        if backend == OpenpyxlSheetReader.name:
+            raise
+        # الملفات غير القياسية تُقرأ بالقارئ الأصلي
+        logger.warning(f"{backend} reader failed for {os.path.basename(file_path)} ({e}), falling back to openpyxl")
+        return OpenpyxlSheetReader(file_path)
@@ -90,7 +90,7 @@ def distribute_visits(file_path, sheet_name, output_folder):
             raise Exception(f"Invalid Excel file: {error}")
         
         # ✅ في حال كان XLS أو HTML iTrack يتم تحويله
-        if file_type == 'xls':
+        if file_type in ('xls', 'html'):
             logger.info("Converting XLS file to XLSX for compatibility...")
             file_path = convert_xls_to_xlsx(file_path, output_folder)
         
@@ -0,0 +1,168 @@
+import os
+import json
+import threading
+import logging
+from collections import OrderedDict
+from itertools import islice
+from openpyxl.utils.cell import range_boundaries
+from utils.sheet_readers import open_sheet_reader, sniff_file_format
+from utils.data_extractor import HEADER_SCAN_ROWS, find_header_layout, safe_read_value
+from utils.header_layout import layout_fingerprints
+from utils.result_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== معلومات المصنف السريعة ======================== #
+
+# أقصى عدد ملفات تُحفظ معلوماتها في الذاكرة
+MAX_INFO_ENTRIES = 256
+
+
+def _head_rows(reader, sheet_index, count):
+    """أول count صف من الورقة (قارئ lxml يقرأ النصوص المشتركة اللازمة فقط)"""
+    if hasattr(reader, 'head_rows'):
+        return reader.head_rows(sheet_index, count)
+    rows = reader.iter_rows(sheet_index)
+    try:
+        return list(islice(rows, count))
+    finally:
+        if hasattr(rows, 'close'):
+            rows.close()
+
+
+def _sheet_info(name, dimension, head_rows, header_layouts=None):
+    info = {
+        'name': name,
+        'dimension': dimension,
+        'rows': None,
+        'columns': None,
+        'header_row': None,
+        'header_columns': None,
+        'fingerprint': None,
+        'data_rows': None
+    }
+
+    if dimension:
+        try:
+            _, _, max_col, max_row = range_boundaries(dimension)
+            info['rows'] = max_row
+            info['columns'] = max_col
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid dimension '{dimension}' in sheet: {name}")
+
+    layout = find_header_layout(head_rows, header_layouts)
+    if layout:
+        header_row, columns = layout
+        info['header_row'] = header_row
+        info['header_columns'] = columns
+        if header_row <= len(head_rows):
+            info['fingerprint'] = layout_fingerprints(head_rows)[header_row - 1]
+        if info['rows'] is not None:
+            info['data_rows'] = max(info['rows'] - header_row, 0)
+
+    return info
+
+
+def read_workbook_info(file_path, header_layouts=None):
+    """
+    معلومات المصنف دون تحميل الخلايا
+
+    أسماء الأوراق من workbook.xml، والأبعاد من <dimension ref> في بداية XML
+    كل ورقة، وصف الهيدر من أول HEADER_SCAN_ROWS صف. عدد الصفوف غير متاح
+    لملفات XLS وتقارير HTML بدون قراءتها كاملة.
+
+    Args:
+        file_path: مسار الملف
+        header_layouts: تخطيطات هيدر يدوية للمستخدم
+
+    Returns:
+        dict: {'format', 'sheets': [{'name', 'dimension', 'rows', 'columns',
+            'header_row', 'header_columns', 'fingerprint', 'data_rows'}]}
+
+    Raises:
+        ValueError: ملف غير مدعوم أو تالف
+    """
+    file_format = sniff_file_format(file_path)
+    sheets = []
+
+    with open_sheet_reader(file_path) as reader:
+        for sheet_index, sheet_name in enumerate(reader.sheet_names):
+            head_rows = [
+                [safe_read_value(v) for v in row]
+                for row in _head_rows(reader, sheet_index, HEADER_SCAN_ROWS)
+            ]
+            sheets.append(_sheet_info(sheet_name, reader.sheet_dimension(sheet_index), head_rows, header_layouts))
+
+    return {'format': file_format, 'sheets': sheets}
+
+
+class WorkbookInfoCache:
+    """
+    ذاكرة معلومات المصنفات حسب بصمة المحتوى (SHA-256) مع إخلاء الأقل استخدامًا
+
+    بصمة الملف نفسها تُحفظ حسب (المسار، الحجم، وقت التعديل) فلا يُعاد
+    حساب SHA-256 للملف الكبير عند كل طلب.
+    """
+
+    def __init__(self, max_entries=MAX_INFO_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def _digest(self, file_path):
+        stat = os.stat(file_path)
+        file_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(file_key)
+        if digest is None:
+            digest = file_digest(file_path)
+            with self._lock:
+                self._remember(self._digests, file_key, digest)
+        return digest
+
+    def get(self, file_path, header_layouts=None):
+        """
+        معلومات المصنف من الذاكرة أو بقراءتها (read_workbook_info)
+
+        Returns:
+            dict: نفس read_workbook_info
+        """
+        layouts = json.dumps(sorted((header_layouts or {}).items()), default=str)
+        key = (self._digest(file_path), layouts)
+
+        with self._lock:
+            info = self._entries.get(key)
+            if info is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return info
+            self.misses += 1
+
+        info = read_workbook_info(file_path, header_layouts)
+        with self._lock:
+            self._remember(self._entries, key, info)
+        return info
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
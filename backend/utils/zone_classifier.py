@@ -0,0 +1,150 @@
+import numpy as np
+from functools import lru_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== تصنيف النطاق المُجمَّع ======================== #
+
+ZONE_INSIDE = "داخل النطاق"
+ZONE_OUTSIDE = "خارج النطاق"
+ZONE_UNDEFINED = "غير محدد"
+
+# النقاط الافتراضية للمنطقة
+DEFAULT_ZONE_POINTS = (
+    (30.22923, 31.73212),
+    (30.22984, 31.73347),
+    (30.22908, 31.73418),
+    (30.22851, 31.73325)
+)
+
+
+def parse_coordinate(coord):
+    """
+    تحويل نص إحداثيات "lat,lon" إلى رقمين
+
+    Returns:
+        tuple: (lat, lon) أو (NaN, NaN) إذا كان النص غير صالح
+    """
+    if not coord:
+        return np.nan, np.nan
+    lat, sep, lon = str(coord).strip().partition(',')
+    if not sep:
+        return np.nan, np.nan
+    try:
+        return float(lat), float(lon)
+    except ValueError:
+        return np.nan, np.nan
+
+
+def parse_coordinate_arrays(coordinates):
+    """
+    تحويل نصوص الإحداثيات "lat,lon" إلى مصفوفتين من الأرقام
+
+    Args:
+        coordinates: قائمة نصوص الإحداثيات
+
+    Returns:
+        tuple: (lats, lons) كمصفوفات float64، والقيم غير الصالحة NaN
+    """
+    count = len(coordinates)
+    lats = np.full(count, np.nan)
+    lons = np.full(count, np.nan)
+
+    for idx, coord in enumerate(coordinates):
+        lats[idx], lons[idx] = parse_coordinate(coord)
+
+    return lats, lons
+
+
+class ZoneClassifier:
+    """
+    مصنّف نطاق يُبنى مرة واحدة لكل عملية من نقاط المنطقة
+
+    يتم حساب حدود المنطقة (bounding box) مرة واحدة، ثم تُصنَّف مصفوفات
+    الإحداثيات كاملة دفعة واحدة بدلًا من فحص كل صف على حدة.
+    """
+
+    def __init__(self, zone_points=None):
+        points = np.asarray(zone_points or DEFAULT_ZONE_POINTS, dtype=np.float64)
+
+        self.lat_min, self.lon_min = points.min(axis=0)
+        self.lat_max, self.lon_max = points.max(axis=0)
+
+        # الفهرس = صالح + داخل: 0 غير محدد، 1 خارج، 2 داخل
+        self._labels = np.array([ZONE_UNDEFINED, ZONE_OUTSIDE, ZONE_INSIDE], dtype=object)
+
+    @property
+    def version(self):
+        """بصمة حدود النطاق (تُستخدم في مفاتيح ذاكرة النتائج)"""
+        return f"bbox:{self.lat_min!r},{self.lon_min!r},{self.lat_max!r},{self.lon_max!r}"
+
+    def classify(self, lats, lons):
+        """
+        تصنيف مصفوفات الإحداثيات
+
+        Args:
+            lats: مصفوفة خطوط العرض (NaN = غير محدد)
+            lons: مصفوفة خطوط الطول
+
+        Returns:
+            numpy.ndarray: تسميات النطاق لكل نقطة
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+
+        valid = ~(np.isnan(lats) | np.isnan(lons))
+
+        with np.errstate(invalid='ignore'):
+            inside = (
+                valid
+                & (lats >= self.lat_min) & (lats <= self.lat_max)
+                & (lons >= self.lon_min) & (lons <= self.lon_max)
+            )
+
+        return self._labels[valid.astype(np.int8) + inside]
+
+    def classify_coordinates(self, coordinates):
+        """تصنيف قائمة نصوص إحداثيات "lat,lon" """
+        if not len(coordinates):
+            return np.empty(0, dtype=object)
+        # كل نص مختلف يُحلَّل ويُصنَّف مرة واحدة
+        distinct = {}
+        positions = np.fromiter((distinct.setdefault(c, len(distinct)) for c in coordinates),
+                                dtype=np.int64, count=len(coordinates))
+        lats, lons = parse_coordinate_arrays(list(distinct))
+        return self.classify(lats, lons)[positions]
+
+    def classify_records(self, records):
+        """تعبئة حقل 'zone' لقائمة سجلات دفعة واحدة"""
+        labels = self.classify_coordinates([r.get('coordinates') for r in records])
+        for record, label in zip(records, labels):
+            record['zone'] = label
+        return records
+
+
+@lru_cache(maxsize=32)
+def _compile_cached(zone_points):
+    return ZoneClassifier(zone_points)
+
+
+def compile_zones(zone_points=None):
+    """
+    الحصول على مصنّف نطاق مُجمَّع
+
+    Args:
+        zone_points: نقاط المنطقة أو ZoneClassifier جاهز
+
+    Returns:
+        ZoneClassifier
+    """
+    if isinstance(zone_points, ZoneClassifier):
+        return zone_points
+
+    try:
+        key = tuple(tuple(float(v) for v in p) for p in zone_points) if zone_points else None
+        return _compile_cached(key)
+    except TypeError:
+        # الأشكال غير القابلة للتجزئة
+        return ZoneClassifier(zone_points)